@@ -1,8 +1,9 @@
 from typing import Literal
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langgraph.graph import StateGraph, END
-from app.agent.nodes import router_node, rag_node, web_node, answer_node
+from app.agent.nodes import router_node, rag_node, parallel_retrieval_node, web_node, answer_node
 from app.agent.shared import AgentState
+from app.config.settings import PARALLEL_RETRIEVAL
+from app.utils.lazy import Lazy
 
 # ── Routing helpers ─────────────────────────────────────────────────
 def from_router(st: AgentState) -> Literal["rag", "answer", "end"]:
@@ -15,19 +16,29 @@ def after_web(_) -> Literal["answer"]:
     return "answer"
 
 # ── Build graph ─────────────────────────────────────────────────────
-g = StateGraph(AgentState)
-g.add_node("router", router_node)
-g.add_node("rag_lookup", rag_node)
-g.add_node("web_search", web_node)
-g.add_node("answer", answer_node)
-
-g.set_entry_point("router")
-g.add_conditional_edges("router", from_router,
-                        {"rag": "rag_lookup", "answer": "answer", "end": END})
-g.add_conditional_edges("rag_lookup", after_rag,
-                        {"answer": "answer", "web": "web_search"})
-g.add_edge("web_search",  "answer")
-g.add_edge("answer", END)
-
-agent = g.compile()
+def build_agent(parallel_retrieval: bool = PARALLEL_RETRIEVAL):
+    """Compile the agent graph.
 
+    In parallel retrieval mode the 'rag_lookup' node queries Chroma and Tavily
+    concurrently and always continues to 'answer'; otherwise the web search
+    only runs after the knowledge base comes back empty.
+    """
+    from langgraph.graph import StateGraph, END
+
+    g = StateGraph(AgentState)
+    g.add_node("router", router_node)
+    g.add_node("rag_lookup", parallel_retrieval_node if parallel_retrieval else rag_node)
+    g.add_node("web_search", web_node)
+    g.add_node("answer", answer_node)
+
+    g.set_entry_point("router")
+    g.add_conditional_edges("router", from_router,
+                            {"rag": "rag_lookup", "answer": "answer", "end": END})
+    g.add_conditional_edges("rag_lookup", after_rag,
+                            {"answer": "answer", "web": "web_search"})
+    g.add_edge("web_search",  "answer")
+    g.add_edge("answer", END)
+
+    return g.compile()
+
+agent = Lazy("agent", build_agent)
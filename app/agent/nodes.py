@@ -1,86 +1,156 @@
-from typing import Literal
+import asyncio
+import logging
+from typing import Literal, Optional
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from app.agent.shared import AgentState, router_llm, judge_llm, answer_llm, RouteDecision, RagJudge
-from app.tools.tools import rag_search_tool, web_search_tool
-
-
-def router_node(state: AgentState) -> AgentState:
-
+from langchain_core.runnables import RunnableConfig
+from app.agent.shared import AgentState, router_llm, answer_llm, RouteDecision, requested_model, select_llm
+from app.tools.tools import rag_search_tool, retrieval_scope, web_search_tool
+from app.utils.semantic_cache import answer_cache, scope_key
+from app.config.settings import (RAG_MIN_CONFIDENCE, ROUTER_FAST_PATH_ENABLED, ROUTER_REWRITES_QUESTION,
+                                 SEMANTIC_CACHE_ENABLED)
+from app.utils.fast_router import fast_router
+from app.utils.rerank import confidence as retrieval_confidence
+from app.utils.telemetry import count_route, timed
+
+
+async def route_with_llm(messages: list, config: RunnableConfig = None) -> RouteDecision:
     system_prompt = (
         "You are a master router AI. Your job is to decide the best course of action to respond to a user's query based on the conversation history.\n"
         "You have the following options:\n"
         "- 'end': Use this for simple greetings, farewells, or conversational pleasantries (e.g., 'hello', 'thank you', 'how are you?'). Provide a suitable 'reply' in Spanish.\n"
         "- 'rag': Use this if the user is asking a question that can likely be answered by your internal knowledge base. This is your primary source of information.\n"
         "- 'answer': Use this if you are confident you can answer the question directly from the conversation history without needing to look up information.\n"
-        "Analyze the latest user message in the context of the entire conversation."
+        "Analyze the latest user message in the context of the entire conversation.\n"
+        "Also fill 'standalone_question': reformulate the latest user message as a standalone question that can be understood "
+        "without the conversation history (resolve pronouns and references). Do NOT answer it; if it is already standalone, copy it as is."
     )
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
-    result: RouteDecision = router_llm.invoke(messages)
-
+    llm = select_llm("router", router_llm, config, RouteDecision)
+    return await llm.ainvoke([SystemMessage(content=system_prompt)] + messages)
+
+async def fast_route(messages: list) -> Optional[RouteDecision]:
+    """Decision of the local fast path, or None when the router LLM has to decide."""
+    if not ROUTER_FAST_PATH_ENABLED:
+        return None
+    question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    # Without the LLM's rewrite a follow-up would be searched as asked
+    standalone = not ROUTER_REWRITES_QUESTION or not any(isinstance(m, AIMessage) for m in messages)
+    decision = await fast_router.aclassify(question, standalone)
+    if decision is None:
+        return None
+    return RouteDecision(route=decision.route, reply=decision.reply)
+
+@timed("node", "router")
+async def router_node(state: AgentState, config: RunnableConfig = None) -> AgentState:
+    result = await fast_route(state["messages"]) or await route_with_llm(state["messages"], config)
+
+    count_route(result.route)
     out = {"messages": state["messages"], "route": result.route}
+    if result.standalone_question:
+        out["messages"] = replace_last_question(state["messages"], result.standalone_question)
+    out["question"] = next((m.content for m in reversed(out["messages"])
+                            if isinstance(m, HumanMessage)), "")
     if result.route == "end":
-        out["messages"] = state["messages"] + [AIMessage(content=result.reply or "Hello!")]
+        out["messages"] = out["messages"] + [AIMessage(content=result.reply or "Hello!")]
+
+    # Follow-up turns only get their standalone form here, so the semantic
+    # cache is consulted now unless the caller already did it.
+    if result.route == "rag" and SEMANTIC_CACHE_ENABLED and not state.get("cache_checked"):
+        try:
+            scope = scope_key(retrieval_scope(config), requested_model("answer", config))
+            cached = await answer_cache.alookup(out["question"], scope)
+        except Exception as e:
+            logging.warning(f"Semantic cache lookup failed: {e}")
+            cached = None
+        out["cache_checked"] = True
+        if cached:
+            out["messages"] = out["messages"] + [AIMessage(content=cached.answer)]
+            out["route"] = "end"
+            out["cache_hit"] = True
     return out
 
+def replace_last_question(messages: list, question: str) -> list:
+    """Return a copy of messages with the latest HumanMessage swapped for question."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[:i] + [HumanMessage(content=question)] + messages[i + 1:]
+    return messages + [HumanMessage(content=question)]
+
+def rag_is_sufficient(chunks: str, confidence: Optional[float] = None) -> bool:
+    # Weak matches go to the web like empty ones
+    if not chunks or "RAG_ERROR" in chunks:
+        return False
+    return confidence is None or confidence >= RAG_MIN_CONFIDENCE
+
+async def search_kb(query: str, config: RunnableConfig = None) -> tuple[str, list[int], Optional[float]]:
+    """Run rag_search_tool and return its text, the file_ids of the chunks used
+    and their confidence (best reranked score, None without reranking). The
+    collection and filters come from config (see retrieval_scope)."""
+    msg = await rag_search_tool.ainvoke(
+        {"type": "tool_call", "name": rag_search_tool.name, "args": {"query": query}, "id": "rag_lookup"},
+        config=config)
+    docs = msg.artifact or []
+    file_ids = sorted({d.metadata["file_id"] for d in docs if "file_id" in d.metadata})
+    return msg.content, file_ids, retrieval_confidence(docs)
+
 # ── Node 2: RAG lookup ───────────────────────────────────────────────
-def rag_node(state: AgentState) -> AgentState:
+@timed("node", "rag_lookup")
+async def rag_node(state: AgentState, config: RunnableConfig = None) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
                   if isinstance(m, HumanMessage)), "")
 
-    chunks = rag_search_tool.invoke({"query": query})
+    chunks, sources, confidence = await search_kb(query, config)
 
-    route_decision = "web" if not chunks or "RAG_ERROR" in chunks else "answer"
+    route_decision = "answer" if rag_is_sufficient(chunks, confidence) else "web"
+    if route_decision == "web":
+        # Weak or failed matches stay out of the answer prompt
+        chunks, sources = "", []
 
     return {
         **state,
         "rag": chunks,
+        "sources": sources,
+        "confidence": confidence,
         "route": route_decision
     }
 
-"""
-def rag_node(state: AgentState) -> AgentState:
+# ── Node 2b: speculative RAG + web lookup (parallel retrieval mode) ──
+async def discard(task: asyncio.Task) -> None:
+    """Cancel a speculative task and wait for it, retrieving any error it already raised."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+@timed("node", "rag_lookup")
+async def parallel_retrieval_node(state: AgentState, config: RunnableConfig = None) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
                   if isinstance(m, HumanMessage)), "")
 
-    chunks = rag_search_tool.invoke({"query": query})
-
-    judge_messages = [
-        ("system", (
-        "You are a pragmatic judge. Your role is to determine if the retrieved information is relevant to the user's question. You don't need a perfect match, just a strong indication that the context is on the right track.\n"
-        "If the information contains keywords or concepts from the user's question, it's likely sufficient.\n"
-        "Respond ONLY with a JSON object: {\"sufficient\": true} or {\"sufficient\": false}."
-        )),
-        ("user", f"Question: {query}\n\nRetrieved info: {chunks}\n\nIs this sufficient to answer the question?")
-    ]
-
-    verdict: RagJudge = judge_llm.invoke(judge_messages)
-
-    # Manejo seguro de errores
-    if verdict is None or not hasattr(verdict, 'sufficient'):
-        import logging
-        logging.error(f"RAG_JUDGE_ERROR: verdict is None or missing 'sufficient'. Value: {verdict}")
-        return {
-            **state,
-            "rag": chunks,
-            "route": "web"
-        }
+    # Start the web search right away so a KB miss only pays max(rag, web)
+    # instead of rag + web; it is cancelled as soon as the KB answers.
+    web_task = asyncio.create_task(web_search_tool.ainvoke({"query": query}))
+    try:
+        chunks, sources, confidence = await search_kb(query, config)
+    except BaseException:
+        await discard(web_task)
+        raise
 
-    return {
-        **state,
-        "rag": chunks,
-        "route": "answer" if verdict.sufficient else "web"
-    }
-"""
+    if rag_is_sufficient(chunks, confidence):
+        await discard(web_task)
+        return {**state, "rag": chunks, "sources": sources, "confidence": confidence, "route": "answer"}
+
+    snippets = await web_task
+    return {**state, "rag": "", "sources": [], "confidence": confidence, "web": snippets, "route": "answer"}
 
 # ── Node 3: web search ───────────────────────────────────────────────
-def web_node(state: AgentState) -> AgentState:
+@timed("node", "web_search")
+async def web_node(state: AgentState) -> AgentState:
     query = next((m.content for m in reversed(state["messages"])
                   if isinstance(m, HumanMessage)), "")
-    snippets = web_search_tool.invoke({"query": query})
+    snippets = await web_search_tool.ainvoke({"query": query})
     return {**state, "web": snippets, "route": "answer"}
 
 # ── Node 4: final answer ─────────────────────────────────────────────
-def answer_node(state: AgentState) -> AgentState:
+@timed("node", "answer")
+async def answer_node(state: AgentState, config: RunnableConfig = None) -> AgentState:
     user_q = next((m.content for m in reversed(state["messages"])
                    if isinstance(m, HumanMessage)), "")
 
@@ -106,7 +176,7 @@ def answer_node(state: AgentState) -> AgentState:
     4.  **Si no hay contexto:** Si no tienes información suficiente en el contexto para responder, indícalo amablemente y sugiere al usuario que podría reformular la pregunta. No inventes información.
     5.  **Idioma:** Responde siempre en español."""
     messages = state["messages"] + [HumanMessage(content=prompt)]
-    ans = answer_llm.invoke(messages).content
+    ans = (await select_llm("answer", answer_llm, config).ainvoke(messages)).content
 
     return {
         **state,
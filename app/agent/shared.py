@@ -1,25 +1,110 @@
-from typing import TypedDict, List, Literal
+import threading
+from typing import Dict, TypedDict, List, Literal, Optional, Tuple
 from pydantic import BaseModel, Field
-from langchain_cerebras import ChatCerebras
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from app.config.settings import (CAPTURE_ENABLED, LLM_BACKEND, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_TIMEOUT_SECONDS,
+                                 MODEL_ANSWER, MODEL_CONTEXTUALISE, MODEL_ROUTER, MODEL_SUMMARY)
+from app.utils.admission import LimitedRunnable, llm_limit
+from app.utils.lazy import Lazy
 
 class RouteDecision(BaseModel):
     route: Literal["rag", "answer", "end"]
     reply: str | None = Field(None, description="Filled only when route == 'end'")
+    standalone_question: str | None = Field(
+        None,
+        description="The latest user message rewritten so it can be understood without the conversation history",
+    )
 
-class RagJudge(BaseModel):
-    sufficient: bool
+# ── Chat model pool ──────────────────────────────────────────────────
+# One client per (model, temperature), all on a single pair of HTTP
+# connection pools, so connections are reused across stages and requests.
+STAGE_MODELS = {
+    "router": MODEL_ROUTER,
+    "contextualise": MODEL_CONTEXTUALISE,
+    "answer": MODEL_ANSWER,
+    "summary": MODEL_SUMMARY,
+}
+STAGE_TEMPERATURES = {"answer": 0.2}
+
+_pool_lock = threading.Lock()
+_http_clients = None
+_chat_models: Dict[Tuple[str, float], BaseChatModel] = {}
+_stage_llms: Dict[Tuple[str, str, Optional[type]], Runnable] = {}
+
+def _shared_http_clients():
+    global _http_clients
+    if _http_clients is None:
+        import httpx
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                              max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS)
+        _http_clients = (httpx.Client(limits=limits, timeout=LLM_TIMEOUT_SECONDS),
+                         httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT_SECONDS))
+    return _http_clients
+
+def build_chat_model(model: str = MODEL_ANSWER, temperature: float = 0) -> BaseChatModel:
+    """Cerebras client, or the in-process stand-in when LLM_BACKEND=fake (replay:
+    the responses of a traffic capture)."""
+    if LLM_BACKEND == "fake":
+        from app.utils.offline import FakeChatModel
+        return FakeChatModel.for_model(model)
+    if LLM_BACKEND == "replay":
+        from app.utils.replay import ReplayChatModel
+        return ReplayChatModel.for_model(model)
+    from langchain_cerebras import ChatCerebras
+    http_client, http_async_client = _shared_http_clients()
+    return ChatCerebras(model=model, temperature=temperature,
+                        http_client=http_client, http_async_client=http_async_client)
+
+def chat_model(model: str, temperature: float = 0) -> BaseChatModel:
+    """Pooled client for (model, temperature)."""
+    key = (model, temperature)
+    with _pool_lock:
+        if key not in _chat_models:
+            _chat_models[key] = build_chat_model(model, temperature)
+        return _chat_models[key]
+
+def stage_llm(stage: str, model: Optional[str] = None, schema: Optional[type] = None) -> Runnable:
+    """LLM for a pipeline stage (its configured model unless `model` is given),
+    with structured output when a schema is passed. Async calls wait for a
+    slot of the shared LLM concurrency limit (app.utils.admission), and are
+    recorded when traffic capture is on."""
+    model = model or STAGE_MODELS[stage]
+    key = (stage, model, schema)
+    if key not in _stage_llms:
+        llm = chat_model(model, STAGE_TEMPERATURES.get(stage, 0))
+        runnable = llm.with_structured_output(schema) if schema else llm
+        if CAPTURE_ENABLED:
+            from app.utils.capture import RecordingRunnable
+            runnable = RecordingRunnable(runnable, model, schema)
+        _stage_llms[key] = LimitedRunnable(runnable, llm_limit)
+    return _stage_llms[key]
+
+def requested_model(stage: str, config: Optional[RunnableConfig]) -> Optional[str]:
+    """Model the current run asked for at `stage`, if it differs from the configured one."""
+    model = ((config or {}).get("configurable") or {}).get("models", {}).get(stage)
+    return model if model and model != STAGE_MODELS[stage] else None
+
+def select_llm(stage: str, default: Runnable, config: Optional[RunnableConfig],
+               schema: Optional[type] = None) -> Runnable:
+    """`default` (the stage's module-level LLM) unless this run picked another model."""
+    model = requested_model(stage, config)
+    return stage_llm(stage, model, schema) if model else default
 
 # ── LLM instances with structured output where needed ───────────────
-router_llm = ChatCerebras(model="llama-3.3-70b", temperature=0)\
-             .with_structured_output(RouteDecision)
-judge_llm  = ChatCerebras(model="llama-3.3-70b", temperature=0)\
-             .with_structured_output(RagJudge)
-answer_llm = ChatCerebras(model="llama-3.3-70b", temperature=0.2)
+# Built on first use (or by the startup warm-up), not at import time
+router_llm = Lazy("router_llm", lambda: stage_llm("router", schema=RouteDecision))
+answer_llm = Lazy("answer_llm", lambda: stage_llm("answer"))
 
 # ── Shared state type ────────────────────────────────────────────────
 class AgentState(TypedDict, total=False):
     messages: List[BaseMessage]
     route:    Literal["rag", "answer", "end"]
     rag:      str
-    web:      str 
\ No newline at end of file
+    web:      str
+    question: str            # standalone question the agent worked on
+    sources:  List[int]      # file_ids of the KB chunks placed in `rag`
+    confidence: Optional[float]  # best reranked score of those chunks (None without reranking)
+    cache_checked: bool      # semantic cache already consulted for `question`
+    cache_hit: bool 
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Offline maintenance of the vector store (CHROMA_PERSIST_DIR) and its SQLite
+metadata (RAG_DB_PATH). Stop the server first, or use the /admin API instead.
+
+    python -m app.cli export snapshots/kb-2026-10 [--collection NAME ...]
+    python -m app.cli import snapshots/kb-2026-10 [--collection NAME ...] [--replace] [--force]
+    python -m app.cli compact [--collection NAME ...]
+    python -m app.cli check [--repair]
+
+A snapshot built on a batch box is shipped to a serving node by copying the
+directory and running `import` there; nothing is embedded again.
+"""
+import argparse
+import json
+import logging
+import sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write collections to a snapshot directory")
+    export.add_argument("path")
+    export.add_argument("--collection", action="append", dest="collections")
+
+    load = commands.add_parser("import", help="load collections from a snapshot directory")
+    load.add_argument("path")
+    load.add_argument("--collection", action="append", dest="collections")
+    load.add_argument("--replace", action="store_true", help="overwrite collections that already hold documents")
+    load.add_argument("--force", action="store_true", help="import even if the embedding model differs")
+
+    compact = commands.add_parser("compact", help="rebuild collections without deleted chunks and VACUUM")
+    compact.add_argument("--collection", action="append", dest="collections")
+
+    check = commands.add_parser("check", help="report (and --repair) orphaned chunks and records")
+    check.add_argument("--repair", action="store_true")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # Imported here so --help works without opening the stores
+    from app.utils import maintenance, snapshot
+
+    try:
+        if args.command == "export":
+            manifest = snapshot.export_snapshot(args.path, args.collections)
+            result = {"path": args.path, "rows": manifest["rows"], "bytes": maintenance.disk_usage(args.path),
+                      "collections": {c: e["stop"] - e["start"] for c, e in manifest["collections"].items()}}
+        elif args.command == "import":
+            result = snapshot.import_snapshot(args.path, args.collections, args.replace, args.force)
+        elif args.command == "compact":
+            result = maintenance.compact(args.collections)
+        else:
+            result = maintenance.check_consistency(args.repair)
+    except (snapshot.SnapshotError, ValueError, KeyError) as e:
+        logging.error(str(e))
+        return 1
+
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+    return 1 if args.command == "check" and not result["consistent"] and not args.repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
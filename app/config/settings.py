@@ -0,0 +1,245 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+# ── Deployment ───────────────────────────────────────────────────────
+# Worker processes serving the API, exported to them by `python run.py
+# --workers N` (keep it, and CHROMA_SERVER_URL, out of .env, which overrides
+# the environment). With more than one, Chroma is reached through a server
+# (CHROMA_SERVER_URL; run.py starts one when unset) and state that is
+# otherwise kept per process is shared through SQLite: session ordering,
+# ingestion job progress and document changes, which other workers pick up
+# every DOCUMENT_CHANGES_POLL_SECONDS to drop the answers cached on them.
+WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+DOCUMENT_CHANGES_POLL_SECONDS = float(os.getenv("DOCUMENT_CHANGES_POLL_SECONDS", "1"))
+
+# ── Storage ──────────────────────────────────────────────────────────
+DB_NAME = os.getenv("RAG_DB_PATH", "rag_app.db")
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+# e.g. http://127.0.0.1:8001; unset, CHROMA_PERSIST_DIR is opened in process
+CHROMA_SERVER_URL = os.getenv("CHROMA_SERVER_URL", "")
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+# Each tenant / knowledge base gets its own Chroma collection (and HNSW index),
+# picked by `collection` on uploads and queries; this one is used when none is
+# given. "langchain" is the collection earlier versions wrote everything to.
+CHROMA_DEFAULT_COLLECTION = os.getenv("CHROMA_DEFAULT_COLLECTION", "langchain")
+# SQLite connections are pooled per process and run in WAL mode
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Chat turns saved within this window are committed in one transaction (0 disables)
+HISTORY_WRITE_BATCH_WINDOW_MS = float(os.getenv("HISTORY_WRITE_BATCH_WINDOW_MS", "2"))
+HISTORY_WRITE_BATCH_SIZE = int(os.getenv("HISTORY_WRITE_BATCH_SIZE", "64"))
+
+# ── Maintenance ──────────────────────────────────────────────────────
+# Snapshots exported or imported through the /admin API live under SNAPSHOT_DIR
+# (the CLI, python -m app.cli, takes any path). The /admin endpoints require
+# ADMIN_API_TOKEN in the X-Admin-Token header and are disabled without one.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+
+# ── Retrieval ────────────────────────────────────────────────────────
+# 'hybrid' fuses dense (Chroma) and BM25 rankings with reciprocal-rank fusion;
+# 'dense' and 'lexical' use a single source.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").strip().lower()
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+RETRIEVAL_K_DENSE = int(os.getenv("RETRIEVAL_K_DENSE", "10"))
+RETRIEVAL_K_LEXICAL = int(os.getenv("RETRIEVAL_K_LEXICAL", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RRF_WEIGHT_DENSE = float(os.getenv("RRF_WEIGHT_DENSE", "1.0"))
+RRF_WEIGHT_LEXICAL = float(os.getenv("RRF_WEIGHT_LEXICAL", "1.0"))
+# Reranking: the best RERANK_CANDIDATES fused chunks are scored by cosine
+# similarity blended with query-term overlap (RERANK_LEXICAL_WEIGHT), then
+# picked with MMR (RERANK_MMR_LAMBDA: 1 = relevance only). k adapts: chunks
+# under RETRIEVAL_MIN_SCORE or under RETRIEVAL_RELATIVE_CUTOFF x the best score
+# are dropped, and at most RETRIEVAL_MAX_K chunks / RETRIEVAL_CONTEXT_TOKENS
+# tokens are kept. Disabled, the top RETRIEVAL_K fused chunks are returned.
+RERANK_ENABLED = _env_bool("RERANK_ENABLED", True)
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "6"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.2"))
+RETRIEVAL_RELATIVE_CUTOFF = float(os.getenv("RETRIEVAL_RELATIVE_CUTOFF", "0.6"))
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "1200"))
+# rag_lookup routes to the web when the best reranked score is below this
+RAG_MIN_CONFIDENCE = float(os.getenv("RAG_MIN_CONFIDENCE", "0.3"))
+
+# ── Agent ────────────────────────────────────────────────────────────
+# When enabled, a 'rag' route starts the Tavily search speculatively while
+# Chroma is queried, and cancels it if the knowledge base answers.
+PARALLEL_RETRIEVAL = _env_bool("PARALLEL_RETRIEVAL")
+
+# The router rewrites the question into a standalone one in the same LLM call
+# that picks the route. Set to false to use the separate contextualise_chain
+# (still skipped when the session has no history).
+ROUTER_REWRITES_QUESTION = _env_bool("ROUTER_REWRITES_QUESTION", True)
+
+# Fast path in front of the router LLM (see app/utils/fast_router.py):
+# pleasantry-only messages ("hola", "gracias") are answered by rule, and other
+# turns are compared with labelled exemplars (built in, plus the JSON lines of
+# {"text", "intent"} in ROUTER_EXEMPLARS_PATH). The nearest exemplar decides
+# when its cosine reaches ROUTER_FAST_THRESHOLD and beats the exemplars of the
+# other route by ROUTER_FAST_MARGIN; otherwise the LLM does. Both depend on the
+# embedding model; a threshold above 1 leaves only the rules.
+ROUTER_FAST_PATH_ENABLED = _env_bool("ROUTER_FAST_PATH_ENABLED", True)
+ROUTER_FAST_THRESHOLD = float(os.getenv("ROUTER_FAST_THRESHOLD", "0.8"))
+ROUTER_FAST_MARGIN = float(os.getenv("ROUTER_FAST_MARGIN", "0.1"))
+ROUTER_EXEMPLARS_PATH = os.getenv("ROUTER_EXEMPLARS_PATH", "")
+
+# ── Models ───────────────────────────────────────────────────────────
+# Cerebras model per pipeline stage. A request may override them through
+# QueryInput.model (the answer) and QueryInput.stage_models; e.g. a small
+# model for routing and contextualisation with a large one for the answer.
+MODEL_ROUTER = os.getenv("MODEL_ROUTER", "llama-3.3-70b")
+MODEL_CONTEXTUALISE = os.getenv("MODEL_CONTEXTUALISE", "llama-3.3-70b")
+MODEL_ANSWER = os.getenv("MODEL_ANSWER", "llama-3.3-70b")
+MODEL_SUMMARY = os.getenv("MODEL_SUMMARY", "llama-3.3-70b")
+# One HTTP connection pool is shared by every model client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# ── Conversation memory ──────────────────────────────────────────────
+# Prompts get a rolling per-session summary plus at most MEMORY_MAX_TURNS recent
+# turns, all within MEMORY_TOKEN_BUDGET. Once the window overflows, the oldest
+# MEMORY_SUMMARY_BATCH_TURNS or more turns are folded into the summary.
+MEMORY_ENABLED = _env_bool("MEMORY_ENABLED", True)
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "8"))
+MEMORY_SUMMARY_BATCH_TURNS = int(os.getenv("MEMORY_SUMMARY_BATCH_TURNS", "4"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+MEMORY_SUMMARY_MAX_WORDS = int(os.getenv("MEMORY_SUMMARY_MAX_WORDS", "250"))
+
+# Recently active sessions keep their prompt history in process, updated on
+# every saved turn. HISTORY_CACHE_VALIDATE (always on with several workers)
+# checks each hit against the session version in SQLite (one primary-key read).
+HISTORY_CACHE_ENABLED = _env_bool("HISTORY_CACHE_ENABLED", True)
+HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "1000"))
+HISTORY_CACHE_TTL_SECONDS = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "900"))
+HISTORY_CACHE_VALIDATE = WORKERS > 1 or _env_bool("HISTORY_CACHE_VALIDATE")
+
+# Turns of one session run one at a time, in arrival order, from loading the
+# history to saving the answer. At most SESSION_MAX_PENDING_TURNS may wait
+# behind the running one, for SESSION_LOCK_TIMEOUT_SECONDS; past either the
+# request gets 429. Across workers the turn also holds a lease row in SQLite,
+# which lapses after SESSION_LOCK_LEASE_SECONDS (keep it above the longest
+# turn) if its worker dies mid-turn.
+SESSION_MAX_PENDING_TURNS = int(os.getenv("SESSION_MAX_PENDING_TURNS", "2"))
+SESSION_LOCK_TIMEOUT_SECONDS = float(os.getenv("SESSION_LOCK_TIMEOUT_SECONDS", "30"))
+SESSION_LOCK_LEASE_SECONDS = float(os.getenv("SESSION_LOCK_LEASE_SECONDS", "120"))
+
+# ── Semantic answer cache ────────────────────────────────────────────
+SEMANTIC_CACHE_ENABLED = _env_bool("SEMANTIC_CACHE_ENABLED", True)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# ── Request coalescing ───────────────────────────────────────────────
+# Concurrent requests with the same standalone question (and no history) share
+# one agent run; streaming requests share its token stream.
+COALESCE_ENABLED = _env_bool("COALESCE_ENABLED", True)
+
+# ── Web search ───────────────────────────────────────────────────────
+# Formatted results are cached on disk per normalized query until the TTL passes.
+WEB_SEARCH_CACHE_ENABLED = _env_bool("WEB_SEARCH_CACHE_ENABLED", True)
+WEB_SEARCH_CACHE_PATH = os.getenv("WEB_SEARCH_CACHE_PATH", "web_search_cache.db")
+WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "21600"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "10000"))
+# Hard deadline per search; past it the answer is written from the KB context alone
+WEB_SEARCH_TIMEOUT_MS = float(os.getenv("WEB_SEARCH_TIMEOUT_MS", "5000"))
+# A second identical search starts when the first runs past this percentile of
+# recent search latencies (0 disables hedging; needs HEDGE_MIN_SAMPLES first)
+WEB_SEARCH_HEDGE_PERCENTILE = float(os.getenv("WEB_SEARCH_HEDGE_PERCENTILE", "0"))
+WEB_SEARCH_HEDGE_MIN_SAMPLES = int(os.getenv("WEB_SEARCH_HEDGE_MIN_SAMPLES", "20"))
+
+# ── Document ingestion ───────────────────────────────────────────────
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_PARSE_PROCESSES = int(os.getenv("INGEST_PARSE_PROCESSES", "2"))
+CHROMA_WRITE_BATCH_SIZE = int(os.getenv("CHROMA_WRITE_BATCH_SIZE", "512"))
+# PDFs are parsed in ranges of this many pages, spread over the parse processes
+INGEST_PAGES_PER_PART = int(os.getenv("INGEST_PAGES_PER_PART", "25"))
+# Chunks hold whole paragraphs up to CHUNK_SIZE characters and never cross a
+# heading; CHUNK_TYPE_SETTINGS overrides both per type as "type=size/overlap,..."
+# (types: pdf, docx, html, txt, md, csv)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_TYPE_SETTINGS = os.getenv("CHUNK_TYPE_SETTINGS", "csv=1500/0")
+
+# ── Embeddings ───────────────────────────────────────────────────────
+# 'gemini', 'hashing' (deterministic offline vectors for tests/benchmarks) or
+# 'fake' (hashing vectors behind FAKE_EMBEDDING_LATENCY_MS of simulated network)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").strip().lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "384"))
+EMBEDDING_CACHE_ENABLED = _env_bool("EMBEDDING_CACHE_ENABLED", True)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+# Concurrent query embeddings arriving within this window share one remote call
+EMBED_QUERY_BATCH_WINDOW_MS = float(os.getenv("EMBED_QUERY_BATCH_WINDOW_MS", "5"))
+EMBED_QUERY_BATCH_SIZE = int(os.getenv("EMBED_QUERY_BATCH_SIZE", "32"))
+
+# ── Startup ──────────────────────────────────────────────────────────
+# When the API clients, Chroma and the agent graph get built (see app/utils/lazy.py):
+# 'lazy' on first use, 'background' right after startup while requests are
+# already accepted, 'eager' before the server accepts requests.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").strip().lower()
+
+# ── Upstream backends ────────────────────────────────────────────────
+# 'fake' swaps Cerebras / Tavily for in-process stand-ins with simulated latency
+# (see app/utils/offline.py), for benchmarks and air-gapped runs. 'replay' (also
+# for EMBEDDING_BACKEND) answers with the responses recorded in REPLAY_PATH.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "cerebras").strip().lower()
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "tavily").strip().lower()
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKEN_LATENCY_MS = float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "5"))
+FAKE_LLM_ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "60"))
+# Per-model overrides as "model=first_token_ms/per_token_ms,...", e.g.
+# "llama3.1-8b=80/1,llama-3.3-70b=300/5"; other models use the two values above
+FAKE_LLM_MODEL_LATENCY_MS = os.getenv("FAKE_LLM_MODEL_LATENCY_MS", "")
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50"))
+FAKE_SEARCH_LATENCY_MS = float(os.getenv("FAKE_SEARCH_LATENCY_MS", "800"))
+# Calls the fake LLM serves at once in each worker process; more are rejected
+# with a 429 like a rate-limited Cerebras account (0: unlimited)
+FAKE_LLM_MAX_CONCURRENCY = int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "0"))
+
+# ── Concurrency limits ───────────────────────────────────────────────
+# Upstream calls in flight per backend, for the whole deployment (each worker
+# gets an equal share; 0: unlimited). Calls past the limit wait in a FIFO queue
+# of at most *_MAX_QUEUE for up to *_QUEUE_TIMEOUT_MS. A chat request that
+# cannot get an LLM slot fails fast with 503 and a Retry-After estimate; one
+# that cannot get a search slot is answered without the web results. An
+# upstream 429 is passed on with its Retry-After (UPSTREAM_RETRY_AFTER_SECONDS
+# when it sends none).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_MS = float(os.getenv("LLM_QUEUE_TIMEOUT_MS", "10000"))
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "16"))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "32"))
+SEARCH_QUEUE_TIMEOUT_MS = float(os.getenv("SEARCH_QUEUE_TIMEOUT_MS", "1000"))
+UPSTREAM_RETRY_AFTER_SECONDS = float(os.getenv("UPSTREAM_RETRY_AFTER_SECONDS", "5"))
+
+# ── Traffic capture and replay ───────────────────────────────────────
+# With CAPTURE_ENABLED every answered /chat and /chat/stream turn is appended to
+# CAPTURE_PATH (JSONL) with the LLM, embedding and search responses it used.
+# The file holds user questions and answers, so it is off by default.
+# scripts/replay_traffic.py replays a capture with the 'replay' backends,
+# waiting the recorded upstream latencies times REPLAY_LATENCY_SCALE.
+CAPTURE_ENABLED = _env_bool("CAPTURE_ENABLED")
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "captures/traffic.jsonl")
+REPLAY_PATH = os.getenv("REPLAY_PATH", "")
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1"))
+
+# ── Observability ────────────────────────────────────────────────────
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+# Share of requests whose DEBUG lines (history dumps, retrieved chunks) are written
+DEBUG_LOG_SAMPLE_RATE = float(os.getenv("DEBUG_LOG_SAMPLE_RATE", "0.05"))
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+# Requests sending this header (any non-empty value) get a Server-Timing
+# breakdown of their stages back, and are always DEBUG-logged.
+TRACE_REQUEST_HEADER = os.getenv("TRACE_REQUEST_HEADER", "X-Debug-Trace")
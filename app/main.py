@@ -1,22 +1,116 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from fastapi.staticfiles import StaticFiles
-from app.routers import chat, documents
+from app.config.settings import (DOCUMENT_CHANGES_POLL_SECONDS, LOG_FILE, LOG_LEVEL, METRICS_ENABLED, STARTUP_WARMUP,
+                                 TRACE_REQUEST_HEADER, WORKERS)
+from app.routers import admin, chat, documents
+from app.utils import db_utils
+from app.utils.admission import Overloaded, start_admission
+from app.utils.chroma_utils import apply_shared_document_changes
+from app.utils.lazy import component_status, warm_up
+from app.utils.telemetry import CONTENT_TYPE_LATEST, REQUEST_SECONDS, metrics_payload, server_timing, start_request
 
 load_dotenv(override=True)
 
-logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+# LOG_LEVEL applies to the app's own loggers; libraries stay at INFO
+logging.getLogger("app").setLevel(LOG_LEVEL)
+
+# ── Startup ──────────────────────────────────────────────────────────
+# Importing the app builds nothing heavy; clients, Chroma and the agent graph
+# are Lazy components built here according to STARTUP_WARMUP, or on first use.
+startup = {"db": False, "warmup": "pending" if STARTUP_WARMUP != "lazy" else "skipped"}
+
+async def _warm_up():
+    startup["warmup"] = "running"
+    statuses = await asyncio.to_thread(warm_up)
+    failed = [name for name, s in statuses.items() if s["status"] == "error"]
+    startup["warmup"] = "failed" if failed else "done"
+    logging.info(f"Startup warm-up {startup['warmup']}" + (f": {', '.join(failed)}" if failed else ""))
+
+async def _follow_document_changes():
+    """Apply the document changes other workers record (WORKERS > 1)."""
+    while True:
+        try:
+            applied = await asyncio.to_thread(apply_shared_document_changes)
+            if applied:
+                logging.info(f"Applied {applied} document change(s) from other workers")
+        except Exception as e:
+            logging.warning(f"Could not read document changes: {e}")
+        await asyncio.sleep(DOCUMENT_CHANGES_POLL_SECONDS)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await asyncio.to_thread(db_utils.init_db)
+    startup["db"] = True
+    tasks = []
+    if STARTUP_WARMUP == "eager":
+        await _warm_up()
+    elif STARTUP_WARMUP == "background":
+        tasks.append(asyncio.create_task(_warm_up()))
+    if WORKERS > 1:
+        tasks.append(asyncio.create_task(_follow_document_changes()))
+    yield
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    db_utils.close_pool()
 
 app = FastAPI(
     title="RAG Agent Assistant API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(chat.router)
 app.include_router(documents.router)
+app.include_router(admin.router)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(_request: Request, exc: Overloaded):
+    """503 (a local queue is full) or 429 (upstream rate limit, busy session), with Retry-After."""
+    return JSONResponse({"detail": str(exc)}, status_code=exc.status_code,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.middleware("http")
+async def telemetry_middleware(request: Request, call_next):
+    trace = start_request(traced=bool(TRACE_REQUEST_HEADER and request.headers.get(TRACE_REQUEST_HEADER)))
+    start_admission()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.labels(request.method, getattr(route, "path", "unmatched")).observe(elapsed)
+    if trace is not None:
+        response.headers["Server-Timing"] = server_timing(trace + [("total", elapsed)])
+    return response
+
+@app.get("/healthz", tags=["Root"])
+def healthz():
+    """Readiness: 200 once the database is open and no component failed to build
+    (and, unless STARTUP_WARMUP=lazy, the warm-up has finished), 503 otherwise."""
+    components = component_status()
+    if not startup["db"] or startup["warmup"] in ("pending", "running"):
+        status = "starting"
+    elif any(c["status"] == "error" for c in components.values()):
+        status = "degraded"
+    else:
+        status = "ok"
+    return JSONResponse({"status": status, "warmup": startup["warmup"], "components": components},
+                        status_code=200 if status == "ok" else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -1,15 +1,33 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
 class ModelName(str, Enum):
+    LLAMA_3_3_70B = "llama-3.3-70b"
+    LLAMA_3_1_8B = "llama3.1-8b"
+    QWEN_3_32B = "qwen-3-32b"
+    # Former names, kept as aliases
     GPT4_1 = "llama-3.3-70b"
     GPT4_1_MINI = "llama-3.3-70b"
 
+# Pipeline stages whose model a request can choose
+Stage = Literal["router", "contextualise", "answer"]
+
+class DocumentFilter(BaseModel):
+    file_ids: List[int] = Field(default_factory=list, description="Only chunks of these documents")
+    tags: List[str] = Field(default_factory=list, description="Only chunks tagged with any of these")
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
 class QueryInput(BaseModel):
     question: str
     session_id: str = Field(default=None)
-    model: ModelName = Field(default=ModelName.GPT4_1_MINI)
+    model: Optional[ModelName] = Field(default=None, description="Model that writes the answer (MODEL_ANSWER if unset)")
+    stage_models: Dict[Stage, ModelName] = Field(default_factory=dict,
+                                                 description="Per-stage models, e.g. a small one for the router")
+    collection: Optional[str] = Field(default=None, description="Collection to search (CHROMA_DEFAULT_COLLECTION if unset)")
+    filters: Optional[DocumentFilter] = None
 
 class QueryResponse(BaseModel):
     answer: str
@@ -19,7 +37,47 @@ class QueryResponse(BaseModel):
 class DocumentInfo(BaseModel):
     id: int
     filename: str
+    collection: str
+    tags: List[str] = Field(default_factory=list)
     upload_timestamp: datetime
 
 class DeleteFileRequest(BaseModel):
-    file_id: int
\ No newline at end of file
+    file_id: int
+
+class IngestionFileStatus(BaseModel):
+    filename: str
+    file_id: int
+    status: str
+    reindex: bool = False
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    error: Optional[str] = None
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    status: str
+    created_at: float
+    finished_at: Optional[float] = None
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_reused: int = 0
+    files: List[IngestionFileStatus]
+
+class SnapshotRequest(BaseModel):
+    name: Optional[str] = Field(default=None, description="Directory under SNAPSHOT_DIR (a timestamp if unset)")
+    collections: List[str] = Field(default_factory=list, description="Collections to export (all if empty)")
+
+class SnapshotImportRequest(BaseModel):
+    collections: List[str] = Field(default_factory=list, description="Collections to import (all if empty)")
+    replace: bool = Field(default=False, description="Overwrite collections that already hold documents")
+    force: bool = Field(default=False, description="Import even if the embedding model differs")
+
+class CompactRequest(BaseModel):
+    collections: List[str] = Field(default_factory=list, description="Collections to compact (all if empty)")
+
+class ConsistencyRequest(BaseModel):
+    repair: bool = False
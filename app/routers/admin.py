@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.config.settings import ADMIN_API_TOKEN, SNAPSHOT_DIR, WORKERS
+from app.models.pydantic_models import CompactRequest, ConsistencyRequest, SnapshotImportRequest, SnapshotRequest
+from app.utils.chroma_utils import UnknownCollectionError
+from app.utils.ingestion import active_files
+from app.utils.maintenance import check_consistency, compact, disk_usage
+from app.utils.snapshot import SnapshotError, export_snapshot, import_snapshot, read_manifest
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin API disabled (set ADMIN_API_TOKEN).")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+_SNAPSHOT_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+# Maintenance rewrites whole collections, so operations run one at a time
+_maintenance_lock = asyncio.Lock()
+
+def _snapshot_path(name: str) -> str:
+    if not _SNAPSHOT_NAME_RE.match(name) or name.endswith(".partial"):
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot name {name!r}.")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+async def _exclusive(fn, *args, idle_ingestion: bool = False, **kwargs):
+    """Run a blocking maintenance call off the event loop, one at a time; 409 while
+    another runs (or, with idle_ingestion, while files are being indexed)."""
+    if _maintenance_lock.locked():
+        raise HTTPException(status_code=409, detail="Another maintenance operation is running.")
+    async with _maintenance_lock:
+        if idle_ingestion and WORKERS > 1:
+            # Other workers may be indexing, and hold handles on the collections being replaced
+            raise HTTPException(status_code=409, detail="Not available with several workers; stop the server "
+                                                        "and use python -m app.cli.")
+        if idle_ingestion and active_files():
+            raise HTTPException(status_code=409, detail="Documents are being indexed; retry when the jobs finish.")
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except UnknownCollectionError as e:
+            raise HTTPException(status_code=404, detail=f"Collection {e.args[0]!r} not found.")
+        except (SnapshotError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/snapshots")
+def list_snapshots():
+    snapshots = []
+    for name in sorted(os.listdir(SNAPSHOT_DIR)) if os.path.isdir(SNAPSHOT_DIR) else []:
+        try:
+            manifest = read_manifest(os.path.join(SNAPSHOT_DIR, name))
+        except (SnapshotError, OSError, json.JSONDecodeError):
+            continue
+        snapshots.append({"name": name, "created_at": manifest["created_at"], "rows": manifest["rows"],
+                          "embedding_model": manifest["embedding_model"],
+                          "collections": list(manifest["collections"])})
+    return {"snapshots": snapshots}
+
+@router.post("/snapshots", status_code=201)
+async def create_snapshot(request: SnapshotRequest):
+    name = request.name or time.strftime("snapshot-%Y%m%d-%H%M%S")
+    path = _snapshot_path(name)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    manifest = await _exclusive(export_snapshot, path, request.collections or None)
+    logging.info(f"Admin: exported snapshot {name} ({manifest['rows']} chunks)")
+    return {
+        "name": name,
+        "rows": manifest["rows"],
+        "bytes": disk_usage(path),
+        "collections": {c: entry["stop"] - entry["start"] for c, entry in manifest["collections"].items()},
+    }
+
+@router.post("/snapshots/{name}/import")
+async def restore_snapshot(name: str, request: SnapshotImportRequest):
+    path = _snapshot_path(name)
+    started = time.perf_counter()
+    summary = await _exclusive(import_snapshot, path, request.collections or None, request.replace,
+                               request.force, idle_ingestion=True)
+    logging.info(f"Admin: imported snapshot {name} into {', '.join(summary)}")
+    return {"collections": summary, "seconds": round(time.perf_counter() - started, 2)}
+
+@router.post("/compact")
+async def compact_stores(request: CompactRequest):
+    return await _exclusive(compact, request.collections or None, idle_ingestion=True)
+
+@router.post("/check")
+async def check_stores(request: ConsistencyRequest):
+    if request.repair and WORKERS > 1:
+        # Files other workers are indexing look like empty documents here, and would be deleted
+        raise HTTPException(status_code=409, detail="Repair is not available with several workers; stop the "
+                                                    "server and use python -m app.cli.")
+    # Files still being indexed legitimately have a record but not all their chunks
+    busy = [f.file_id for f in active_files()]
+    return await _exclusive(check_consistency, request.repair, busy)
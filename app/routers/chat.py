@@ -1,68 +1,363 @@
+import asyncio
+import contextlib
+import json
 import logging
+import time
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from app.models.pydantic_models import QueryInput, QueryResponse, ModelName
-from app.utils.db_utils import insert_chat_history, get_chat_history
-from app.utils.utils import get_or_create_session_id, history_to_lc_messages, append_message
-from app.utils.langchain_utils import contextualise_chain
+from app.models.pydantic_models import DocumentFilter, QueryInput, QueryResponse, ModelName
+from app.utils.utils import get_or_create_session_id, append_message
+from app.utils.memory import load_memory, save_turn
+from app.utils.langchain_utils import build_contextualise_chain, contextualise_chain
 from app.agent.langgraph_agent import agent
+from app.agent.shared import STAGE_MODELS, requested_model
+from app.utils.semantic_cache import answer_cache, scope_key
+from app.utils import chroma_utils
+from app.utils.chroma_utils import UnknownCollectionError, check_collection_name, get_vectorstore
+from app.utils.session_cache import session_cache
+from app.utils.single_flight import SingleFlight, normalize_question
+from app.utils.web_search import web_search_stats
+from app.utils.admission import Overloaded, limit_stats, llm_limit
+from app.utils.capture import finish_capture, note_route, start_capture
+from app.utils.session_lock import session_locks
+from app.utils.fast_router import fast_router
+from app.utils.telemetry import current_trace, debug_enabled, llm_config, log_debug, record, timer
+from app.config.settings import COALESCE_ENABLED, ROUTER_REWRITES_QUESTION, SEMANTIC_CACHE_ENABLED
 from langchain_core.messages import HumanMessage, AIMessage
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 templates = Jinja2Templates(directory="templates")
 
 @router.get("/chat-ui", response_class=HTMLResponse)
 def chat_ui(request: Request):
     return templates.TemplateResponse("chat.html", {"request": request, "messages": []})
 
+def needs_contextualiser(messages) -> bool:
+    """The separate rewrite chain only runs when the router doesn't do it and there is history to resolve."""
+    return not ROUTER_REWRITES_QUESTION and bool(messages)
+
+def request_models(query_input: QueryInput) -> dict:
+    """Stage -> model chosen by this request; `model` picks the answer model."""
+    models = {stage: model.value for stage, model in query_input.stage_models.items()}
+    if query_input.model is not None:
+        models["answer"] = query_input.model.value
+    return models
+
+def chunk_filter(filters: DocumentFilter | None) -> dict | None:
+    """DocumentFilter as the retriever's ChunkFilter (epoch upload bounds), None if empty."""
+    if filters is None:
+        return None
+    out = {}
+    if filters.file_ids:
+        out["file_ids"] = sorted(set(filters.file_ids))
+    if filters.tags:
+        out["tags"] = sorted(set(filters.tags))
+    if filters.uploaded_after is not None:
+        out["uploaded_after"] = int(filters.uploaded_after.timestamp())
+    if filters.uploaded_before is not None:
+        out["uploaded_before"] = int(filters.uploaded_before.timestamp())
+    return out or None
+
+async def request_scope(query_input: QueryInput) -> dict:
+    """Collection and chunk filters of the request; 400 for a malformed
+    collection name, 404 for one nothing was uploaded to."""
+    try:
+        collection = check_collection_name(query_input.collection)
+        await asyncio.to_thread(get_vectorstore, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f"Collection {query_input.collection!r} not found")
+    return {"collection": collection, "filters": chunk_filter(query_input.filters)}
+
+def run_config(models: dict, stage: str | None = None, scope: dict | None = None) -> dict:
+    """llm_config plus the request's models and retrieval scope, which the graph
+    nodes read from `configurable`."""
+    configurable = {"models": models}
+    if scope:
+        configurable["retrieval"] = scope
+    return {**llm_config(stage), "configurable": configurable}
+
+def turn_lock(query_input: QueryInput, session_id: str):
+    """Holds the session's turn slot (see app.utils.session_lock); a session
+    created by this request has no other turn to wait for."""
+    return session_locks.hold(session_id) if query_input.session_id else contextlib.nullcontext()
+
+def answer_model(models: dict) -> ModelName:
+    return ModelName(models.get("answer", STAGE_MODELS["answer"]))
+
+async def contextualise_question(question: str, messages, models: dict | None = None) -> str:
+    if not needs_contextualiser(messages):
+        return question
+    config = run_config(models or {}, "contextualise")
+    model = requested_model("contextualise", config)
+    chain = build_contextualise_chain(model) if model else contextualise_chain
+    with timer("chain", "contextualise"):
+        return await chain.ainvoke({
+            "chat_history": messages,
+            "input": question,
+        }, config=config)
+
+def log_history(session_id: str, messages) -> None:
+    """DEBUG dump of the prompt history, for sampled requests only."""
+    if not debug_enabled(logger):
+        return
+    lines = [f"  Mensaje {i+1} ({type(msg).__name__}): {msg.content}" for i, msg in enumerate(messages)]
+    logger.debug("Historial para Session ID %s (%d mensajes)%s", session_id, len(messages),
+                 "\n" + "\n".join(lines) if lines else ": VACÍO")
+
+# ── Semantic answer cache ────────────────────────────────────────────
+def can_check_cache_early(messages) -> bool:
+    """The standalone question is known before the agent runs on first turns or
+    when contextualise_chain produced it; otherwise router_node checks the cache."""
+    return SEMANTIC_CACHE_ENABLED and (not messages or not ROUTER_REWRITES_QUESTION)
+
+async def lookup_cached_answer(standalone_q: str, models: dict, scope: dict | None = None) -> str | None:
+    try:
+        cached = await answer_cache.alookup(standalone_q, scope_key(scope, answer_model(models).value))
+        return cached.answer if cached else None
+    except Exception as e:
+        logging.warning(f"Semantic cache lookup failed: {e}")
+        return None
+
+async def remember_answer(result: dict, answer: str, models: dict, scope: dict | None = None) -> None:
+    """Cache answers produced through the KB path; history-only and greeting turns are context dependent."""
+    if not SEMANTIC_CACHE_ENABLED or "rag" not in result or result.get("cache_hit") or not result.get("question"):
+        return
+    try:
+        await answer_cache.astore(result["question"], answer, result.get("sources", []),
+                                 scope_key(scope, answer_model(models).value))
+    except Exception as e:
+        logging.warning(f"Semantic cache store failed: {e}")
+
+# ── Request coalescing ───────────────────────────────────────────────
+chat_flights = SingleFlight("chat")
+stream_flights = SingleFlight("stream")
+
+def coalesce_key(standalone_q: str, messages, models: dict, scope: dict | None = None):
+    """Key under which identical in-flight requests share one agent run, or None.
+
+    Only requests without history qualify, since the graph sees the history.
+    Chunk ids are only known inside the graph, so the documents generation
+    stands in for them: a run started before a re-index is not joined after it.
+    """
+    if not COALESCE_ENABLED or messages:
+        return None
+    return (normalize_question(standalone_q), tuple(sorted(models.items())), scope_key(scope),
+            chroma_utils.documents_generation)
+
+@router.get("/chat/cache-stats")
+def cache_stats():
+    embedding_stats = getattr(answer_cache.embeddings, "stats", None)
+    return {
+        "answers": answer_cache.stats(),
+        "embeddings": embedding_stats() if embedding_stats else None,
+        "sessions": session_cache.stats(),
+        "web_search": web_search_stats(),
+        "router": fast_router.stats(),
+        "coalescing": {"chat": chat_flights.stats(), "stream": stream_flights.stats()},
+        "limits": {**limit_stats(), "sessions": session_locks.stats()},
+    }
+
+def turn_route(result: dict) -> str:
+    """Path a turn took, as captured: cache, end (greeting), answer (from the
+    history alone), or the context it was answered with: rag, web, rag+web."""
+    if result.get("cache_hit"):
+        return "cache"
+    if result.get("route") == "end":
+        return "end"
+    kb, web = bool(result.get("rag")), bool(result.get("web"))
+    return "rag+web" if kb and web else "rag" if kb else "web" if web else "answer"
+
+async def run_agent(messages, cache_checked: bool, models: dict, scope: dict | None = None) -> str:
+    result = await agent.ainvoke({"messages": messages, "cache_checked": cache_checked},
+                                 config=run_config(models, scope=scope))
+    note_route(turn_route(result))
+
+    last_message = next((m for m in reversed(result["messages"]) if isinstance(m, AIMessage)), None)
+
+    answer = last_message.content if last_message else "I apologize, but I couldn't generate a response at this time."
+    await remember_answer(result, answer, models, scope)
+    return answer
+
 @router.post("/chat", response_model=QueryResponse)
 async def chat(query_input: QueryInput):
     session_id = get_or_create_session_id(query_input.session_id)
-    logging.info(f"Session ID: {session_id}, User Query: {query_input.question}, Model: {query_input.model.value}")
+    models = request_models(query_input)
+    model = answer_model(models)
+    scope = await request_scope(query_input)
+    logging.info(f"Session ID: {session_id}, User Query: {query_input.question}, Model: {model.value}")
+    capture = start_capture("chat", query_input)
 
+    # No up-front LLM admission check: cache hits and rule-routed turns need no
+    # LLM slot, and the first LLM call fails fast when its queue is full.
     try:
-        chat_history = get_chat_history(session_id)
-        messages = history_to_lc_messages(chat_history)
-
-        print("\n\n--- DEBUG: HISTORIAL DE CHAT DE LA SESIÓN---")
-        print(f"Historial para Session ID: {session_id}")
-
-        if not messages:
-            print("El historial de chat está VACÍO.")
-        else:
-            for i, msg in enumerate(messages):
-                # Imprimimos el tipo de mensaje (Human/AI) y su contenido
-                print(f"  Mensaje {i+1} ({type(msg).__name__}): {msg.content}")
-        print("--------------------------------------------------\n")
-        # --- FIN DEBUG ---
-        
-        standalone_q = await contextualise_chain.ainvoke({
-            "chat_history": messages,
-            "input": query_input.question,
-        })
+        async with turn_lock(query_input, session_id):
+            messages = await load_memory(session_id)
 
-        # --- INICIO DEBUG---
-        print("\n\n--- DEBUG: ENTRADA AL AGENTE---")
-        print(f"Pregunta Original: '{query_input.question}'")
-        print(f"Pregunta Procesada (Standalone): '{standalone_q}'")
-        print("------------------------------------------\n")
-        # --- FIN DEBUG ---
+            log_history(session_id, messages)
 
-        messages = append_message(messages, HumanMessage(content=standalone_q))
-        
-        result = await agent.ainvoke({"messages": messages})
+            standalone_q = await contextualise_question(query_input.question, messages, models)
+            log_debug(logger, "Pregunta original: %r | Pregunta procesada (standalone): %r",
+                      query_input.question, standalone_q)
 
-        last_message = next((m for m in reversed(result["messages"]) if isinstance(m, AIMessage)), None)
-        
-        answer = last_message.content if last_message else "I apologize, but I couldn't generate a response at this time."
+            cache_checked = can_check_cache_early(messages)
+            cached_answer = await lookup_cached_answer(standalone_q, models, scope) if cache_checked else None
 
-        insert_chat_history(session_id, query_input.question, answer, query_input.model.value)
+            if cached_answer is not None:
+                answer = cached_answer
+                note_route("cache")
+            else:
+                key = coalesce_key(standalone_q, messages, models, scope)
+                messages = append_message(messages, HumanMessage(content=standalone_q))
+
+                if key is None:
+                    answer = await run_agent(messages, cache_checked, models, scope)
+                else:
+                    answer, leader = await chat_flights.do(key, lambda: run_agent(messages, cache_checked, models, scope))
+                    if not leader:
+                        note_route("coalesced")
+
+            await save_turn(session_id, query_input.question, answer, model.value)
         logging.info(f"Session ID: {session_id}, AI Response: {answer}")
+        await finish_capture(capture, session_id, answer)
 
-        return QueryResponse(answer=answer, session_id=session_id, model=query_input.model)
+        return QueryResponse(answer=answer, session_id=session_id, model=model)
 
+    except Overloaded as e:
+        logging.warning(f"Session ID: {session_id}, rejected: {e}")
+        raise
     except Exception as e:
         logging.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+
+# ── Streaming (Server-Sent Events) ──────────────────────────────────
+AGENT_NODES = {"router", "rag_lookup", "web_search", "answer"}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _done(data: dict, started: float) -> str:
+    """Final event; traced requests also get their stage timings, since the
+    Server-Timing header has already been sent when the stream starts."""
+    record("stream", "total", time.perf_counter() - started)
+    trace = current_trace()
+    if trace is not None:
+        data = {**data, "trace": [{"stage": name, "ms": round(seconds * 1000, 1)} for name, seconds in trace]}
+    return _sse("done", data)
+
+async def stream_agent(messages, cache_checked: bool, models: dict, scope: dict | None, publish) -> str:
+    """Run the agent, publishing ("node", payload) and ("token", text) events; returns the answer."""
+    streamed = []
+    result = None
+    async for event in agent.astream_events({"messages": messages, "cache_checked": cache_checked},
+                                            config=run_config(models, scope=scope), version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind in ("on_chain_start", "on_chain_end") and event["name"] in AGENT_NODES and node == event["name"]:
+            payload = {"node": node, "status": "start" if kind == "on_chain_start" else "end"}
+            output = event["data"].get("output") if kind == "on_chain_end" else None
+            if node in ("router", "rag_lookup") and isinstance(output, dict) and output.get("route"):
+                payload["route"] = output["route"]
+            publish(("node", payload))
+        elif kind == "on_chat_model_stream" and node == "answer":
+            token = event["data"]["chunk"].content
+            if token:
+                streamed.append(token)
+                publish(("token", token))
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            result = event["data"].get("output")
+
+    last_message = None
+    if isinstance(result, dict):
+        last_message = next((m for m in reversed(result.get("messages", [])) if isinstance(m, AIMessage)), None)
+    answer = last_message.content if last_message else "".join(streamed)
+    if isinstance(result, dict):
+        note_route(turn_route(result))
+    if not answer:
+        answer = "I apologize, but I couldn't generate a response at this time."
+    elif isinstance(result, dict):
+        await remember_answer(result, answer, models, scope)
+    return answer
+
+@router.post("/chat/stream")
+async def chat_stream(query_input: QueryInput):
+    session_id = get_or_create_session_id(query_input.session_id)
+    models = request_models(query_input)
+    model = answer_model(models)
+    scope = await request_scope(query_input)
+    logging.info(f"Session ID: {session_id}, User Query (stream): {query_input.question}, Model: {model.value}")
+    capture = start_capture("stream", query_input)
+    # The status is sent with the first event, so overload is checked before
+    # it; a limit reached later ends the stream with an "error" event instead.
+    llm_limit.check()
+    session_locks.check(session_id)
+
+    async def event_stream():
+        started = time.perf_counter()
+        try:
+            yield _sse("session", {"session_id": session_id})
+
+            async with turn_lock(query_input, session_id):
+                messages = await load_memory(session_id)
+                log_history(session_id, messages)
+
+                if needs_contextualiser(messages):
+                    yield _sse("node", {"node": "contextualise", "status": "start"})
+                    standalone_q = await contextualise_question(query_input.question, messages, models)
+                    yield _sse("node", {"node": "contextualise", "status": "end"})
+                else:
+                    standalone_q = query_input.question
+
+                cache_checked = can_check_cache_early(messages)
+                cached_answer = await lookup_cached_answer(standalone_q, models, scope) if cache_checked else None
+                if cached_answer is not None:
+                    await save_turn(session_id, query_input.question, cached_answer, model.value)
+                    note_route("cache")
+                    await finish_capture(capture, session_id, cached_answer)
+                    yield _sse("node", {"node": "cache", "status": "hit"})
+                    yield _done({"answer": cached_answer, "session_id": session_id, "model": model.value}, started)
+                    return
+
+                key = coalesce_key(standalone_q, messages, models, scope)
+                messages = append_message(messages, HumanMessage(content=standalone_q))
+
+                # The agent runs as a flight even when it cannot be shared, so every
+                # subscriber reads the same event stream; a private key keeps it unshared.
+                flight, leader = stream_flights.join(key if key is not None else object(),
+                                                lambda publish: stream_agent(messages, cache_checked, models, scope, publish))
+                first_token = True
+                async for kind, data in flight.subscribe():
+                    if kind == "token":
+                        if first_token:
+                            record("stream", "first_token", time.perf_counter() - started)
+                            first_token = False
+                        yield _sse("token", {"content": data})
+                    else:
+                        yield _sse("node", data)
+                answer = flight.result
+                if not leader:
+                    note_route("coalesced")
+
+                await save_turn(session_id, query_input.question, answer, model.value)
+            logging.info(f"Session ID: {session_id}, AI Response (stream): {answer}")
+            await finish_capture(capture, session_id, answer)
+
+            yield _done({"answer": answer, "session_id": session_id, "model": model.value}, started)
+
+        except Overloaded as e:
+            logging.warning(f"Session ID: {session_id}, stream rejected: {e}")
+            yield _sse("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+        except Exception as e:
+            logging.error(f"Error in chat stream: {str(e)}")
+            yield _sse("error", {"detail": f"Chat error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,46 +1,92 @@
 import os
 import shutil
+import asyncio
 import logging
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from app.models.pydantic_models import DocumentInfo, DeleteFileRequest
-from app.utils.db_utils import insert_document_record, get_all_documents, delete_document_record
-from app.utils.chroma_utils import index_document_to_chroma, delete_doc_from_chroma
+import tempfile
+from typing import List, Optional
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from app.models.pydantic_models import DocumentInfo, DeleteFileRequest, IngestionJobStatus
+from app.utils.db_utils import get_all_documents, get_document, delete_document_record
+from app.utils.chroma_utils import check_collection_name, delete_doc_from_chroma, list_collections
+from app.utils.ingestion import active_files, submit_job, get_job_state
+from app.utils.loaders import ALLOWED_EXTENSIONS
 
 router = APIRouter()
 
-@router.post("/upload-doc")
-def upload_and_index_document(file: UploadFile = File(...)):
-    allowed_extensions = ['.pdf', '.docx', '.html']
-    file_extension = os.path.splitext(file.filename)[1].lower()
-    
-    if file_extension not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type. Allowed types are: {', '.join(allowed_extensions)}")
-    
-    temp_file_path = f"temp_{file.filename}"
-    
+def _save_upload(upload: UploadFile) -> str:
+    """Copy an upload into its own temp directory, keeping the extension for the loader."""
+    temp_dir = tempfile.mkdtemp(prefix="upload_")
+    temp_file_path = os.path.join(temp_dir, os.path.basename(upload.filename))
+    with open(temp_file_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+    return temp_file_path
+
+def _parse_tags(tags: Optional[str]) -> List[str]:
+    """Comma-separated form field -> distinct, trimmed tags."""
+    return sorted({tag.strip() for tag in (tags or "").split(",") if tag.strip()})
+
+@router.post("/upload-doc", status_code=202)
+async def upload_and_index_documents(file: Optional[UploadFile] = File(None),
+                                     files: Optional[List[UploadFile]] = File(None),
+                                     collection: Optional[str] = Form(None),
+                                     tags: Optional[str] = Form(None)):
+    uploads = ([file] if file else []) + (files or [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files were uploaded.")
     try:
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        file_id = insert_document_record(file.filename)
-        success = index_document_to_chroma(temp_file_path, file_id)
-        
-        if success:
-            return {"message": f"File {file.filename} has been successfully uploaded and indexed.", "file_id": file_id}
-        else:
-            delete_document_record(file_id)
-            raise HTTPException(status_code=500, detail=f"Failed to index {file.filename}.")
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+        collection = check_collection_name(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for upload in uploads:
+        file_extension = os.path.splitext(upload.filename)[1].lower()
+        if file_extension not in ALLOWED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type for {upload.filename}. Allowed types are: {', '.join(ALLOWED_EXTENSIONS)}")
+
+    saved = []
+    try:
+        for upload in uploads:
+            saved.append((upload.filename, await asyncio.to_thread(_save_upload, upload)))
+        job = await asyncio.to_thread(submit_job, saved, collection, _parse_tags(tags))
+    except Exception as e:
+        for _, path in saved:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        logging.error(f"Error queueing upload: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue upload: {e}")
+
+    return {
+        "message": f"{len(saved)} file(s) queued for indexing.",
+        "job_id": job.id,
+        "collection": collection,
+        "files": [{"filename": f.filename, "file_id": f.file_id, "status": f.status, "reindex": f.reindex}
+                  for f in job.files],
+    }
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+def get_ingestion_job(job_id: str):
+    state = get_job_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return state
 
 @router.get("/list-docs", response_model=list[DocumentInfo])
-def list_documents():
-    return get_all_documents()
+def list_documents(collection: Optional[str] = None):
+    return get_all_documents(collection)
+
+@router.get("/collections")
+def get_collections():
+    return {"collections": list_collections()}
 
 @router.post("/delete-doc")
 def delete_document(request: DeleteFileRequest):
-    chroma_delete_success = delete_doc_from_chroma(request.file_id)
+    document = get_document(request.file_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Document {request.file_id} not found.")
+    if request.file_id in {f.file_id for f in active_files()}:
+        # Its chunks are still being written; deleting now would leave them orphaned
+        raise HTTPException(status_code=409, detail=f"Document {request.file_id} is being indexed; "
+                                                    "retry when its job finishes.")
+    chroma_delete_success = delete_doc_from_chroma(request.file_id, document["collection"])
 
     if chroma_delete_success:
         db_delete_success = delete_document_record(request.file_id)
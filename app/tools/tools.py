@@ -1,41 +1,122 @@
-from langchain_tavily import TavilySearch
+from typing import Optional
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from app.utils.chroma_utils import vectorstore
+from app.utils.chroma_utils import check_collection_name, collection_listeners, ensure_lexical_index, get_vectorstore
+from app.utils.lazy import Lazy
+from app.utils.hybrid_search import build_retriever
+from app.config.settings import CAPTURE_ENABLED, CHROMA_DEFAULT_COLLECTION, RETRIEVAL_MODE, SEARCH_BACKEND
+from app.utils.admission import Overloaded, search_limit
+from app.utils.telemetry import log_debug, timer
+from app.utils.web_search import search_cache, search_call
+import logging
 import os
+import threading
 
-# Initialize Tavily search
-tavily = TavilySearch(max_results=3, topic="general")
+logger = logging.getLogger(__name__)
 
-# Create retriever from vectorstore
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+def build_search_client():
+    """Tavily client, or the in-process stand-in when SEARCH_BACKEND=fake (replay:
+    the results of a traffic capture); recorded when capture is on."""
+    if SEARCH_BACKEND == "fake":
+        from app.utils.offline import FakeTavilySearch
+        client = FakeTavilySearch(max_results=3)
+    elif SEARCH_BACKEND == "replay":
+        from app.utils.replay import ReplaySearch
+        client = ReplaySearch(max_results=3)
+    else:
+        from langchain_tavily import TavilySearch
+        client = TavilySearch(max_results=3, topic="general")
+    if CAPTURE_ENABLED:
+        from app.utils.capture import RecordingSearch
+        return RecordingSearch(client)
+    return client
+
+def _build_retriever(collection: str = CHROMA_DEFAULT_COLLECTION):
+    # Dense + BM25 retriever over a collection's chunks (RETRIEVAL_MODE)
+    if RETRIEVAL_MODE != "dense":
+        ensure_lexical_index(collection)
+    return build_retriever(get_vectorstore(collection), collection=collection)
+
+# Both are built on first use (or by the startup warm-up)
+tavily = Lazy("web_search", build_search_client)
+retriever = Lazy("retriever", _build_retriever)
+
+_collection_retrievers = {}
+_collection_retrievers_lock = threading.Lock()
+
+def retriever_for(collection: Optional[str] = None):
+    """Retriever of a collection, built on its first query; UnknownCollectionError if it does not exist."""
+    collection = check_collection_name(collection)
+    if collection == CHROMA_DEFAULT_COLLECTION:
+        return retriever
+    with _collection_retrievers_lock:
+        if collection not in _collection_retrievers:
+            _collection_retrievers[collection] = _build_retriever(collection)
+        return _collection_retrievers[collection]
+
+def forget_retriever(collection: str) -> None:
+    """Drop the retriever of a replaced collection; its next query builds one on the new collection."""
+    if collection == CHROMA_DEFAULT_COLLECTION:
+        retriever.reset()
+    with _collection_retrievers_lock:
+        _collection_retrievers.pop(collection, None)
+
+collection_listeners.append(forget_retriever)
+
+def retrieval_scope(config: Optional[RunnableConfig]) -> dict:
+    """{"collection", "filters"} the current run asked for (see routers.chat.request_scope)."""
+    return ((config or {}).get("configurable") or {}).get("retrieval") or {}
+
+def format_search_results(result) -> str:
+    # Extract and format the results from Tavily response
+    if isinstance(result, dict) and 'results' in result:
+        formatted_results = []
+        for item in result['results']:
+            title = item.get('title', 'No title')
+            content = item.get('content', 'No content')
+            url = item.get('url', '')
+            formatted_results.append(f"Title: {title}\nContent: {content}\nURL: {url}")
+
+        return "\n\n".join(formatted_results) if formatted_results else "No results found"
+    return str(result)
 
 @tool
-def web_search_tool(query: str) -> str:
+async def web_search_tool(query: str) -> str:
     """Up-to-date web info via Tavily"""
     try:
-        result = tavily.invoke({"query": query})
-
-        # Extract and format the results from Tavily response
-        if isinstance(result, dict) and 'results' in result:
-            formatted_results = []
-            for item in result['results']:
-                title = item.get('title', 'No title')
-                content = item.get('content', 'No content')
-                url = item.get('url', '')
-                formatted_results.append(f"Title: {title}\nContent: {content}\nURL: {url}")
-
-            return "\n\n".join(formatted_results) if formatted_results else "No results found"
-        else:
-            return str(result)
+        cached = await search_cache.aget(query) if search_cache else None
+        if cached is not None:
+            return cached
+
+        try:
+            async with search_limit.slot():
+                with timer("tool", "web_search"):
+                    result = await search_call(lambda: tavily.ainvoke({"query": query}))
+        except Overloaded:
+            # Like a missed deadline: answered from the KB context alone
+            logger.warning(f"Web search queue full, continuing without it: {query}")
+            return ""
+        if result is None:
+            # Past the deadline: the answer goes ahead with the KB context only
+            logger.warning(f"Web search exceeded {search_call.timeout_seconds * 1000:.0f} ms, "
+                           f"continuing without it: {query}")
+            return ""
+
+        formatted = format_search_results(result)
+        if search_cache and isinstance(result, dict) and 'results' in result:
+            await search_cache.aput(query, formatted)
+        return formatted
     except Exception as e:
         return f"WEB_ERROR::{e}"
 
-@tool
-def rag_search_tool(query: str) -> str:
-    """Top-3 chunks from KB (empty string if none)"""
+@tool(response_format="content_and_artifact")
+async def rag_search_tool(query: str, config: RunnableConfig) -> tuple[str, list]:
+    """Best-matching chunks from KB (empty string if none)"""
     try:
-        docs = retriever.invoke(query)
-        print(f"RAG DEBUG: Query: {query} | Docs: {[d.page_content for d in docs]}")
-        return "\n\n".join(d.page_content for d in docs) if docs else ""
+        scope = retrieval_scope(config)
+        with timer("tool", "rag_search"):
+            docs = await retriever_for(scope.get("collection")).ainvoke(query, filters=scope.get("filters"))
+        log_debug(logger, "RAG query: %s | %d docs: %s", query, len(docs), [d.page_content for d in docs])
+        return ("\n\n".join(d.page_content for d in docs) if docs else ""), docs
     except Exception as e:
-        return f"RAG_ERROR::{e}"
\ No newline at end of file
+        return f"RAG_ERROR::{e}", []
\ No newline at end of file
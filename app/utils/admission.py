@@ -0,0 +1,241 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.config.settings import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_MS,
+    SEARCH_MAX_CONCURRENCY,
+    SEARCH_MAX_QUEUE,
+    SEARCH_QUEUE_TIMEOUT_MS,
+    UPSTREAM_RETRY_AFTER_SECONDS,
+    WORKERS,
+)
+from app.utils.telemetry import count_rejection, record
+
+
+class Overloaded(Exception):
+    """The request cannot be served now; answered with `status_code` and a
+    Retry-After of `retry_after` seconds (see the handler in app.main)."""
+
+    def __init__(self, backend: str, reason: str, retry_after: float, status_code: int = 503):
+        super().__init__(f"{backend} overloaded ({reason}), retry after {retry_after:.0f} s")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.status_code = status_code
+        count_rejection(backend, reason)
+
+
+def upstream_retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait if `error` is an upstream 429 (OpenAI-style SDK errors
+    carry status_code and the response), else None."""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return UPSTREAM_RETRY_AFTER_SECONDS
+
+
+# ── Per-request admission ────────────────────────────────────────────
+# Backends a request already got a slot from. Its later calls to them (the
+# answer after the router) queue ahead of new requests: rejecting a request
+# halfway through would waste the calls it already made.
+_admitted: ContextVar[Optional[Set[str]]] = ContextVar("rag_admitted", default=None)
+
+
+def start_admission() -> None:
+    _admitted.set(set())
+
+
+# ── Per-backend limits ───────────────────────────────────────────────
+# A semaphore with a bounded FIFO queue in front of it. Waiting callers are
+# counted, so a full queue rejects new callers at once instead of letting
+# them pile up behind calls that would not start before they time out.
+class BackendLimit:
+    """At most `max_concurrent` holders (0: unlimited); up to `max_queue`
+    callers wait for `queue_timeout` seconds, any more raise Overloaded."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Calls of requests already admitted; served first, never queue_full
+        self._priority: Deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold_seconds = 1.0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @classmethod
+    def per_worker(cls, name: str, max_concurrent: int, max_queue: int, queue_timeout_ms: float) -> "BackendLimit":
+        """Limit for one of WORKERS processes sharing the deployment-wide values."""
+        share = lambda n: max(1, n // WORKERS) if n > 0 else 0
+        return cls(name, share(max_concurrent), max(0, max_queue) // WORKERS, queue_timeout_ms / 1000)
+
+    @property
+    def unlimited(self) -> bool:
+        return self.max_concurrent <= 0
+
+    def retry_after(self) -> float:
+        """Rough time until a new caller would get a slot."""
+        if self.unlimited:
+            return 1
+        return self._hold_seconds * (len(self._priority) + len(self._waiters) + 1) / self.max_concurrent
+
+    def check(self) -> None:
+        """Raise Overloaded now if a new caller could not even queue; lets a
+        request be turned away before any of its work is done."""
+        if not self.unlimited and self._in_flight >= self.max_concurrent and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue_full", self.retry_after())
+
+    async def acquire(self) -> None:
+        if self.unlimited:
+            return
+        admitted = _admitted.get()
+        if self._in_flight < self.max_concurrent and not self._waiters and not self._priority:
+            self._in_flight += 1
+            self.admitted += 1
+            if admitted is not None:
+                admitted.add(self.name)
+            return
+        priority = admitted is not None and self.name in admitted
+        if not priority:
+            self.check()
+        queue = self._priority if priority else self._waiters
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._discard(queue, waiter)
+            raise
+        if not waiter.done():
+            self._discard(queue, waiter)
+            self.rejected += 1
+            record("queue", self.name, time.perf_counter() - started, error=True)
+            raise Overloaded(self.name, "queue_timeout", self.retry_after())
+        self.admitted += 1
+        if admitted is not None:
+            admitted.add(self.name)
+        record("queue", self.name, time.perf_counter() - started)
+
+    def _discard(self, queue: Deque[asyncio.Future], waiter: asyncio.Future) -> None:
+        # A slot handed over just before the caller gave up is passed on
+        if waiter.done() and not waiter.cancelled():
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        if self.unlimited:
+            return
+        if held_seconds is not None:
+            self._hold_seconds += 0.1 * (held_seconds - self._hold_seconds)
+        for queue in (self._priority, self._waiters):
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    # The slot goes straight to the oldest waiter; _in_flight is unchanged
+                    waiter.set_result(None)
+                    return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent or None,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "waiting_admitted": len(self._priority),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "hold_ms": round(self._hold_seconds * 1000, 1),
+        }
+
+
+class LimitedRunnable(Runnable):
+    """Runs `bound` (a chat model or structured-output chain) under `limit`,
+    turning an upstream 429 into Overloaded. The config is passed through
+    untouched, so callbacks and streamed events still come from `bound`."""
+
+    def __init__(self, bound: Runnable, limit: BackendLimit):
+        self.bound = bound
+        self.limit = limit
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_name(self, suffix: Optional[str] = None, *, name: Optional[str] = None) -> str:
+        return self.bound.get_name(suffix, name=name)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # Sync callers (scripts) are not limited: the queue lives on the event loop
+        return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        async with self.limit.slot():
+            try:
+                return await self.bound.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                self._raise_if_rate_limited(e)
+                raise
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AsyncIterator[Any]:
+        async with self.limit.slot():
+            try:
+                async for chunk in self.bound.astream(input, config, **kwargs):
+                    yield chunk
+            except Exception as e:
+                self._raise_if_rate_limited(e)
+                raise
+
+    def _raise_if_rate_limited(self, error: Exception) -> None:
+        retry_after = upstream_retry_after(error)
+        if retry_after is not None:
+            self.limit.rejected += 1
+            raise Overloaded(self.limit.name, "upstream_429", retry_after, status_code=429) from error
+
+
+llm_limit = BackendLimit.per_worker("llm", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_MS)
+search_limit = BackendLimit.per_worker("search", SEARCH_MAX_CONCURRENCY, SEARCH_MAX_QUEUE, SEARCH_QUEUE_TIMEOUT_MS)
+
+
+def limit_stats() -> Dict[str, dict]:
+    return {limit.name: limit.stats() for limit in (llm_limit, search_limit)}
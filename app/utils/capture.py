@@ -0,0 +1,286 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import BaseMessage, HumanMessage, convert_to_messages
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from app.config.settings import CAPTURE_ENABLED, CAPTURE_PATH
+from app.utils.telemetry import track_llm_usage
+
+# Traffic capture (CAPTURE_ENABLED): each answered chat turn becomes one JSONL
+# line with the request, the route it took, the answer, its latency and the
+# upstream calls it made (LLM outputs and tokens, query embeddings, search
+# results), each under a hash of what was sent. Calls made outside a turn
+# (start-up warm-up, background summaries) get a line of their own. The
+# 'replay' backends (app.utils.replay) answer from these lines.
+
+
+# ── Request keys ─────────────────────────────────────────────────────
+def _digest(*parts: Any) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def as_messages(input: Any) -> List[BaseMessage]:
+    """Chat-model input (prompt value, string or message list) as messages."""
+    if isinstance(input, PromptValue):
+        return input.to_messages()
+    if isinstance(input, str):
+        return [HumanMessage(content=input)]
+    return convert_to_messages(input)
+
+
+def llm_key(model: str, schema: Optional[str], input: Any) -> str:
+    return _digest("llm", model, schema, [[m.type, m.content] for m in as_messages(input)])
+
+
+def embedding_key(model: str, text: str) -> str:
+    return _digest("embedding", model, text)
+
+
+def search_key(query: str) -> str:
+    return _digest("search", query)
+
+
+def encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+
+# ── Turn records ─────────────────────────────────────────────────────
+class TurnCapture:
+    """What one chat turn sent upstream and how it ended."""
+
+    def __init__(self, endpoint: str, request: dict):
+        self.endpoint = endpoint
+        self.request = request
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.route: Optional[str] = None
+        self.upstream: List[dict] = []
+        self.replay_misses: Dict[str, int] = {}
+
+    def record(self, session_id: str, answer: str) -> dict:
+        record = {
+            "type": "turn",
+            "ts": round(self.started, 3),
+            "endpoint": self.endpoint,
+            "session_id": session_id,
+            "request": self.request,
+            "route": self.route or "unknown",
+            "answer": answer,
+            "latency_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "upstream": self.upstream,
+        }
+        if self.replay_misses:
+            record["replay_misses"] = self.replay_misses
+        return record
+
+
+_current: ContextVar[Optional[TurnCapture]] = ContextVar("rag_capture", default=None)
+_write_lock = threading.Lock()
+
+
+def _append(record: dict) -> None:
+    line = (json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+    with _write_lock:
+        directory = os.path.dirname(CAPTURE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One O_APPEND write per line, so the lines of several workers never interleave
+        fd = os.open(CAPTURE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def start_capture(endpoint: str, request: BaseModel) -> Optional[TurnCapture]:
+    """Starts recording the current turn (None when capture is off)."""
+    if not CAPTURE_ENABLED:
+        return None
+    capture = TurnCapture(endpoint, request.model_dump(mode="json", exclude_none=True))
+    _current.set(capture)
+    return capture
+
+
+def note_route(route: str) -> None:
+    capture = _current.get()
+    if capture is not None and capture.route is None:
+        capture.route = route
+
+
+def note_replay_miss(kind: str) -> None:
+    capture = _current.get()
+    if capture is not None:
+        capture.replay_misses[kind] = capture.replay_misses.get(kind, 0) + 1
+
+
+def record_upstream(entry: dict) -> None:
+    capture = _current.get()
+    if capture is not None:
+        capture.upstream.append(entry)
+        return
+    try:
+        _append({"type": "upstream", "ts": round(time.time(), 3), "upstream": [entry]})
+    except Exception as e:
+        logging.warning(f"Could not write a captured {entry['kind']} call: {e}")
+
+
+async def finish_capture(capture: Optional[TurnCapture], session_id: str, answer: str) -> None:
+    if capture is None:
+        return
+    try:
+        await asyncio.to_thread(_append, capture.record(session_id, answer))
+    except Exception as e:
+        logging.warning(f"Could not write the captured turn of session {session_id}: {e}")
+
+
+# ── Recording wrappers ───────────────────────────────────────────────
+def _dump_output(output: Any) -> dict:
+    # Messages are pydantic models too
+    if isinstance(output, BaseMessage):
+        return {"content": output.content}
+    if isinstance(output, BaseModel):
+        return {"structured": output.model_dump(mode="json")}
+    return {"content": str(output)}
+
+
+class RecordingRunnable(Runnable):
+    """Runs a stage LLM (see app.agent.shared.stage_llm) and records each async
+    call: output, latency (and time to first token when streamed) and tokens."""
+
+    def __init__(self, bound: Runnable, model: str, schema: Optional[type] = None):
+        self.bound = bound
+        self.model = model
+        self.schema = schema.__name__ if schema else None
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_name(self, suffix: Optional[str] = None, *, name: Optional[str] = None) -> str:
+        return self.bound.get_name(suffix, name=name)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        with track_llm_usage() as usage:
+            output = await self.bound.ainvoke(input, config, **kwargs)
+        self._record(input, output, usage, started)
+        return output
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs: Any) -> AsyncIterator[Any]:
+        started = time.perf_counter()
+        first_token, merged = None, None
+        async for chunk in self.bound.astream(input, config, **kwargs):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            merged = chunk if merged is None else merged + chunk
+            yield chunk
+        # Streams carry their usage on the last chunk
+        usage = getattr(merged, "usage_metadata", None) or {}
+        self._record(input, merged, {"prompt_tokens": usage.get("input_tokens", 0),
+                                     "completion_tokens": usage.get("output_tokens", 0)}, started, first_token)
+
+    def _record(self, input: Any, output: Any, usage: dict, started: float,
+                first_token: Optional[float] = None) -> None:
+        entry = {
+            "kind": "llm",
+            "model": self.model,
+            "schema": self.schema,
+            "key": llm_key(self.model, self.schema, input),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            **usage,
+            "output": _dump_output(output),
+        }
+        if first_token is not None:
+            entry["first_token_ms"] = round(first_token * 1000, 1)
+        record_upstream(entry)
+
+
+class RecordingEmbeddings(Embeddings):
+    """Records the query vectors handed out by the embedding function, cache
+    hits included; document embeddings (ingestion) are not replayed."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        # model, stats(), ... of the wrapped CachingEmbeddings
+        return getattr(self.inner, name)
+
+    def _record(self, texts: List[str], vectors: List[List[float]], started: float) -> None:
+        ms = round((time.perf_counter() - started) * 1000 / max(1, len(texts)), 2)
+        for text, vector in zip(texts, vectors):
+            record_upstream({"kind": "embedding", "model": self.inner.model, "key": embedding_key(self.inner.model, text),
+                             "ms": ms, "vector": encode_vector(vector)})
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        vector = self.inner.embed_query(text)
+        self._record([text], [vector], started)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        vectors = self.inner.embed_queries(texts)
+        self._record(texts, vectors, started)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        started = time.perf_counter()
+        vector = await self.inner.aembed_query(text)
+        self._record([text], [vector], started)
+        return vector
+
+
+class RecordingSearch:
+    """Records the results the web-search client returns for each query."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def _record(self, input: dict, result: Any, started: float) -> None:
+        record_upstream({"kind": "search", "key": search_key(input["query"]), "query": input["query"],
+                         "ms": round((time.perf_counter() - started) * 1000, 1), "result": result})
+
+    def invoke(self, input: dict, config: Optional[RunnableConfig] = None) -> Any:
+        started = time.perf_counter()
+        result = self.inner.invoke(input, config)
+        self._record(input, result, started)
+        return result
+
+    async def ainvoke(self, input: dict, config: Optional[RunnableConfig] = None) -> Any:
+        started = time.perf_counter()
+        result = await self.inner.ainvoke(input, config)
+        self._record(input, result, started)
+        return result
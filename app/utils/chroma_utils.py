@@ -1,62 +1,332 @@
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredHTMLLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
 from langchain_core.documents import Document
+from app.config.settings import (EMBED_BATCH_SIZE, CHROMA_WRITE_BATCH_SIZE, CHROMA_PERSIST_DIR,
+                                 CHROMA_DEFAULT_COLLECTION, CHROMA_SERVER_URL, WORKERS)
+from app.utils.db_utils import (get_chunk_records, insert_chunk_records, delete_chunk_records,
+                                insert_chunk_search_rows, delete_chunk_search_rows, delete_chunk_search_file,
+                                count_chunk_search_rows, clear_chunk_search_index, delete_collection_records,
+                                replace_collection_records, record_document_change, get_document_changes,
+                                get_last_document_change_id)
+from app.utils.utils import text_sha256
+from app.utils.embeddings import build_embedding_function
+from app.utils.lazy import Lazy
+from collections import defaultdict
 import os
+import re
+import json
+import logging
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
-embedding_function = embedding_function = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
-    google_api_key=GEMINI_API_KEY
-)
-vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=embedding_function)
-
-def load_and_split_document(file_path: str) -> List[Document]:
-    if file_path.endswith('.pdf'):
-        loader = PyPDFLoader(file_path)
-    elif file_path.endswith('.docx'):
-        loader = Docx2txtLoader(file_path)
-    elif file_path.endswith('.html'):
-        loader = UnstructuredHTMLLoader(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {file_path}")
-    
-    documents = loader.load()
-    return text_splitter.split_documents(documents)
-
-def index_document_to_chroma(file_path: str, file_id: int) -> bool:
-    try:
-        splits = load_and_split_document(file_path)
-        
-        # Add metadata to each split
-        for split in splits:
-            split.metadata['file_id'] = file_id
-        
-        vectorstore.add_documents(splits)
-        # vectorstore.persist()
-        return True
-    except Exception as e:
-        print(f"Error indexing document: {e}")
-        return False
 
-def delete_doc_from_chroma(file_id: int):
+# ── Collections ──────────────────────────────────────────────────────
+# One persistent client serves every collection; a collection is a tenant or
+# knowledge base with its own HNSW index, so its queries never touch (or pay
+# for) another tenant's chunks.
+_COLLECTION_NAME_RE = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._-]{1,126}[a-zA-Z0-9]$")
+# Rebuilt copies (imports, compaction) are written under a staging name first
+_STAGING_RE = re.compile(r"\.staging-[0-9a-f]{8}$")
+
+class UnknownCollectionError(KeyError):
+    pass
+
+def check_collection_name(name: Optional[str]) -> str:
+    """`name`, or the default collection when unset; ValueError if Chroma would reject it."""
+    name = name or CHROMA_DEFAULT_COLLECTION
+    if not _COLLECTION_NAME_RE.match(name):
+        raise ValueError(f"Invalid collection name {name!r}: use 3-128 letters, digits, '.', '_' or '-', "
+                         "starting and ending with a letter or digit")
+    return name
+
+def _build_client():
+    import chromadb
+    if CHROMA_SERVER_URL:
+        # Several workers must not open the same persist directory in process
+        url = urlparse(CHROMA_SERVER_URL)
+        https = url.scheme == "https"
+        return chromadb.HttpClient(host=url.hostname, port=url.port or (443 if https else 80), ssl=https)
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+
+# Opening the persistent store (and importing chromadb) is deferred to first use
+embedding_function = Lazy("embeddings", build_embedding_function)
+chroma_client = Lazy("chroma_client", _build_client)
+
+_stores: Dict[str, object] = {}
+_stores_lock = threading.Lock()
+
+def list_collections(include_staging: bool = False) -> List[str]:
+    return sorted(c.name for c in chroma_client.list_collections() if include_staging or not is_staging(c.name))
+
+def is_staging(name: str) -> bool:
+    return bool(_STAGING_RE.search(name))
+
+def get_vectorstore(collection: Optional[str] = None, create: bool = False):
+    """LangChain Chroma store over `collection` (the default one when None).
+
+    Unknown collections raise UnknownCollectionError unless `create` is set
+    (uploads create them; queries never do). The default always exists.
+    """
+    from langchain_chroma import Chroma
+
+    name = check_collection_name(collection)
+    store = _stores.get(name)
+    if store is not None:
+        return store
+    with _stores_lock:
+        if name not in _stores:
+            if not create and name != CHROMA_DEFAULT_COLLECTION and name not in list_collections(include_staging=True):
+                raise UnknownCollectionError(name)
+            _stores[name] = Chroma(client=chroma_client.get(), collection_name=name,
+                                   embedding_function=embedding_function.get())
+        return _stores[name]
+
+vectorstore = Lazy("vectorstore", get_vectorstore)
+
+# Callbacks run with a collection's name when it is dropped or replaced, so
+# anything holding a handle on it (retrievers) builds a new one.
+collection_listeners: List[Callable[[str], None]] = []
+
+def forget_collection(name: str) -> None:
+    with _stores_lock:
+        _stores.pop(name, None)
+    if name == CHROMA_DEFAULT_COLLECTION:
+        vectorstore.reset()
+    for listener in collection_listeners:
+        try:
+            listener(name)
+        except Exception as e:
+            logging.error(f"Error notifying replacement of collection {name}: {e}")
+
+def staging_name(name: str) -> str:
+    """Unused collection name that a rebuilt copy of `name` is written to before replacing it."""
+    return f"{name[:100].rstrip('._-')}.staging-{uuid.uuid4().hex[:8]}"
+
+def iter_chunks(collection: str, include: Sequence[str] = ("documents", "metadatas"),
+                page_size: int = CHROMA_WRITE_BATCH_SIZE) -> Iterator[dict]:
+    """Pages of a collection's chunks as returned by Chroma's get()."""
+    offset = 0
+    while True:
+        page = get_vectorstore(collection)._collection.get(include=list(include), limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += page_size
+
+def replace_collection(staging: str, name: str, move_records: bool = True) -> None:
+    """Swap the Chroma collection `staging` in for `name`. With move_records the
+    document records and BM25 rows written under `staging` replace those of
+    `name` too; otherwise they are kept (staging is a copy of the same chunks).
+
+    New handles on `name` wait for the swap; retrievers still holding the old
+    collection fail until collection_listeners have run.
+    """
+    with _stores_lock:
+        _stores.pop(name, None)
+        _stores.pop(staging, None)
+        if name in list_collections(include_staging=True):
+            chroma_client.delete_collection(name)
+        chroma_client.get_collection(staging).modify(name=name)
+    dropped = replace_collection_records(staging, name) if move_records else []
+    forget_collection(staging)
+    forget_collection(name)
+    if dropped:
+        notify_documents_changed(dropped)
+
+def drop_collection(name: str) -> List[int]:
+    """Delete a collection with its document records and BM25 rows; returns the dropped file_ids."""
+    with _stores_lock:
+        _stores.pop(name, None)
+        if name in list_collections(include_staging=True):
+            chroma_client.delete_collection(name)
+    file_ids = delete_collection_records(name)
+    forget_collection(name)
+    notify_documents_changed(file_ids)
+    return file_ids
+
+# Callbacks run with the affected file_ids whenever their chunks are added or
+# removed (e.g. the semantic answer cache drops answers built from them).
+document_listeners: List[Callable[[List[int]], None]] = []
+# Bumped on every such change; work keyed on it never mixes old and new chunks
+documents_generation = 0
+
+def notify_documents_changed(file_ids: List[int], shared: bool = True) -> None:
+    """Run the document listeners; with several workers the change is also
+    recorded for the others (see apply_shared_document_changes)."""
+    global documents_generation
+    documents_generation += 1
+    if shared and WORKERS > 1:
+        try:
+            record_document_change(file_ids)
+        except Exception as e:
+            logging.error(f"Error recording document change for {file_ids}: {e}")
+    for listener in document_listeners:
+        try:
+            listener(file_ids)
+        except Exception as e:
+            logging.error(f"Error notifying document change for {file_ids}: {e}")
+
+_last_document_change = None
+
+def apply_shared_document_changes() -> int:
+    """Notify this worker's listeners of the changes other workers recorded
+    since the last call (the first call only takes note of where the log
+    ends); returns how many were applied."""
+    global _last_document_change
+    if _last_document_change is None:
+        _last_document_change = get_last_document_change_id()
+        return 0
+    applied = 0
+    for change_id, pid, file_ids in get_document_changes(_last_document_change):
+        _last_document_change = change_id
+        if pid != os.getpid():
+            notify_documents_changed(file_ids, shared=False)
+            applied += 1
+    return applied
+
+def write_chunks(collection: str, ids: List[str], splits: List[Document], vectors: List[List[float]]) -> None:
+    """Write embedded chunks to a collection and its BM25 rows (no chunk records)."""
+    get_vectorstore(collection)._collection.add(
+        ids=ids,
+        embeddings=vectors,
+        metadatas=[split.metadata for split in splits],
+        documents=[split.page_content for split in splits],
+    )
+    insert_chunk_search_rows(
+        (chunk_id, collection, split.metadata.get('file_id'), split.page_content, json.dumps(split.metadata))
+        for chunk_id, split in zip(ids, splits)
+    )
+
+def _delete_chunks(collection: str, ids: List[str]) -> None:
+    get_vectorstore(collection)._collection.delete(ids=ids)
+    delete_chunk_search_rows(ids)
+
+def rebuild_lexical_index(collection: Optional[str] = None, page_size: int = 1000) -> int:
+    """Refill a collection's BM25 rows from Chroma (for chunks indexed before they existed)."""
+    collection = check_collection_name(collection)
+    clear_chunk_search_index(collection)
+
+    total, offset = 0, 0
+    while True:
+        page = get_vectorstore(collection)._collection.get(include=["documents", "metadatas"],
+                                                           limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        insert_chunk_search_rows(
+            (chunk_id, collection, (metadata or {}).get('file_id'), text, json.dumps(metadata or {}))
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+        )
+        total += len(page["ids"])
+        offset += page_size
+    return total
+
+def ensure_lexical_index(collection: Optional[str] = None) -> None:
+    collection = check_collection_name(collection)
+    if count_chunk_search_rows(collection) == 0 and get_vectorstore(collection)._collection.count() > 0:
+        logging.info(f"Rebuilt BM25 index of {collection} with {rebuild_lexical_index(collection)} chunks")
+
+def add_chunks(splits: List[Document], file_id: int,
+               on_progress: Optional[Callable[[int], None]] = None,
+               ids: Optional[List[str]] = None, collection: Optional[str] = None,
+               tags: Optional[List[str]] = None) -> List[str]:
+    """Embed splits in batches of EMBED_BATCH_SIZE and write them to Chroma in
+    bulk writes of CHROMA_WRITE_BATCH_SIZE. on_progress gets the running count
+    of embedded chunks. Chunks written by this call are removed on failure.
+    Every chunk is stamped with file_id, uploaded_at (epoch seconds) and
+    `tags`, the metadata retrieval filters on. Returns the Chroma ids of the
+    new chunks."""
+    from langchain_community.vectorstores.utils import filter_complex_metadata
+
+    collection = check_collection_name(collection)
+    get_vectorstore(collection, create=True)
+    for split in splits:
+        split.metadata['file_id'] = file_id
+    splits = filter_complex_metadata(splits)
+    uploaded_at = int(time.time())
+    for split in splits:
+        split.metadata['uploaded_at'] = uploaded_at
+        if tags:
+            # Lists pass Chroma (filtered with $contains) but not filter_complex_metadata
+            split.metadata['tags'] = list(tags)
+    ids = ids or [str(uuid.uuid4()) for _ in splits]
+
+    pending, pending_vectors = [], []
+    written: List[str] = []
+    embedded = 0
     try:
-        docs = vectorstore.get(where={"file_id": file_id})
-        print(f"Found {len(docs['ids'])} document chunks for file_id {file_id}")
-        
-        if docs['ids']:
-            # Delete the documents with the specified file_id
-            vectorstore.delete(ids=docs['ids'])
-            print(f"Deleted {len(docs['ids'])} document chunks with file_id {file_id}")
+        for start in range(0, len(splits), EMBED_BATCH_SIZE):
+            batch = splits[start:start + EMBED_BATCH_SIZE]
+            pending_vectors.extend(embedding_function.embed_documents([d.page_content for d in batch]))
+            pending.extend(range(start, start + len(batch)))
+            embedded += len(batch)
+
+            if len(pending) >= CHROMA_WRITE_BATCH_SIZE:
+                written.extend(ids[i] for i in pending)
+                write_chunks(collection, [ids[i] for i in pending], [splits[i] for i in pending], pending_vectors)
+                pending, pending_vectors = [], []
+            if on_progress:
+                on_progress(embedded)
+
+        if pending:
+            written.extend(ids[i] for i in pending)
+            write_chunks(collection, [ids[i] for i in pending], [splits[i] for i in pending], pending_vectors)
+    except Exception:
+        if written:
+            _delete_chunks(collection, written)
+        raise
+    return ids
+
+def sync_chunks(splits: List[Document], file_id: int,
+                on_progress: Optional[Callable[[int], None]] = None,
+                collection: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+    """Make `collection` hold exactly `splits` for file_id, embedding only chunks
+    whose content hash is not already indexed for that file and deleting stale
+    ones. Reused chunks keep the tags and upload time they were indexed with."""
+    collection = check_collection_name(collection)
+    existing = defaultdict(list)
+    records = get_chunk_records(file_id)
+    for chunk_id, chunk_hash in records:
+        existing[chunk_hash].append(chunk_id)
+
+    new_splits, new_hashes = [], []
+    for split in splits:
+        chunk_hash = text_sha256(split.page_content)
+        if existing[chunk_hash]:
+            existing[chunk_hash].pop()
         else:
-            print(f"No document chunks found with file_id {file_id}")
+            new_splits.append(split)
+            new_hashes.append(chunk_hash)
+
+    stale = [chunk_id for chunk_ids in existing.values() for chunk_id in chunk_ids]
+    if not records:
+        # Indexed before chunk hashes were tracked: everything there is stale
+        stale = get_vectorstore(collection, create=True)._collection.get(where={"file_id": file_id}, include=[])["ids"]
+
+    # New chunks go in before stale ones are removed so the file never disappears from search
+    new_ids = add_chunks(new_splits, file_id, on_progress, collection=collection, tags=tags) if new_splits else []
+    insert_chunk_records(file_id, zip(new_ids, new_hashes))
+    if stale:
+        _delete_chunks(collection, stale)
+        delete_chunk_records(stale)
+
+    return {
+        "chunks_total": len(splits),
+        "chunks_reused": len(splits) - len(new_splits),
+        "chunks_embedded": len(new_splits),
+        "chunks_deleted": len(stale),
+    }
+
+def delete_doc_from_chroma(file_id: int, collection: Optional[str] = None):
+    try:
+        # Deleted by filter in one call, without reading the matching ids first
+        get_vectorstore(collection)._collection.delete(where={"file_id": file_id})
+        logging.info(f"Deleted document chunks with file_id {file_id} from {check_collection_name(collection)}")
+        delete_chunk_search_file(file_id)
+        notify_documents_changed([file_id])
         return True
     except Exception as e:
-        print(f"Error deleting document with file_id {file_id} from Chroma: {str(e)}")
+        logging.error(f"Error deleting document with file_id {file_id} from Chroma: {str(e)}")
         return False
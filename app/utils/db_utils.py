@@ -1,76 +1,680 @@
+import asyncio
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-
-DB_NAME = "rag_app.db"
+from app.config.settings import (CHROMA_DEFAULT_COLLECTION, DB_NAME, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS,
+                                 HISTORY_WRITE_BATCH_WINDOW_MS, HISTORY_WRITE_BATCH_SIZE)
+from app.utils.telemetry import timed
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+    """A new, unpooled connection; the caller closes it."""
+    conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
     return conn
 
+# ── Connection pool ──────────────────────────────────────────────────
+# Opening a connection (and re-reading the schema) on every call dominated the
+# cost of small queries. Connections are now kept in a per-process pool and
+# shared across threads; WAL lets readers run alongside the single writer.
+class ConnectionPool:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return get_db_connection()
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+# Re-entrant: the schema is created through db_connection() while it is held
+_pool_lock = threading.RLock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        # A forked worker or a changed DB_NAME (tests, benchmarks) gets a fresh pool
+        if _pool is None or _pool.pid != os.getpid() or _pool.path != DB_NAME:
+            _pool = ConnectionPool(DB_NAME, DB_POOL_SIZE)
+            try:
+                _create_tables()
+            except Exception:
+                _pool = None
+                raise
+        return _pool
+
+def init_db():
+    """Open the pool, creating the tables on first use; called at app startup."""
+    _get_pool()
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    pool = _get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        if conn.in_transaction:
+            conn.commit()
+    finally:
+        pool.release(conn)
+
+def _in_batches(conn, sql, values, size=500):
+    """Run `sql` (with one `IN ({})`) over values in chunks under SQLite's variable limit."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        batch = values[start:start + size]
+        conn.execute(sql.format(",".join("?" * len(batch))), batch)
+
 def create_chat_history():
-    conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS chat_history
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     session_id TEXT,
-                     user_query TEXT,
-                     gpt_response TEXT,
-                     model TEXT,
-                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS chat_history
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         session_id TEXT,
+                         user_query TEXT,
+                         gpt_response TEXT,
+                         model TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        # Without it every history read was a full table scan plus a sort
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_session ON chat_history (session_id, created_at)')
+
+# ── Session versions ─────────────────────────────────────────────────
+# Every write that changes what a session's prompt history looks like (a new
+# turn, a new summary) bumps its version in the same transaction, so in-process
+# caches can tell whether they are still current.
+def create_chat_sessions():
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS chat_sessions
+                        (session_id TEXT PRIMARY KEY,
+                         version INTEGER NOT NULL DEFAULT 0,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+def _bump_session_version(conn, session_id):
+    return conn.execute('''INSERT INTO chat_sessions (session_id, version) VALUES (?, 1)
+                           ON CONFLICT(session_id) DO UPDATE SET
+                               version = version + 1,
+                               updated_at = CURRENT_TIMESTAMP
+                           RETURNING version''', (session_id,)).fetchone()[0]
+
+@timed("db")
+def get_session_version(session_id):
+    with db_connection() as conn:
+        row = conn.execute('SELECT version FROM chat_sessions WHERE session_id = ?', (session_id,)).fetchone()
+    return row[0] if row else 0
 
 def insert_chat_history(session_id, user_query, gpt_response, model):
-    conn = get_db_connection()
-    conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
-                 (session_id, user_query, gpt_response, model))
-    conn.commit()
-    conn.close()
+    return insert_chat_history_many([(session_id, user_query, gpt_response, model)])[0]
+
+@timed("db")
+def insert_chat_history_many(rows):
+    """rows: iterable of (session_id, user_query, gpt_response, model), written in one transaction.
+    Returns (turn_id, session_version) for each row."""
+    results = []
+    with db_connection() as conn:
+        for session_id, user_query, gpt_response, model in rows:
+            cursor = conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
+                                  (session_id, user_query, gpt_response, model))
+            results.append((cursor.lastrowid, _bump_session_version(conn, session_id)))
+    return results
 
+@timed("db")
 def get_chat_history(session_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at', (session_id,))
+    with db_connection() as conn:
+        rows = conn.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at, id',
+                            (session_id,)).fetchall()
     messages = []
-    for row in cursor.fetchall():
+    for row in rows:
         messages.extend([
             {"role": "human", "content": row['user_query']},
             {"role": "ai", "content": row['gpt_response']}
         ])
-    conn.close()
     return messages
 
+def _select_turns(conn, session_id, after_id, limit):
+    if limit is None:
+        rows = conn.execute('''SELECT id, user_query, gpt_response FROM chat_history
+                               WHERE session_id = ? AND id > ? ORDER BY created_at, id''',
+                            (session_id, after_id)).fetchall()
+    else:
+        rows = conn.execute('''SELECT id, user_query, gpt_response FROM chat_history
+                               WHERE session_id = ? AND id > ? ORDER BY created_at DESC, id DESC LIMIT ?''',
+                            (session_id, after_id, limit)).fetchall()[::-1]
+    return [dict(row) for row in rows]
+
+@timed("db")
+def get_chat_turns(session_id, after_id=0, limit=None):
+    """Turns with id > after_id as dicts (id, user_query, gpt_response), oldest first.
+    With limit, only the newest `limit` of them."""
+    with db_connection() as conn:
+        return _select_turns(conn, session_id, after_id, limit)
+
+@timed("db")
+def get_session_snapshot(session_id, limit=None, with_summary=True):
+    """Version, summary and unsummarized turns of a session, read in one transaction."""
+    with db_connection() as conn:
+        conn.execute('BEGIN')
+        row = conn.execute('SELECT version FROM chat_sessions WHERE session_id = ?', (session_id,)).fetchone()
+        summary = None
+        if with_summary:
+            summary = conn.execute('SELECT summary, summarized_until_id FROM session_summaries WHERE session_id = ?',
+                                   (session_id,)).fetchone()
+        after_id = summary['summarized_until_id'] if summary else 0
+        return {
+            "version": row[0] if row else 0,
+            "summary": summary['summary'] if summary else "",
+            "summarized_until_id": after_id,
+            "turns": _select_turns(conn, session_id, after_id, limit),
+        }
+
+# ── Rolling conversation summaries ───────────────────────────────────
+# One row per session: the summary of every turn up to summarized_until_id.
+def create_session_summaries():
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS session_summaries
+                        (session_id TEXT PRIMARY KEY,
+                         summary TEXT NOT NULL,
+                         summarized_until_id INTEGER NOT NULL,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+@timed("db")
+def get_session_summary(session_id):
+    with db_connection() as conn:
+        row = conn.execute('SELECT summary, summarized_until_id FROM session_summaries WHERE session_id = ?',
+                           (session_id,)).fetchone()
+    return dict(row) if row else None
+
+@timed("db")
+def upsert_session_summary(session_id, summary, summarized_until_id):
+    """Never moves a session's summary backwards if two compactions race.
+    Returns the new session version, or None if the update was not applied."""
+    with db_connection() as conn:
+        cursor = conn.execute('''INSERT INTO session_summaries (session_id, summary, summarized_until_id) VALUES (?, ?, ?)
+                                 ON CONFLICT(session_id) DO UPDATE SET
+                                     summary = excluded.summary,
+                                     summarized_until_id = excluded.summarized_until_id,
+                                     updated_at = CURRENT_TIMESTAMP
+                                 WHERE excluded.summarized_until_id > session_summaries.summarized_until_id''',
+                              (session_id, summary, summarized_until_id))
+        if cursor.rowcount == 0:
+            return None
+        return _bump_session_version(conn, session_id)
+
 def create_document_store():
-    conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS document_store
-                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     filename TEXT,
-                     upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.close()
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_store
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         filename TEXT,
+                         content_hash TEXT,
+                         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         collection TEXT,
+                         tags TEXT DEFAULT '[]')''')
+        # Databases created before content hashing / collections lack the columns
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(document_store)')}
+        if 'content_hash' not in columns:
+            conn.execute('ALTER TABLE document_store ADD COLUMN content_hash TEXT')
+        if 'collection' not in columns:
+            # Everything indexed so far went to the default collection
+            conn.execute('ALTER TABLE document_store ADD COLUMN collection TEXT')
+            conn.execute('UPDATE document_store SET collection = ?', (CHROMA_DEFAULT_COLLECTION,))
+        if 'tags' not in columns:
+            conn.execute("ALTER TABLE document_store ADD COLUMN tags TEXT DEFAULT '[]'")
+        # Superseded by the per-collection indexes below
+        conn.execute('DROP INDEX IF EXISTS idx_document_store_content_hash')
+        conn.execute('DROP INDEX IF EXISTS idx_document_store_filename')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_collection_hash ON document_store (collection, content_hash)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_collection_filename ON document_store (collection, filename)')
 
-def insert_document_record(filename):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO document_store (filename) VALUES (?)', (filename,))
-    file_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return file_id
+def create_document_chunks():
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_chunks
+                        (chunk_id TEXT PRIMARY KEY,
+                         file_id INTEGER NOT NULL,
+                         chunk_hash TEXT NOT NULL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_chunks_file_id ON document_chunks (file_id)')
+
+def _document(row):
+    if row is None:
+        return None
+    document = dict(row)
+    document['tags'] = json.loads(document.get('tags') or '[]')
+    return document
+
+_DOCUMENT_COLUMNS = 'id, filename, content_hash, collection, tags, upload_timestamp'
+
+# Documents belong to one collection; duplicates and re-uploads are detected within it
+@timed("db")
+def insert_document_record(filename, content_hash=None, collection=CHROMA_DEFAULT_COLLECTION, tags=()):
+    with db_connection() as conn:
+        cursor = conn.execute('INSERT INTO document_store (filename, content_hash, collection, tags) VALUES (?, ?, ?, ?)',
+                              (filename, content_hash, collection, json.dumps(list(tags))))
+        return cursor.lastrowid
+
+@timed("db")
+def get_document(file_id):
+    with db_connection() as conn:
+        row = conn.execute(f'SELECT {_DOCUMENT_COLUMNS} FROM document_store WHERE id = ?', (file_id,)).fetchone()
+    return _document(row)
 
+@timed("db")
+def get_document_by_hash(content_hash, collection=CHROMA_DEFAULT_COLLECTION):
+    with db_connection() as conn:
+        row = conn.execute(f'SELECT {_DOCUMENT_COLUMNS} FROM document_store WHERE collection = ? AND content_hash = ? LIMIT 1',
+                           (collection, content_hash)).fetchone()
+    return _document(row)
+
+@timed("db")
+def get_document_by_filename(filename, collection=CHROMA_DEFAULT_COLLECTION):
+    with db_connection() as conn:
+        row = conn.execute(f'SELECT {_DOCUMENT_COLUMNS} FROM document_store WHERE collection = ? AND filename = ? ORDER BY id DESC LIMIT 1',
+                           (collection, filename)).fetchone()
+    return _document(row)
+
+@timed("db")
+def update_document_hash(file_id, content_hash, tags=None):
+    with db_connection() as conn:
+        conn.execute('UPDATE document_store SET content_hash = ?, upload_timestamp = CURRENT_TIMESTAMP WHERE id = ?',
+                     (content_hash, file_id))
+        if tags is not None:
+            conn.execute('UPDATE document_store SET tags = ? WHERE id = ?', (json.dumps(list(tags)), file_id))
+
+@timed("db")
 def delete_document_record(file_id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute('DELETE FROM document_chunks WHERE file_id = ?', (file_id,))
+        conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
     return True
 
-def get_all_documents():
+@timed("db")
+def get_chunk_records(file_id):
+    with db_connection() as conn:
+        rows = conn.execute('SELECT chunk_id, chunk_hash FROM document_chunks WHERE file_id = ?', (file_id,)).fetchall()
+    return [(row['chunk_id'], row['chunk_hash']) for row in rows]
+
+@timed("db")
+def insert_chunk_records(file_id, records):
+    with db_connection() as conn:
+        conn.executemany('INSERT OR REPLACE INTO document_chunks (chunk_id, file_id, chunk_hash) VALUES (?, ?, ?)',
+                         [(chunk_id, file_id, chunk_hash) for chunk_id, chunk_hash in records])
+
+@timed("db")
+def delete_chunk_records(chunk_ids):
+    with db_connection() as conn:
+        conn.executemany('DELETE FROM document_chunks WHERE chunk_id = ?', [(chunk_id,) for chunk_id in chunk_ids])
+
+# ── Lexical (BM25) chunk index ───────────────────────────────────────
+# FTS5 mirror of the chunk text written to Chroma, keyed by the same chunk ids
+# and tagged with their collection. The collection is an indexed column so a
+# query only ranks its own collection's matches (see search_chunks_bm25).
+def create_chunk_search_index():
+    with db_connection() as conn:
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(chunk_fts)')}
+        if columns and 'collection' not in columns:
+            # FTS5 tables cannot gain columns; ensure_lexical_index refills it from Chroma
+            conn.execute('DROP TABLE chunk_fts')
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5
+                        (content,
+                         chunk_id UNINDEXED,
+                         collection,
+                         file_id UNINDEXED,
+                         metadata UNINDEXED,
+                         tokenize = 'unicode61 remove_diacritics 2')''')
+
+@timed("db")
+def insert_chunk_search_rows(rows):
+    """rows: iterable of (chunk_id, collection, file_id, content, metadata_json)."""
+    with db_connection() as conn:
+        conn.executemany('INSERT INTO chunk_fts (chunk_id, collection, file_id, content, metadata) VALUES (?, ?, ?, ?, ?)',
+                         rows)
+
+@timed("db")
+def delete_chunk_search_rows(chunk_ids):
+    # chunk_id is UNINDEXED, so delete in IN-batches (one table scan each)
+    with db_connection() as conn:
+        _in_batches(conn, 'DELETE FROM chunk_fts WHERE chunk_id IN ({})', chunk_ids)
+
+@timed("db")
+def delete_chunk_search_file(file_id):
+    with db_connection() as conn:
+        conn.execute('DELETE FROM chunk_fts WHERE file_id = ?', (file_id,))
+
+@timed("db")
+def clear_chunk_search_index(collection=None):
+    with db_connection() as conn:
+        if collection is None:
+            conn.execute('DELETE FROM chunk_fts')
+        else:
+            conn.execute('DELETE FROM chunk_fts WHERE collection = ?', (collection,))
+
+@timed("db")
+def count_chunk_search_rows(collection=None):
+    with db_connection() as conn:
+        if collection is None:
+            return conn.execute('SELECT COUNT(*) FROM chunk_fts').fetchone()[0]
+        return conn.execute('SELECT COUNT(*) FROM chunk_fts WHERE collection = ?', (collection,)).fetchone()[0]
+
+def _chunk_filter_sql(filters):
+    """SQL conditions (and parameters) matching hybrid_search's chunk filters on chunk_fts rows."""
+    clauses, params = [], []
+    if filters.get('file_ids'):
+        clauses.append(f'file_id IN ({",".join("?" * len(filters["file_ids"]))})')
+        params.extend(filters['file_ids'])
+    if filters.get('tags'):
+        clauses.append(f"EXISTS (SELECT 1 FROM json_each(metadata, '$.tags') "
+                       f"WHERE value IN ({','.join('?' * len(filters['tags']))}))")
+        params.extend(filters['tags'])
+    if filters.get('uploaded_after') is not None:
+        clauses.append("json_extract(metadata, '$.uploaded_at') >= ?")
+        params.append(filters['uploaded_after'])
+    if filters.get('uploaded_before') is not None:
+        clauses.append("json_extract(metadata, '$.uploaded_at') <= ?")
+        params.append(filters['uploaded_before'])
+    return "".join(f" AND {c}" for c in clauses), params
+
+@timed("db")
+def search_chunks_bm25(match_query, k, collection=CHROMA_DEFAULT_COLLECTION, filters=None):
+    """Top-k chunks of a collection for an FTS5 MATCH expression, best BM25
+    score first, optionally restricted by file, tag or upload time."""
+    where, params = _chunk_filter_sql(filters or {})
+    # The collection term narrows the match before ranking; it carries no
+    # bm25 weight, and the exact comparison separates names that tokenize alike
+    scoped_query = f'collection : "{collection}" AND content : ({match_query})'
+    with db_connection() as conn:
+        rows = conn.execute(f'''SELECT chunk_id, file_id, content, metadata, bm25(chunk_fts, 1, 0, 0, 0, 0) AS score
+                                FROM chunk_fts WHERE chunk_fts MATCH ? AND collection = ?{where}
+                                ORDER BY score LIMIT ?''',
+                            (scoped_query, collection, *params, k)).fetchall()
+    return [dict(row) for row in rows]
+
+@timed("db")
+def get_all_documents(collection=None):
+    with db_connection() as conn:
+        if collection is None:
+            documents = conn.execute('SELECT id, filename, collection, tags, upload_timestamp FROM document_store '
+                                     'ORDER BY upload_timestamp DESC').fetchall()
+        else:
+            documents = conn.execute('SELECT id, filename, collection, tags, upload_timestamp FROM document_store '
+                                     'WHERE collection = ? ORDER BY upload_timestamp DESC', (collection,)).fetchall()
+    return [_document(doc) for doc in documents]
+
+# ── Collection maintenance ───────────────────────────────────────────
+# Used by snapshots, compaction and the consistency check (app.utils.snapshot,
+# app.utils.maintenance); whole collections are moved or dropped at once.
+@timed("db")
+def get_collection_documents(collection):
+    with db_connection() as conn:
+        rows = conn.execute(f'SELECT {_DOCUMENT_COLUMNS} FROM document_store WHERE collection = ? ORDER BY id',
+                            (collection,)).fetchall()
+    return [_document(row) for row in rows]
+
+@timed("db")
+def get_document_collections():
+    with db_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT DISTINCT collection FROM document_store ORDER BY collection')]
+
+@timed("db")
+def restore_document_record(filename, content_hash, collection, tags, upload_timestamp):
+    """insert_document_record keeping the original upload time (snapshot imports)."""
+    with db_connection() as conn:
+        cursor = conn.execute('INSERT INTO document_store (filename, content_hash, collection, tags, upload_timestamp) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              (filename, content_hash, collection, json.dumps(list(tags)), upload_timestamp))
+        return cursor.lastrowid
+
+@timed("db")
+def get_chunk_hashes(file_ids):
+    """chunk_id -> (file_id, chunk_hash) for every chunk record of these files."""
+    out = {}
+    file_ids = list(file_ids)
+    with db_connection() as conn:
+        for start in range(0, len(file_ids), 500):
+            batch = file_ids[start:start + 500]
+            for row in conn.execute('SELECT chunk_id, file_id, chunk_hash FROM document_chunks '
+                                    f'WHERE file_id IN ({",".join("?" * len(batch))})', batch):
+                out[row['chunk_id']] = (row['file_id'], row['chunk_hash'])
+    return out
+
+@timed("db")
+def get_orphan_chunk_records():
+    """Chunk records whose document no longer exists."""
+    with db_connection() as conn:
+        rows = conn.execute('SELECT chunk_id FROM document_chunks WHERE file_id NOT IN '
+                            '(SELECT id FROM document_store)').fetchall()
+    return [row['chunk_id'] for row in rows]
+
+@timed("db")
+def get_chunk_search_ids(collection):
+    with db_connection() as conn:
+        return {row[0] for row in conn.execute('SELECT chunk_id FROM chunk_fts WHERE collection = ?', (collection,))}
+
+@timed("db")
+def delete_document_records(file_ids):
+    with db_connection() as conn:
+        _in_batches(conn, 'DELETE FROM document_chunks WHERE file_id IN ({})', file_ids)
+        _in_batches(conn, 'DELETE FROM document_store WHERE id IN ({})', file_ids)
+
+def _delete_collection_rows(conn, collection):
+    file_ids = [row[0] for row in conn.execute('SELECT id FROM document_store WHERE collection = ?', (collection,))]
+    _in_batches(conn, 'DELETE FROM document_chunks WHERE file_id IN ({})', file_ids)
+    conn.execute('DELETE FROM document_store WHERE collection = ?', (collection,))
+    conn.execute('DELETE FROM chunk_fts WHERE collection = ?', (collection,))
+    return file_ids
+
+@timed("db")
+def delete_collection_records(collection):
+    """Drop a collection's documents, chunk records and BM25 rows in one transaction; returns the file_ids."""
+    with db_connection() as conn:
+        return _delete_collection_rows(conn, collection)
+
+@timed("db")
+def replace_collection_records(source, target):
+    """Drop `target`'s records and move `source`'s under its name, in one
+    transaction; returns the dropped file_ids."""
+    with db_connection() as conn:
+        dropped = _delete_collection_rows(conn, target)
+        conn.execute('UPDATE document_store SET collection = ? WHERE collection = ?', (target, source))
+        conn.execute('UPDATE chunk_fts SET collection = ? WHERE collection = ?', (target, source))
+    return dropped
+
+def vacuum_database():
+    """Merge the BM25 index segments, checkpoint the WAL and rebuild the file
+    without free pages. Takes the write lock for the duration."""
+    _get_pool()
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, filename, upload_timestamp FROM document_store ORDER BY upload_timestamp DESC')
-    documents = cursor.fetchall()
-    conn.close()
-    return [dict(doc) for doc in documents]
-
-# Initialize the database tables
-create_chat_history()
-create_document_store()
+    try:
+        conn.execute("INSERT INTO chunk_fts (chunk_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+# ── Cross-worker coordination ────────────────────────────────────────
+# With several workers (WORKERS > 1) these tables carry state that is kept in
+# process otherwise: which worker runs a session's current turn, which
+# documents changed (every worker drops the cached answers built on them) and
+# the progress of ingestion jobs, which any worker may be asked about.
+def create_coordination_tables():
+    with db_connection() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS session_leases
+                        (session_id TEXT PRIMARY KEY,
+                         owner TEXT NOT NULL,
+                         expires_at REAL NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_changes
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         pid INTEGER NOT NULL,
+                         file_ids TEXT NOT NULL,
+                         created_at REAL NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS ingestion_jobs
+                        (job_id TEXT PRIMARY KEY,
+                         state TEXT NOT NULL,
+                         updated_at REAL NOT NULL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_updated ON ingestion_jobs (updated_at)')
+
+@timed("db")
+def acquire_session_lease(session_id, owner, lease_seconds):
+    """True if `owner` now holds the session: it was free, its lease lapsed or owner already held it."""
+    now = time.time()
+    with db_connection() as conn:
+        row = conn.execute('''INSERT INTO session_leases (session_id, owner, expires_at) VALUES (?, ?, ?)
+                              ON CONFLICT(session_id) DO UPDATE SET
+                                  owner = excluded.owner,
+                                  expires_at = excluded.expires_at
+                              WHERE session_leases.expires_at < ? OR session_leases.owner = excluded.owner
+                              RETURNING owner''', (session_id, owner, now + lease_seconds, now)).fetchone()
+    return row is not None
+
+@timed("db")
+def release_session_lease(session_id, owner):
+    with db_connection() as conn:
+        conn.execute('DELETE FROM session_leases WHERE session_id = ? AND owner = ?', (session_id, owner))
+
+def record_document_change(file_ids, keep=10000):
+    """Append a change for the other workers; returns its id. Only the newest `keep` are kept."""
+    with db_connection() as conn:
+        change_id = conn.execute('INSERT INTO document_changes (pid, file_ids, created_at) VALUES (?, ?, ?)',
+                                 (os.getpid(), json.dumps(list(file_ids)), time.time())).lastrowid
+        conn.execute('DELETE FROM document_changes WHERE id <= ?', (change_id - keep,))
+    return change_id
+
+def get_document_changes(after_id):
+    """(id, pid, file_ids) of the changes recorded after `after_id`, oldest first."""
+    with db_connection() as conn:
+        rows = conn.execute('SELECT id, pid, file_ids FROM document_changes WHERE id > ? ORDER BY id',
+                            (after_id,)).fetchall()
+    return [(row['id'], row['pid'], json.loads(row['file_ids'])) for row in rows]
+
+def get_last_document_change_id():
+    with db_connection() as conn:
+        row = conn.execute('SELECT MAX(id) FROM document_changes').fetchone()
+    return row[0] or 0
+
+def save_ingestion_job(job_id, state, keep=500):
+    """Store a job's to_dict() state; only the `keep` most recently updated jobs are kept."""
+    with db_connection() as conn:
+        conn.execute('INSERT OR REPLACE INTO ingestion_jobs (job_id, state, updated_at) VALUES (?, ?, ?)',
+                     (job_id, json.dumps(state), time.time()))
+        conn.execute('''DELETE FROM ingestion_jobs WHERE updated_at <
+                            (SELECT updated_at FROM ingestion_jobs ORDER BY updated_at DESC LIMIT 1 OFFSET ?)''',
+                     (keep - 1,))
+
+def get_ingestion_job_state(job_id):
+    with db_connection() as conn:
+        row = conn.execute('SELECT state FROM ingestion_jobs WHERE job_id = ?', (job_id,)).fetchone()
+    return json.loads(row['state']) if row else None
+
+# ── Batched history writes ───────────────────────────────────────────
+# Group commit: chat turns saved by concurrent requests within
+# HISTORY_WRITE_BATCH_WINDOW_MS share one transaction (one WAL fsync). Each
+# caller still only returns once its own row is committed, and gets back its
+# (turn_id, session_version).
+class HistoryBatcher:
+    def __init__(self, window_ms=HISTORY_WRITE_BATCH_WINDOW_MS, max_batch=HISTORY_WRITE_BATCH_SIZE):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self._pending = []
+        self._pending_loop = None
+
+    async def insert(self, row):
+        if self.window_ms <= 0:
+            return (await asyncio.to_thread(insert_chat_history_many, [row]))[0]
+
+        loop = asyncio.get_running_loop()
+        if self._pending_loop is not loop:
+            self._pending, self._pending_loop = [], loop
+        future = loop.create_future()
+        self._pending.append((row, future))
+
+        if len(self._pending) >= self.max_batch:
+            loop.create_task(self._flush())
+        elif len(self._pending) == 1:
+            loop.call_later(self.window_ms / 1000, lambda: loop.create_task(self._flush()))
+        return await future
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            results = await asyncio.to_thread(insert_chat_history_many, [row for row, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+history_batcher = HistoryBatcher()
+
+# Tables are created when a process first opens the database, not at import time
+def _create_tables():
+    create_chat_history()
+    create_chat_sessions()
+    create_session_summaries()
+    create_document_store()
+    create_document_chunks()
+    create_chunk_search_index()
+    create_coordination_tables()
+
+# ── Async wrappers ───────────────────────────────────────────────────
+# sqlite3 is blocking, so request handlers running on the event loop go
+# through these, which offload the call to the default thread pool.
+async def ainsert_chat_history(session_id, user_query, gpt_response, model):
+    return await history_batcher.insert((session_id, user_query, gpt_response, model))
+
+async def aget_chat_turns(session_id, after_id=0, limit=None):
+    return await asyncio.to_thread(get_chat_turns, session_id, after_id, limit)
+
+async def aget_session_version(session_id):
+    return await asyncio.to_thread(get_session_version, session_id)
+
+async def aget_session_snapshot(session_id, limit=None, with_summary=True):
+    return await asyncio.to_thread(get_session_snapshot, session_id, limit, with_summary)
+
+async def aget_session_summary(session_id):
+    return await asyncio.to_thread(get_session_summary, session_id)
+
+async def aupsert_session_summary(session_id, summary, summarized_until_id):
+    return await asyncio.to_thread(upsert_session_summary, session_id, summary, summarized_until_id)
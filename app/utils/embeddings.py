@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config.settings import (
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_QUERY_BATCH_SIZE,
+    EMBED_QUERY_BATCH_WINDOW_MS,
+    CAPTURE_ENABLED,
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    HASHING_EMBEDDING_DIM,
+)
+from app.utils.telemetry import count_cache, timer
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ── Offline embedder ─────────────────────────────────────────────────
+class HashingEmbeddings(Embeddings):
+    """Deterministic feature-hashing vectors over words and character trigrams.
+
+    Needs no network or model weights, and texts sharing vocabulary land close
+    together, which is enough for tests, benchmarks and air-gapped runs.
+    """
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        grams = [w[i:i + 3] for w in words for i in range(max(1, len(w) - 2))]
+        return words + grams
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# ── Adaptive concurrency ─────────────────────────────────────────────
+class AdaptiveLimiter:
+    """AIMD limit on concurrent remote calls: halved on quota errors, grown back by
+    roughly one slot per window of successful calls."""
+
+    def __init__(self, max_limit: int, min_limit: float = 1.0):
+        self.max_limit = float(max_limit)
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def is_quota_error(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "resource_exhausted", "resourceexhausted", "quota", "rate limit"))
+
+
+# ── On-disk vector store ─────────────────────────────────────────────
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by sha256(model, kind, text)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+
+# ── Caching, batching client ─────────────────────────────────────────
+class CachingEmbeddings(Embeddings):
+    """Wraps an embedding client with a persistent cache, batching and backoff.
+
+    - Vectors are stored on disk keyed by (model, query/document, text hash), so a
+      text is only ever embedded once per model.
+    - Misses from embed_documents go out in batches of EMBED_BATCH_SIZE.
+    - Concurrent aembed_query calls arriving within a short window are coalesced
+      into a single remote batch.
+    - Quota errors shrink the number of concurrent remote calls and are retried
+      with exponential backoff instead of failing the caller.
+    """
+
+    def __init__(self, inner: Embeddings, model: str, store: Optional[EmbeddingStore] = None,
+                 query_batch_fn: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.inner = inner
+        self.model = model
+        self.store = store
+        self.query_batch_fn = query_batch_fn or (lambda texts: [inner.embed_query(t) for t in texts])
+        self.limiter = AdaptiveLimiter(EMBED_MAX_CONCURRENCY)
+        self.hits = 0
+        self.misses = 0
+        self.remote_calls = 0
+        self.throttled = 0
+        self._pending: List[tuple] = []
+        self._pending_loop = None
+
+    # ---- remote calls -------------------------------------------------
+    def _call_remote(self, fn: Callable, texts: List[str]) -> List[List[float]]:
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                self.remote_calls += 1
+                result = fn(texts)
+            except Exception as e:
+                throttled = is_quota_error(e)
+                self.limiter.release(throttled=throttled)
+                if not throttled or attempt == EMBED_MAX_RETRIES:
+                    raise
+                self.throttled += 1
+                time.sleep(min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+            else:
+                self.limiter.release()
+                return result
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [EmbeddingStore.key(self.model, kind, t) for t in texts]
+        found = self.store.get_many(list(set(keys))) if self.store else {}
+
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        miss_count = sum(1 for k in keys if k not in found)
+        self.hits += len(texts) - miss_count
+        self.misses += miss_count
+        count_cache("embedding", "hit", len(texts) - miss_count)
+        count_cache("embedding", "miss", miss_count)
+
+        fn = self.inner.embed_documents if kind == "document" else self.query_batch_fn
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start:start + EMBED_BATCH_SIZE]
+            with timer("embedding", kind):
+                vectors = self._call_remote(fn, batch)
+            fresh = {EmbeddingStore.key(self.model, kind, t): v for t, v in zip(batch, vectors)}
+            if self.store:
+                self.store.put_many(fresh)
+            found.update(fresh)
+
+        return [found[k] for k in keys]
+
+    # ---- Embeddings interface ----------------------------------------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several texts embedded as queries (and cached as such) in batched calls."""
+        return self._embed(texts, "query")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.store:
+            # Off the loop: the store lock is held while ingestion writes a batch
+            cached = await asyncio.to_thread(self.store.get_many, [EmbeddingStore.key(self.model, "query", text)])
+            if cached:
+                self.hits += 1
+                count_cache("embedding", "hit")
+                return next(iter(cached.values()))
+
+        loop = asyncio.get_running_loop()
+        if self._pending_loop is not loop:
+            self._pending, self._pending_loop = [], loop
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= EMBED_QUERY_BATCH_SIZE:
+            loop.create_task(self._flush_queries())
+        elif len(self._pending) == 1:
+            loop.call_later(EMBED_QUERY_BATCH_WINDOW_MS / 1000, lambda: loop.create_task(self._flush_queries()))
+        return await future
+
+    async def _flush_queries(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            vectors = await asyncio.to_thread(self._embed, [text for text, _ in batch], "query")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "remote_calls": self.remote_calls,
+            "throttled": self.throttled,
+            "concurrency_limit": round(self.limiter.limit, 2),
+        }
+
+
+def build_embedding_function() -> Embeddings:
+    """Embedding client selected by EMBEDDING_BACKEND ('gemini', or the offline
+    'hashing' / 'fake' / 'replay'); query vectors are recorded when capture is on."""
+    if EMBEDDING_BACKEND == "replay":
+        from app.utils.replay import ReplayEmbeddings
+        inner = ReplayEmbeddings()
+        model = inner.model
+        query_batch_fn = inner.embed_queries
+    elif EMBEDDING_BACKEND in ("hashing", "fake"):
+        if EMBEDDING_BACKEND == "fake":
+            from app.utils.offline import FakeRemoteEmbeddings
+            inner = FakeRemoteEmbeddings()
+        else:
+            inner = HashingEmbeddings()
+        model = f"hashing-{inner.dim}"
+        query_batch_fn = inner.embed_documents
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        inner = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=os.getenv("GEMINI_API_KEY"))
+        model = EMBEDDING_MODEL
+        query_batch_fn = lambda texts: inner.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+
+    store = EmbeddingStore(EMBEDDING_CACHE_PATH) if EMBEDDING_CACHE_ENABLED else None
+    embeddings = CachingEmbeddings(inner, model, store, query_batch_fn)
+    if CAPTURE_ENABLED:
+        from app.utils.capture import RecordingEmbeddings
+        return RecordingEmbeddings(embeddings)
+    return embeddings
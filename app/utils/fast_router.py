@@ -0,0 +1,222 @@
+import json
+import logging
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config.settings import ROUTER_EXEMPLARS_PATH, ROUTER_FAST_MARGIN, ROUTER_FAST_THRESHOLD
+from app.utils.chroma_utils import embedding_function
+from app.utils.lazy import Lazy
+from app.utils.single_flight import normalize_question
+from app.utils.telemetry import count_router, timer
+
+logger = logging.getLogger(__name__)
+
+# Intent -> route; every non-KB intent ends the turn with its canned reply
+INTENT_ROUTES = {"greeting": "end", "thanks": "end", "farewell": "end", "wellbeing": "end", "kb": "rag"}
+REPLIES = {
+    "greeting": "¡Hola! ¿En qué puedo ayudarte?",
+    "thanks": "¡De nada! Si necesitas algo más, aquí estoy.",
+    "farewell": "¡Hasta luego! Que tengas un buen día.",
+    "wellbeing": "¡Muy bien, gracias por preguntar! ¿En qué puedo ayudarte?",
+}
+
+# ── Rules ────────────────────────────────────────────────────────────
+# A message made only of pleasantries (any number, any order) matches; one
+# that also asks something ("hola, ¿cómo cambio el filtro?") does not.
+_PLEASANTRIES = {
+    "greeting": r"hola|holi|buenas|buen dia|buenos dias|buenas tardes|buenas noches|saludos|"
+                r"(?:hola|buenas) (?:de nuevo|otra vez)|hey|hi|hello|(?:hey|hi|hello) there|"
+                r"good morning|good afternoon|good evening",
+    "thanks": r"gracias|muchas gracias|mil gracias|muchisimas gracias|"
+              r"gracias por (?:todo|la ayuda|tu ayuda|la informacion|responder)|me ha servido|me sirvio|"
+              r"te lo agradezco|genial|perfecto|vale|ok|okay|thanks|thank you|thanks a lot|thank you so much|"
+              r"cheers|great|perfect|cool|that was (?:really )?helpful",
+    "farewell": r"adios|chao|chau|hasta luego|hasta pronto|hasta manana|nos vemos|eso es todo|"
+                r"que tengas (?:un )?buen dia|bye|goodbye|see you|see you later|good night|"
+                r"that'?s all|have a (?:nice|good) day",
+    "wellbeing": r"que tal|como estas|como esta|como va|how are you|how is it going|how are you doing",
+}
+_SEPARATOR = r"[\s,.;:!?¡¿'\"()\-]*"
+_PLEASANTRY_RE = re.compile(
+    r"^" + _SEPARATOR + r"(?:(?:" + "|".join(_PLEASANTRIES.values()) + r")\b" + _SEPARATOR + r")+$")
+_INTENT_RES = {intent: re.compile(rf"\b(?:{alts})\b") for intent, alts in _PLEASANTRIES.items()}
+# Messages past this length are never settled by rule
+_RULE_MAX_CHARS = 80
+
+
+def fold(text: str) -> str:
+    """normalize_question without accents or emoji, for the rule table."""
+    text = unicodedata.normalize("NFKD", normalize_question(text))
+    return "".join(c for c in text if not unicodedata.combining(c) and (c.isascii() or c.isalnum()))
+
+
+def match_rule(text: str) -> Optional[str]:
+    """Intent of a pleasantry-only message, or None. With several, the last
+    one wins ("hola, gracias" is thanks)."""
+    if len(text) > _RULE_MAX_CHARS:
+        return None
+    folded = fold(text)
+    if not _PLEASANTRY_RE.match(folded):
+        return None
+    last, position = None, -1
+    for intent, pattern in _INTENT_RES.items():
+        for m in pattern.finditer(folded):
+            if m.start() > position:
+                last, position = intent, m.start()
+    return last
+
+
+# ── Exemplars ────────────────────────────────────────────────────────
+# Held-out phrasings for the benchmark live in scripts/bench_router.py; add
+# domain questions through ROUTER_EXEMPLARS_PATH rather than here.
+EXEMPLARS: List[Tuple[str, str]] = [
+    ("greeting", t) for t in (
+        "hola, buenas", "hola buenos días", "buenas tardes a todos", "hola, ¿hay alguien?", "saludos cordiales",
+        "hi there", "hello, anyone here?", "hey, good morning")
+] + [
+    ("thanks", t) for t in (
+        "muchas gracias por la información", "gracias, me sirvió mucho", "te agradezco la ayuda",
+        "perfecto, muchas gracias", "genial, eso era todo lo que necesitaba", "thank you very much",
+        "thanks, that helped a lot", "great, thanks for your help")
+] + [
+    ("farewell", t) for t in (
+        "adiós, hasta la próxima", "me tengo que ir, hasta luego", "nos vemos mañana", "chao, gracias por todo",
+        "bye, see you soon", "goodbye and thanks", "that's all for today, bye")
+] + [
+    ("wellbeing", t) for t in (
+        "hola, ¿qué tal estás?", "¿cómo te va?", "¿cómo estás hoy?", "how are you today?",
+        "hi, how's it going?", "how are you doing?")
+] + [
+    ("kb", t) for t in (
+        "¿cómo cambio el filtro del equipo?", "¿qué significa el código de error E04?",
+        "¿cuál es el procedimiento de mantenimiento mensual?", "¿cada cuánto hay que revisar la presión?",
+        "¿qué hago si la máquina no enciende?", "¿dónde está el fusible principal?",
+        "¿cuáles son los requisitos de instalación?", "explícame cómo calibrar el sensor",
+        "necesito los pasos para reiniciar el sistema", "¿qué dice el manual sobre la garantía?",
+        "¿cuánto cuesta el repuesto de la bomba?", "¿qué política de vacaciones tiene la empresa?",
+        "how do I replace the filter?", "what does error code E04 mean?",
+        "what is the monthly maintenance procedure?", "how often should I check the pressure?",
+        "what should I do if the machine won't start?", "where is the main fuse located?",
+        "explain how to calibrate the sensor", "what does the manual say about the warranty?")
+]
+
+
+def load_exemplars(path: str = ROUTER_EXEMPLARS_PATH) -> List[Tuple[str, str]]:
+    """Built-in exemplars plus those in `path` (JSON lines of {"text", "intent"})."""
+    exemplars = list(EXEMPLARS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for line in filter(None, (line.strip() for line in f)):
+                item = json.loads(line)
+                if item["intent"] not in INTENT_ROUTES:
+                    raise ValueError(f"Unknown router intent {item['intent']!r} in {path}")
+                exemplars.append((item["intent"], item["text"]))
+    return exemplars
+
+
+@dataclass
+class FastRoute:
+    route: str
+    intent: str
+    source: str           # rule | exemplar
+    score: float = 1.0
+
+    @property
+    def reply(self) -> Optional[str]:
+        return REPLIES.get(self.intent)
+
+
+class ExemplarIndex:
+    """Unit vectors of labelled exemplars, embedded once as queries."""
+
+    def __init__(self, exemplars: Sequence[Tuple[str, str]], embeddings):
+        self.intents = [intent for intent, _ in exemplars]
+        texts = [text for _, text in exemplars]
+        embed = getattr(embeddings, "embed_queries", None) or embeddings.embed_documents
+        matrix = np.asarray(embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+        self.routes = np.array([INTENT_ROUTES[intent] for intent in self.intents])
+
+    def nearest(self, vector: Sequence[float]) -> Tuple[str, float, float]:
+        """(intent of the nearest exemplar, its cosine, best cosine among exemplars of other routes)."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        best = int(np.argmax(scores))
+        others = scores[self.routes != self.routes[best]]
+        return self.intents[best], float(scores[best]), float(others.max()) if others.size else -1.0
+
+
+exemplar_index = Lazy("router_exemplars", lambda: ExemplarIndex(load_exemplars(), embedding_function.get()))
+
+
+# ── Classifier ───────────────────────────────────────────────────────
+class FastRouter:
+    """Settles obvious turns before the router LLM is called.
+
+    Pleasantry-only messages are matched by rule. Other turns are compared
+    with the exemplars: the nearest one decides when its cosine reaches
+    `threshold` and it beats every exemplar of another route by `margin`.
+    KB decisions need `standalone` questions (first turns, or follow-ups
+    already rewritten by contextualise_chain); anything unsure returns None.
+    """
+
+    def __init__(self, threshold: float = ROUTER_FAST_THRESHOLD, margin: float = ROUTER_FAST_MARGIN,
+                 index: Optional[Lazy] = None, embeddings=None):
+        self.threshold = threshold
+        self.margin = margin
+        self.index = index or exemplar_index
+        self.embeddings = embeddings or embedding_function
+        self.counts: Dict[str, int] = {"rule": 0, "exemplar": 0, "llm": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, source: str) -> None:
+        with self._lock:
+            self.counts[source] += 1
+        count_router(source)
+
+    def by_rule(self, text: str) -> Optional[FastRoute]:
+        intent = match_rule(text)
+        return FastRoute(INTENT_ROUTES[intent], intent, "rule") if intent else None
+
+    def by_exemplar(self, vector: Sequence[float], standalone: bool) -> Optional[FastRoute]:
+        intent, score, other = self.index.get().nearest(vector)
+        route = INTENT_ROUTES[intent]
+        if score < self.threshold or score - other < self.margin or (route == "rag" and not standalone):
+            return None
+        return FastRoute(route, intent, "exemplar", score)
+
+    async def aclassify(self, text: str, standalone: bool) -> Optional[FastRoute]:
+        """FastRoute for the message, or None when the router LLM should decide."""
+        with timer("router", "rule"):
+            decision = self.by_rule(text)
+        if decision is None and self.threshold <= 1:
+            try:
+                # Same query embedding the answer cache and retrieval ask for, so
+                # the embedding cache serves them without another call
+                vector = await self.embeddings.aembed_query(text)
+                with timer("router", "exemplar"):
+                    decision = self.by_exemplar(vector, standalone)
+            except Exception as e:
+                logger.warning(f"Router exemplar classifier unavailable: {e}")
+        self._count(decision.source if decision else "llm")
+        return decision
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "llm_skip_rate": (total - self.counts["llm"]) / total if total else 0.0,
+                "threshold": self.threshold,
+                "margin": self.margin,
+            }
+
+
+fast_router = FastRouter()
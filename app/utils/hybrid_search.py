@@ -0,0 +1,191 @@
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Literal, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from app.config.settings import (
+    CHROMA_DEFAULT_COLLECTION,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RERANK_LEXICAL_WEIGHT,
+    RERANK_MMR_LAMBDA,
+    RETRIEVAL_CONTEXT_TOKENS,
+    RETRIEVAL_K,
+    RETRIEVAL_K_DENSE,
+    RETRIEVAL_K_LEXICAL,
+    RETRIEVAL_MAX_K,
+    RETRIEVAL_MIN_SCORE,
+    RETRIEVAL_MODE,
+    RETRIEVAL_RELATIVE_CUTOFF,
+    RRF_K,
+    RRF_WEIGHT_DENSE,
+    RRF_WEIGHT_LEXICAL,
+)
+from app.utils.db_utils import search_chunks_bm25
+from app.utils.rerank import rerank
+from app.utils.telemetry import measure, timer
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def to_match_query(query: str) -> str:
+    """OR of the quoted query tokens, so user text never hits FTS5 query syntax."""
+    tokens = dict.fromkeys(t.lower() for t in _TOKEN_RE.findall(query))
+    return " OR ".join(f'"{t}"' for t in tokens)
+
+
+# ── Chunk filters ────────────────────────────────────────────────────
+# A filter is a dict with any of: file_ids (list of ints), tags (chunks with
+# any of them), uploaded_after / uploaded_before (epoch seconds, inclusive).
+# Both sources apply it: Chroma as a `where` clause, BM25 in its SQL.
+ChunkFilter = Dict[str, Any]
+
+
+def chroma_where(filters: Optional[ChunkFilter]) -> Optional[dict]:
+    filters = filters or {}
+    clauses = []
+    if filters.get("file_ids"):
+        clauses.append({"file_id": {"$in": list(filters["file_ids"])}})
+    if filters.get("tags"):
+        tags = [{"tags": {"$contains": tag}} for tag in filters["tags"]]
+        clauses.append(tags[0] if len(tags) == 1 else {"$or": tags})
+    if filters.get("uploaded_after") is not None:
+        clauses.append({"uploaded_at": {"$gte": filters["uploaded_after"]}})
+    if filters.get("uploaded_before") is not None:
+        clauses.append({"uploaded_at": {"$lte": filters["uploaded_before"]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def lexical_search(query: str, k: int, collection: str = CHROMA_DEFAULT_COLLECTION,
+                   filters: Optional[ChunkFilter] = None) -> List[Document]:
+    match_query = to_match_query(query)
+    if not match_query:
+        return []
+    return [
+        Document(id=row["chunk_id"], page_content=row["content"], metadata=json.loads(row["metadata"] or "{}"))
+        for row in search_chunks_bm25(match_query, k, collection, filters)
+    ]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], rrf_k: int = RRF_K,
+                           weights: Optional[List[float]] = None) -> List[Document]:
+    """Fuse ranked lists by sum(weight / (rrf_k + rank)); documents are matched on id."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.id or doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense (Chroma) + lexical (BM25 over the same chunks) retrieval fused with RRF.
+
+    mode='dense' or mode='lexical' use a single source, for comparison. With
+    rerank on, the best `candidates` fused chunks go through rerank() and an
+    adaptive number of them is returned, each with its score in metadata;
+    otherwise the top k fused chunks are. `collection` names the vectorstore's
+    collection for the BM25 side; a `filters` keyword on invoke restricts both.
+    """
+
+    vectorstore: VectorStore
+    collection: str = CHROMA_DEFAULT_COLLECTION
+    mode: Literal["hybrid", "dense", "lexical"] = "hybrid"
+    k: int = RETRIEVAL_K
+    k_dense: int = RETRIEVAL_K_DENSE
+    k_lexical: int = RETRIEVAL_K_LEXICAL
+    rrf_k: int = RRF_K
+    weight_dense: float = RRF_WEIGHT_DENSE
+    weight_lexical: float = RRF_WEIGHT_LEXICAL
+    rerank: bool = RERANK_ENABLED
+    candidates: int = RERANK_CANDIDATES
+    lexical_weight: float = RERANK_LEXICAL_WEIGHT
+    mmr_lambda: float = RERANK_MMR_LAMBDA
+    max_k: int = RETRIEVAL_MAX_K
+    min_score: float = RETRIEVAL_MIN_SCORE
+    relative_cutoff: float = RETRIEVAL_RELATIVE_CUTOFF
+    token_budget: int = RETRIEVAL_CONTEXT_TOKENS
+
+    def _fuse(self, dense: List[Document], lexical: List[Document]) -> List[Document]:
+        if self.mode == "dense":
+            return dense
+        if self.mode == "lexical":
+            return lexical
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k, [self.weight_dense, self.weight_lexical])
+
+    def _vectors(self, docs: List[Document]) -> List[Optional[Sequence[float]]]:
+        """Stored embeddings of docs, by Chroma id (re-embedded for stores without one)."""
+        collection = getattr(self.vectorstore, "_collection", None)
+        if collection is None:
+            return self.vectorstore.embeddings.embed_documents([d.page_content for d in docs])
+        ids = [d.id for d in docs if d.id]
+        found = collection.get(ids=ids, include=["embeddings"]) if ids else {"ids": [], "embeddings": []}
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+        return [by_id.get(d.id) for d in docs]
+
+    def _select(self, query: str, query_vector, fused: List[Document]) -> List[Document]:
+        if not self.rerank:
+            return fused[:self.k]
+        with timer("retrieval", "rerank"):
+            candidates = fused[:self.candidates]
+            return rerank(query, query_vector, candidates, self._vectors(candidates),
+                          lexical_weight=self.lexical_weight, mmr_lambda=self.mmr_lambda, max_k=self.max_k,
+                          min_score=self.min_score, relative_cutoff=self.relative_cutoff,
+                          token_budget=self.token_budget)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filters: Optional[ChunkFilter] = None) -> List[Document]:
+        dense, lexical, query_vector = [], [], None
+        if self.mode != "lexical" or self.rerank:
+            with timer("retrieval", "dense"):
+                # The query vector is kept for reranking
+                query_vector = self.vectorstore.embeddings.embed_query(query)
+                if self.mode != "lexical":
+                    dense = self.vectorstore.similarity_search_by_vector(query_vector, k=self.k_dense,
+                                                                         filter=chroma_where(filters))
+        if self.mode != "dense":
+            with timer("retrieval", "lexical"):
+                lexical = lexical_search(query, self.k_lexical, self.collection, filters)
+        return self._select(query, query_vector, self._fuse(dense, lexical))
+
+    async def _adense(self, query: str, filters: Optional[ChunkFilter]):
+        query_vector = await self.vectorstore.embeddings.aembed_query(query)
+        if self.mode == "lexical":
+            return query_vector, []
+        return query_vector, await self.vectorstore.asimilarity_search_by_vector(
+            query_vector, k=self.k_dense, filter=chroma_where(filters))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       filters: Optional[ChunkFilter] = None) -> List[Document]:
+        async def no_dense():
+            return None, []
+
+        async def no_lexical():
+            return []
+
+        (query_vector, dense), lexical = await asyncio.gather(
+            measure("retrieval", "dense", self._adense(query, filters))
+            if self.mode != "lexical" or self.rerank else no_dense(),
+            measure("retrieval", "lexical",
+                    asyncio.to_thread(lexical_search, query, self.k_lexical, self.collection, filters))
+            if self.mode != "dense" else no_lexical(),
+        )
+        fused = self._fuse(dense, lexical)
+        if not self.rerank:
+            return fused[:self.k]
+        return await asyncio.to_thread(self._select, query, query_vector, fused)
+
+
+def build_retriever(vectorstore: VectorStore, mode: str = RETRIEVAL_MODE,
+                    collection: str = CHROMA_DEFAULT_COLLECTION) -> BaseRetriever:
+    return HybridRetriever(vectorstore=vectorstore, mode=mode, collection=collection)
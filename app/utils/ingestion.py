@@ -0,0 +1,235 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from app.config.settings import CHROMA_DEFAULT_COLLECTION, INGEST_PARSE_PROCESSES, INGEST_WORKERS, WORKERS
+from app.utils.chroma_utils import delete_doc_from_chroma, notify_documents_changed, sync_chunks
+from app.utils.db_utils import (
+    delete_document_record,
+    get_document,
+    get_document_by_filename,
+    get_document_by_hash,
+    get_ingestion_job_state,
+    insert_document_record,
+    save_ingestion_job,
+    update_document_hash,
+)
+from app.utils.loaders import parse_document
+from app.utils.utils import file_sha256
+
+MAX_TRACKED_JOBS = 500
+
+
+@dataclass
+class FileProgress:
+    filename: str
+    path: str
+    file_id: int
+    collection: str = CHROMA_DEFAULT_COLLECTION
+    tags: List[str] = field(default_factory=list)
+    content_hash: str = ""
+    status: str = "queued"          # queued | parsing | embedding | done | duplicate | failed
+    reindex: bool = False           # same filename already indexed with different content
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    files: List[FileProgress]
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def status(self) -> str:
+        states = {"done" if f.status == "duplicate" else f.status for f in self.files}
+        if states <= {"queued"}:
+            return "queued"
+        if states <= {"done"}:
+            return "done"
+        if states <= {"failed"}:
+            return "failed"
+        if states <= {"done", "failed"}:
+            return "partial"
+        return "running"
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "pages_parsed": sum(f.pages_parsed for f in self.files),
+            "chunks_total": sum(f.chunks_total for f in self.files),
+            "chunks_embedded": sum(f.chunks_embedded for f in self.files),
+            "chunks_reused": sum(f.chunks_reused for f in self.files),
+            "files": [
+                {k: v for k, v in vars(f).items() if k not in ("path", "content_hash")}
+                for f in self.files
+            ],
+        }
+
+
+# ── Worker pools ─────────────────────────────────────────────────────
+# Files are processed by a small thread pool; the CPU-bound parsing step is
+# handed to a process pool (spawned, so children never inherit Chroma handles),
+# a whole file at a time or, for PDFs, in page ranges parsed side by side.
+_workers = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+_jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+# Held while a job's files are registered and the job is published, so two
+# uploads of one filename never both insert it or both re-index it
+_register_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=INGEST_PARSE_PROCESSES,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def _persist(job: IngestionJob) -> None:
+    """With several workers, store the job's progress where the others can read it
+    (written on status changes, so chunk counts lag while a file is embedded)."""
+    if WORKERS <= 1:
+        return
+    try:
+        save_ingestion_job(job.id, job.to_dict())
+    except Exception as e:
+        logging.warning(f"Could not store the progress of ingestion job {job.id}: {e}")
+
+
+def _process_file(job: IngestionJob, entry: FileProgress) -> None:
+    try:
+        entry.status = "parsing"
+        _persist(job)
+        pages, splits = parse_document(entry.path, _get_parse_pool().submit)
+        entry.pages_parsed = pages
+        entry.chunks_total = len(splits)
+
+        entry.status = "embedding"
+        _persist(job)
+        summary = sync_chunks(splits, entry.file_id, on_progress=lambda n: setattr(entry, "chunks_embedded", n),
+                              collection=entry.collection, tags=entry.tags)
+        entry.chunks_embedded = summary["chunks_embedded"]
+        entry.chunks_reused = summary["chunks_reused"]
+        entry.chunks_deleted = summary["chunks_deleted"]
+        if get_document(entry.file_id) is None:
+            # Deleted meanwhile (through another worker): drop the chunks just written
+            delete_doc_from_chroma(entry.file_id, entry.collection)
+            delete_document_record(entry.file_id)
+            raise RuntimeError("The document was deleted while it was being indexed.")
+        if entry.reindex:
+            update_document_hash(entry.file_id, entry.content_hash, entry.tags)
+        notify_documents_changed([entry.file_id])
+        entry.status = "done"
+    except Exception as e:
+        logging.error(f"Ingestion job {job.id}: failed to index {entry.filename}: {e}")
+        entry.status = "failed"
+        entry.error = str(e)
+        if not entry.reindex:
+            delete_document_record(entry.file_id)
+    finally:
+        _finish_file(job, entry)
+
+
+def _finish_file(job: IngestionJob, entry: FileProgress) -> None:
+    shutil.rmtree(os.path.dirname(entry.path), ignore_errors=True)
+    if all(f.status in ("done", "duplicate", "failed") for f in job.files):
+        job.finished_at = time.time()
+    _persist(job)
+
+
+def _register_file(filename: str, path: str, content_hash: str, collection: str, tags: List[str],
+                   busy: Set[int]) -> FileProgress:
+    """Identical content is skipped; a known filename with new content is re-indexed
+    in place, unless it is still being indexed (file_id in `busy`). Both are looked
+    up within the collection only."""
+    common = dict(filename=filename, path=path, collection=collection, tags=tags, content_hash=content_hash)
+
+    duplicate = get_document_by_hash(content_hash, collection)
+    if duplicate:
+        return FileProgress(file_id=duplicate["id"], status="duplicate", **common)
+
+    previous = get_document_by_filename(filename, collection)
+    if previous:
+        if previous["id"] in busy:
+            return FileProgress(file_id=previous["id"], status="failed",
+                                error="This file is already being indexed; upload it again once that job is done.",
+                                **common)
+        return FileProgress(file_id=previous["id"], reindex=True, **common)
+
+    return FileProgress(file_id=insert_document_record(filename, content_hash, collection, tags), **common)
+
+
+def submit_job(uploads: List[Tuple[str, str]], collection: str = CHROMA_DEFAULT_COLLECTION,
+               tags: Optional[List[str]] = None) -> IngestionJob:
+    """Register (filename, temp_path) pairs as one job and queue them for
+    indexing into `collection`, every chunk tagged with `tags`. A file whose
+    record an earlier job is still indexing fails instead of racing it.
+
+    Each temp file must live in its own temporary directory, which is removed
+    once the file has been processed.
+    """
+    hashes = [file_sha256(path) for _, path in uploads]
+    with _register_lock:
+        busy = {f.file_id for f in active_files()}
+        files = []
+        for (name, path), content_hash in zip(uploads, hashes):
+            entry = _register_file(name, path, content_hash, collection, list(tags or []), busy)
+            if entry.status == "queued":
+                busy.add(entry.file_id)
+            files.append(entry)
+        job = IngestionJob(id=str(uuid.uuid4()), files=files)
+
+        with _jobs_lock:
+            _jobs[job.id] = job
+            while len(_jobs) > MAX_TRACKED_JOBS:
+                _jobs.popitem(last=False)
+    _persist(job)
+
+    for entry in files:
+        if entry.status != "queued":
+            _finish_file(job, entry)
+        else:
+            _workers.submit(_process_file, job, entry)
+    return job
+
+
+def get_job(job_id: str) -> Optional[IngestionJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def get_job_state(job_id: str) -> Optional[dict]:
+    """Progress of a job submitted to this worker or, with several workers, to any of them."""
+    job = get_job(job_id)
+    if job is not None:
+        return job.to_dict()
+    return get_ingestion_job_state(job_id) if WORKERS > 1 else None
+
+
+def active_files() -> List[FileProgress]:
+    """Files queued or being indexed, which maintenance must not touch."""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [f for job in jobs for f in job.files if f.status in ("queued", "parsing", "embedding")]
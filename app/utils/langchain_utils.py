@@ -1,6 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_cerebras import ChatCerebras
+from app.agent.shared import stage_llm
+from app.utils.lazy import Lazy
 
 contextualize_q_system_prompt = (
     "Given a chat history and the latest user question "
@@ -18,4 +19,23 @@ CONTEXT_PROMPT = ChatPromptTemplate.from_messages([
 ])
 
 
-contextualise_chain = ( CONTEXT_PROMPT | ChatCerebras(model_name="llama-3.3-70b", temperature=0) | StrOutputParser()).with_config(run_name="contextualise_chain")
\ No newline at end of file
+def build_contextualise_chain(model: str | None = None):
+    return ( CONTEXT_PROMPT | stage_llm("contextualise", model) | StrOutputParser()).with_config(run_name="contextualise_chain")
+
+contextualise_chain = Lazy("contextualise_chain", build_contextualise_chain)
+
+summary_system_prompt = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Extend the current summary with the new lines of conversation, keeping the facts, "
+    "names, numbers, decisions and open questions a later turn might refer back to. "
+    "Write it in the language of the conversation, in at most {max_words} words. "
+    "⟹ Return **only** the updated summary."
+)
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", summary_system_prompt),
+    ("human", "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}")
+])
+
+
+summary_chain = Lazy("summary_chain", lambda: ( SUMMARY_PROMPT | stage_llm("summary") | StrOutputParser()).with_config(run_name="summary_chain"))
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# name -> Lazy, in import order; warm_up() and /healthz walk it
+components: "Dict[str, Lazy]" = {}
+
+
+class Lazy(Generic[T]):
+    """Stand-in for a module-level client that is built on first use.
+
+    Attribute access is forwarded to the built object, so call sites keep
+    using it as before (`vectorstore.similarity_search(...)`); pass `.get()`
+    where the real instance is needed. Construction runs once under a lock; a
+    failure is kept for /healthz and retried on the next use.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self._name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._built = False
+        self._error: Optional[BaseException] = None
+        self._seconds = 0.0
+        self._lock = threading.Lock()
+        components[name] = self
+
+    def get(self) -> T:
+        if self._built:
+            return self._value
+        with self._lock:
+            if not self._built:
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self._error = e
+                    raise
+                self._seconds = time.perf_counter() - start
+                self._error = None
+                self._built = True
+                logging.info(f"Built {self._name} in {self._seconds * 1000:.0f} ms")
+        return self._value
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+    def reset(self) -> None:
+        """Drop the built object (e.g. a handle on a replaced collection); the next use rebuilds it."""
+        with self._lock:
+            self._value = None
+            self._built = False
+            self._error = None
+
+    def status(self) -> dict:
+        if self._built:
+            return {"status": "ready", "build_ms": round(self._seconds * 1000, 1)}
+        if self._error is not None:
+            return {"status": "error", "error": f"{type(self._error).__name__}: {self._error}"}
+        return {"status": "pending"}
+
+    def __repr__(self) -> str:
+        return f"Lazy({self._name!r}, {self.status()['status']})"
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    """Build the given components (all by default); errors are recorded, not raised."""
+    for name in list(names or components):
+        try:
+            components[name].get()
+        except Exception as e:
+            logging.error(f"Could not build {name}: {e}")
+    return component_status()
+
+
+def component_status() -> Dict[str, dict]:
+    return {name: lazy.status() for name, lazy in components.items()}
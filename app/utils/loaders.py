@@ -0,0 +1,13 @@
+from langchain_core.documents import Document
+from typing import Callable, List, Optional, Tuple
+from app.utils.parsing import TEXT_SUFFIXES, parse_document_parts
+
+# Kept free of the vector store and embedding client so parsing can run in a
+# separate process without opening Chroma or building API clients there.
+
+ALLOWED_EXTENSIONS = ['.pdf', '.docx'] + list(TEXT_SUFFIXES)
+
+def parse_document(file_path: str, submit: Optional[Callable] = None) -> Tuple[int, List[Document]]:
+    """Return (pages parsed, chunks) for a file. With `submit` (an executor's
+    submit), the page ranges of a PDF are parsed in parallel through it."""
+    return parse_document_parts(file_path, submit)
@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+from app.config.settings import CHROMA_PERSIST_DIR, CHROMA_SERVER_URL, DB_NAME
+from app.utils.chroma_utils import (
+    check_collection_name,
+    chroma_client,
+    drop_collection,
+    get_vectorstore,
+    is_staging,
+    iter_chunks,
+    list_collections,
+    notify_documents_changed,
+    replace_collection,
+    staging_name,
+)
+from app.utils.db_utils import (
+    delete_chunk_records,
+    delete_chunk_search_rows,
+    delete_document_records,
+    get_chunk_hashes,
+    get_chunk_search_ids,
+    get_collection_documents,
+    get_document_collections,
+    get_orphan_chunk_records,
+    insert_chunk_records,
+    insert_chunk_search_rows,
+    vacuum_database,
+)
+from app.utils.utils import text_sha256
+
+_SEGMENT_DIR_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def disk_usage(path: str) -> int:
+    """Bytes used by a file, or by everything under a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _store_usage() -> Dict[str, int]:
+    return {"chroma": disk_usage(CHROMA_PERSIST_DIR),
+            "sqlite": sum(disk_usage(DB_NAME + suffix) for suffix in ("", "-wal", "-shm")
+                          if os.path.exists(DB_NAME + suffix))}
+
+
+# ── Compaction ───────────────────────────────────────────────────────
+# Chroma never shrinks a collection's HNSW index: deleted chunks stay in it as
+# tombstones, and dropped collections leave their segment directories behind.
+# A collection is compacted by copying its live chunks (with their stored
+# embeddings) into a staging collection that then replaces it.
+def compact_collection(name: str) -> int:
+    """Rebuild a collection's Chroma index from its live chunks; returns how many were copied."""
+    staging = staging_name(name)
+    target = get_vectorstore(staging, create=True)._collection
+    copied = 0
+    try:
+        for page in iter_chunks(name, include=("embeddings", "documents", "metadatas")):
+            target.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"],
+                       metadatas=page["metadatas"])
+            copied += len(page["ids"])
+        # BM25 rows and chunk records are keyed by chunk id and stay valid
+        replace_collection(staging, name, move_records=False)
+    except BaseException:
+        drop_collection(staging)
+        raise
+    return copied
+
+
+def prune_segments() -> int:
+    """Delete segment directories no Chroma collection uses any more; returns the bytes freed."""
+    chroma_client.get()
+    with sqlite3.connect(os.path.join(CHROMA_PERSIST_DIR, "chroma.sqlite3")) as conn:
+        live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    freed = 0
+    for entry in os.listdir(CHROMA_PERSIST_DIR):
+        path = os.path.join(CHROMA_PERSIST_DIR, entry)
+        if os.path.isdir(path) and _SEGMENT_DIR_RE.match(entry) and entry not in live:
+            freed += disk_usage(path)
+            shutil.rmtree(path, ignore_errors=True)
+    return freed
+
+
+def vacuum_chroma() -> None:
+    conn = sqlite3.connect(os.path.join(CHROMA_PERSIST_DIR, "chroma.sqlite3"), timeout=30)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def compact(collections: Optional[List[str]] = None) -> dict:
+    """Compact `collections` (all by default), drop unused Chroma segments and
+    VACUUM both SQLite files. Indexing meanwhile is not supported: chunks
+    written to a collection while it is copied are lost."""
+    started = time.perf_counter()
+    before = _store_usage()
+    names = [check_collection_name(c) for c in collections] if collections else list_collections()
+    chunks = {}
+    for name in names:
+        chunks[name] = compact_collection(name)
+        logging.info(f"Compacted {name}: {chunks[name]} chunks")
+    # A Chroma server owns its files; only an in-process store is pruned here
+    if not CHROMA_SERVER_URL:
+        prune_segments()
+        vacuum_chroma()
+    vacuum_database()
+    after = _store_usage()
+    return {"collections": chunks, "bytes_before": before, "bytes_after": after,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+# ── Consistency check ────────────────────────────────────────────────
+# document_store, Chroma, the BM25 rows and the chunk records are written
+# separately, so a failure half-way (e.g. /delete-doc removing the chunks but
+# not the record) leaves them disagreeing. Per collection:
+#
+#   orphan_chunks     Chroma chunks whose file_id is not a document of the collection
+#   empty_documents   documents without any chunk in Chroma
+#   missing_lexical   chunks without a BM25 row      stale_lexical   BM25 rows without a chunk
+#   missing_records   chunks without a chunk record  stale_records   chunk records without a chunk
+#
+# Repairs delete whatever has nothing to back it and rebuild the BM25 rows and
+# chunk records from Chroma, which holds the text.
+def _check_collection(name: str, in_chroma: bool, skip: set, repair: bool) -> dict:
+    documents = {d["id"] for d in get_collection_documents(name)}
+    records = get_chunk_hashes(documents)
+    lexical = get_chunk_search_ids(name)
+    seen, orphans, with_chunks = set(), [], set()
+    missing_lexical, missing_records = [], []
+    for page in (iter_chunks(name) if in_chroma else ()):
+        for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            metadata = metadata or {}
+            file_id = metadata.get("file_id")
+            seen.add(chunk_id)
+            if file_id not in documents:
+                if file_id not in skip:
+                    orphans.append((chunk_id, file_id))
+                continue
+            with_chunks.add(file_id)
+            if chunk_id not in lexical:
+                missing_lexical.append((chunk_id, name, file_id, text, metadata))
+            if chunk_id not in records:
+                missing_records.append((file_id, chunk_id, text_sha256(text or "")))
+    empty = sorted(documents - with_chunks - skip)
+    stale_lexical = sorted(lexical - seen)
+    stale_records = sorted(chunk_id for chunk_id, (file_id, _) in records.items()
+                           if chunk_id not in seen and file_id not in skip)
+
+    if repair:
+        if orphans:
+            ids = [chunk_id for chunk_id, _ in orphans]
+            get_vectorstore(name)._collection.delete(ids=ids)
+            delete_chunk_search_rows(ids)
+            delete_chunk_records(ids)
+        delete_document_records(empty)
+        if missing_lexical:
+            insert_chunk_search_rows((chunk_id, collection, file_id, text, json.dumps(metadata))
+                                     for chunk_id, collection, file_id, text, metadata in missing_lexical)
+        delete_chunk_search_rows(stale_lexical)
+        by_file: Dict[int, list] = {}
+        for file_id, chunk_id, chunk_hash in missing_records:
+            by_file.setdefault(file_id, []).append((chunk_id, chunk_hash))
+        for file_id, rows in by_file.items():
+            insert_chunk_records(file_id, rows)
+        delete_chunk_records(stale_records)
+        changed = {file_id for _, file_id in orphans} | set(empty)
+        if changed:
+            notify_documents_changed(sorted(f for f in changed if f is not None))
+
+    return {
+        "documents": len(documents),
+        "chunks": len(seen),
+        "orphan_chunks": len(orphans),
+        "empty_documents": empty,
+        "missing_lexical": len(missing_lexical),
+        "stale_lexical": len(stale_lexical),
+        "missing_records": len(missing_records),
+        "stale_records": len(stale_records),
+    }
+
+
+def check_consistency(repair: bool = False, skip_file_ids: Iterable[int] = ()) -> dict:
+    """Report (and with `repair`, fix) disagreements between the stores.
+    `skip_file_ids` are documents being indexed right now, left alone."""
+    skip = set(skip_file_ids)
+    chroma_names = set(list_collections(include_staging=True))
+    all_names = chroma_names | set(get_document_collections())
+    # Staging collections only outlive a crashed import or compaction
+    leftover = sorted(name for name in all_names if is_staging(name))
+    names = sorted(all_names - set(leftover))
+    report = {name: _check_collection(name, name in chroma_names, skip, repair) for name in names}
+
+    orphan_records = get_orphan_chunk_records()
+    if repair:
+        for name in leftover:
+            drop_collection(name)
+        delete_chunk_records(orphan_records)
+    problems = sum(r["orphan_chunks"] + len(r["empty_documents"]) + r["missing_lexical"] + r["stale_lexical"]
+                   + r["missing_records"] + r["stale_records"] for r in report.values())
+    problems += len(leftover) + len(orphan_records)
+    return {
+        "consistent": problems == 0,
+        "repaired": repair and problems > 0,
+        "collections": report,
+        "leftover_staging": leftover,
+        "orphan_chunk_records": len(orphan_records),
+    }
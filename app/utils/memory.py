@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import logging
+from typing import Dict, List, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.config.settings import (
+    HISTORY_CACHE_ENABLED,
+    HISTORY_CACHE_VALIDATE,
+    MEMORY_ENABLED,
+    MEMORY_MAX_TURNS,
+    MEMORY_SUMMARY_BATCH_TURNS,
+    MEMORY_SUMMARY_MAX_WORDS,
+    MEMORY_TOKEN_BUDGET,
+)
+from app.utils import langchain_utils
+from app.utils.db_utils import (
+    aget_chat_turns,
+    aget_session_snapshot,
+    aget_session_summary,
+    aget_session_version,
+    ainsert_chat_history,
+    aupsert_session_summary,
+)
+from app.utils.session_cache import SessionEntry, session_cache
+from app.utils.utils import estimate_tokens
+from app.utils.telemetry import llm_config
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def turn_tokens(turn: Dict) -> int:
+    return estimate_tokens(turn["user_query"]) + estimate_tokens(turn["gpt_response"])
+
+
+def select_recent_turns(turns: List[Dict], max_turns: int, budget: int) -> List[Dict]:
+    """The newest turns, at most max_turns of them and within budget tokens, oldest first."""
+    selected, used = [], 0
+    for turn in reversed(turns[-max_turns:] if max_turns > 0 else []):
+        used += turn_tokens(turn)
+        if used > budget:
+            break
+        selected.append(turn)
+    return selected[::-1]
+
+
+def format_turns(turns: List[Dict]) -> str:
+    return "\n".join(f"User: {t['user_query']}\nAssistant: {t['gpt_response']}" for t in turns)
+
+
+# ── Prompt history ───────────────────────────────────────────────────
+def make_turn(turn_id: int, user_query: str, gpt_response: str) -> Dict:
+    return {"id": turn_id, "user_query": user_query, "gpt_response": gpt_response,
+            "messages": (HumanMessage(content=user_query), AIMessage(content=gpt_response))}
+
+
+async def _read_session(session_id: str) -> SessionEntry:
+    snapshot = await aget_session_snapshot(session_id, limit=MEMORY_MAX_TURNS if MEMORY_ENABLED else None,
+                                           with_summary=MEMORY_ENABLED)
+    return SessionEntry(
+        version=snapshot["version"],
+        summary=snapshot["summary"],
+        summarized_until_id=snapshot["summarized_until_id"],
+        turns=[make_turn(t["id"], t["user_query"], t["gpt_response"]) for t in snapshot["turns"]],
+    )
+
+
+async def get_session(session_id: str) -> SessionEntry:
+    """The session's summary and recent turns, from the hot-session cache when current."""
+    if not HISTORY_CACHE_ENABLED:
+        return await _read_session(session_id)
+
+    entry = session_cache.get(session_id)
+    if entry is not None:
+        if not HISTORY_CACHE_VALIDATE or await aget_session_version(session_id) == entry.version:
+            session_cache.record("hit")
+            return entry
+        session_cache.invalidate(session_id)
+        session_cache.record("stale")
+    else:
+        session_cache.record("miss")
+
+    session_cache.begin_load(session_id)
+    entry = None
+    try:
+        entry = await _read_session(session_id)
+        return entry
+    finally:
+        session_cache.finish_load(session_id, entry)
+
+
+async def load_memory(session_id: str) -> List[BaseMessage]:
+    """Messages for the next prompt: the session summary (if any) followed by the
+    most recent turns verbatim. Falls back to the full history when disabled."""
+    return session_messages(await get_session(session_id))
+
+
+def session_messages(entry: SessionEntry) -> List[BaseMessage]:
+    if not MEMORY_ENABLED:
+        return [m for turn in entry.turns for m in turn["messages"]]
+
+    budget = MEMORY_TOKEN_BUDGET - (estimate_tokens(entry.summary) if entry.summary else 0)
+    messages: List[BaseMessage] = []
+    if entry.summary:
+        messages.append(SystemMessage(content=SUMMARY_PREFIX + entry.summary))
+    for turn in select_recent_turns(entry.turns, MEMORY_MAX_TURNS, budget):
+        messages.extend(turn["messages"])
+    return messages
+
+
+async def save_turn(session_id: str, user_query: str, gpt_response: str, model: str) -> None:
+    """Persist a turn, write it through to the hot-session cache and schedule summarisation."""
+    turn_id, version = await ainsert_chat_history(session_id, user_query, gpt_response, model)
+    if HISTORY_CACHE_ENABLED:
+        session_cache.append_turn(session_id, version, make_turn(turn_id, user_query, gpt_response))
+    schedule_compaction(session_id)
+
+
+# ── Rolling summary ──────────────────────────────────────────────────
+# Runs after a turn is saved, off the request path. Only turns newer than the
+# stored summary are read, and only those falling out of the window are sent
+# to the LLM together with the previous summary.
+_compacting: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+compactions = 0
+
+
+async def compact_session(session_id: str) -> bool:
+    """Fold the turns that overflow the window into the session summary.
+    Returns True if the summary was updated."""
+    global compactions
+    if not MEMORY_ENABLED or session_id in _compacting:
+        return False
+    _compacting.add(session_id)
+    try:
+        summary = await aget_session_summary(session_id)
+        summary_text = summary["summary"] if summary else ""
+        after_id = summary["summarized_until_id"] if summary else 0
+        turns = await aget_chat_turns(session_id, after_id=after_id)
+
+        budget = MEMORY_TOKEN_BUDGET - (estimate_tokens(summary_text) if summary_text else 0)
+        if len(turns) <= MEMORY_MAX_TURNS and sum(turn_tokens(t) for t in turns) <= budget:
+            return False
+
+        keep = select_recent_turns(turns, MEMORY_MAX_TURNS - MEMORY_SUMMARY_BATCH_TURNS, budget)
+        fold = turns[:len(turns) - len(keep)]
+        new_summary = await langchain_utils.summary_chain.ainvoke({
+            "summary": summary_text or "(empty)",
+            "new_lines": format_turns(fold),
+            "max_words": MEMORY_SUMMARY_MAX_WORDS,
+        }, config=llm_config("summary"))
+        new_summary = new_summary.strip()
+        version = await aupsert_session_summary(session_id, new_summary, fold[-1]["id"])
+        if HISTORY_CACHE_ENABLED:
+            session_cache.apply_summary(session_id, version, new_summary, fold[-1]["id"])
+        compactions += 1
+        return True
+    finally:
+        _compacting.discard(session_id)
+
+
+async def _compact_in_background(session_id: str) -> None:
+    try:
+        await compact_session(session_id)
+    except Exception as e:
+        logging.warning(f"Conversation summary for session {session_id} failed: {e}")
+
+
+def schedule_compaction(session_id: str) -> None:
+    if not MEMORY_ENABLED:
+        return
+    # Fresh context: the work happens after the response and must not land in its trace
+    task = asyncio.create_task(_compact_in_background(session_id), context=contextvars.Context())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def wait_for_compactions() -> None:
+    """Wait for scheduled summary updates (benchmarks, shutdown)."""
+    while _tasks:
+        await asyncio.gather(*list(_tasks), return_exceptions=True)
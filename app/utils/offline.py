@@ -0,0 +1,230 @@
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from app.config.settings import (
+    FAKE_EMBEDDING_LATENCY_MS,
+    FAKE_LLM_ANSWER_TOKENS,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_MAX_CONCURRENCY,
+    FAKE_LLM_MODEL_LATENCY_MS,
+    FAKE_LLM_TOKEN_LATENCY_MS,
+    FAKE_SEARCH_LATENCY_MS,
+)
+from app.utils.embeddings import HashingEmbeddings
+
+# In-process stand-ins for Cerebras, Gemini embeddings and Tavily. They keep the
+# call shapes the app relies on (structured output, token streaming, usage
+# metadata, Tavily's result dict) and sleep for configurable latencies, so the
+# full pipeline can be load-tested without network access or API keys. The
+# fake LLM can also be given a capacity, past which it answers 429.
+
+_GREETING_RE = re.compile(r"^\s*(hola|buenas|buenos d[ií]as|gracias|adi[oó]s|hello|hi|thanks)\b", re.IGNORECASE)
+_FILLER = ("según la información disponible el procedimiento recomendado consiste en revisar el equipo "
+           "verificar la configuración y contactar a soporte si el problema persiste").split()
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _model_latencies(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=first_ms/token_ms,..." (FAKE_LLM_MODEL_LATENCY_MS)."""
+    latencies = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        first, _, per_token = values.partition("/")
+        latencies[model.strip()] = (float(first), float(per_token or FAKE_LLM_TOKEN_LATENCY_MS))
+    return latencies
+
+
+def _last_question(messages: List[BaseMessage]) -> str:
+    return next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+
+# ── Chat model ───────────────────────────────────────────────────────
+class FakeRateLimitError(Exception):
+    """Shaped like the OpenAI-style SDK error Cerebras' client raises on a 429."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float = 1):
+        super().__init__("Error code: 429 - too many concurrent requests")
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+# Calls in flight across every fake model, like one upstream account
+_fake_llm_calls = 0
+
+
+@asynccontextmanager
+async def _fake_llm_capacity():
+    global _fake_llm_calls
+    if FAKE_LLM_MAX_CONCURRENCY and _fake_llm_calls >= FAKE_LLM_MAX_CONCURRENCY:
+        raise FakeRateLimitError()
+    _fake_llm_calls += 1
+    try:
+        yield
+    finally:
+        _fake_llm_calls -= 1
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model: waits `latency_ms` before the first token and
+    `token_latency_ms` per generated token, and reports estimated usage."""
+
+    model_name: str = "fake-llm"
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    token_latency_ms: float = FAKE_LLM_TOKEN_LATENCY_MS
+    answer_tokens: int = FAKE_LLM_ANSWER_TOKENS
+
+    @classmethod
+    def for_model(cls, model: str) -> "FakeChatModel":
+        """Stand-in for `model`, with its FAKE_LLM_MODEL_LATENCY_MS latencies if listed there."""
+        latency, token_latency = _model_latencies(FAKE_LLM_MODEL_LATENCY_MS).get(
+            model, (FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKEN_LATENCY_MS))
+        return cls(model_name=model, latency_ms=latency, token_latency_ms=token_latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def _answer_words(self, messages: List[BaseMessage]) -> List[str]:
+        words = ["Respuesta", "simulada:"]
+        while len(words) < self.answer_tokens:
+            words.extend(_FILLER)
+        return words[:max(self.answer_tokens, 2)]
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> dict:
+        prompt = sum(_estimate_tokens(str(m.content)) for m in messages)
+        completion = _estimate_tokens(text)
+        return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        text = " ".join(self._answer_words(messages))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        time.sleep((self.latency_ms + self.token_latency_ms * self.answer_tokens) / 1000)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        result = self._result(messages)
+        async with _fake_llm_capacity():
+            await asyncio.sleep((self.latency_ms + self.token_latency_ms * self.answer_tokens) / 1000)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for chunk in self._chunks(messages):
+            time.sleep(self.token_latency_ms / 1000)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async with _fake_llm_capacity():
+            await asyncio.sleep(self.latency_ms / 1000)
+            for chunk in self._chunks(messages):
+                await asyncio.sleep(self.token_latency_ms / 1000)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _chunks(self, messages: List[BaseMessage]) -> List[ChatGenerationChunk]:
+        words = self._answer_words(messages)
+        chunks = [ChatGenerationChunk(message=AIMessageChunk(content=("" if i == 0 else " ") + w))
+                  for i, w in enumerate(words)]
+        chunks[-1] = ChatGenerationChunk(message=AIMessageChunk(
+            content=chunks[-1].message.content, usage_metadata=self._usage(messages, " ".join(words))))
+        return chunks
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        """Runs a (timed, metered) model call, then fills `schema` by rule:
+        greetings end the conversation, anything else goes to the knowledge base."""
+        async def structured(messages: List[BaseMessage], config: RunnableConfig):
+            await self.ainvoke(messages, config=config)
+            return self._fill(schema, messages)
+
+        def structured_sync(messages: List[BaseMessage], config: RunnableConfig):
+            self.invoke(messages, config=config)
+            return self._fill(schema, messages)
+
+        return RunnableLambda(structured_sync, afunc=structured, name=f"{self.model_name}-structured")
+
+    @staticmethod
+    def _fill(schema, messages: List[BaseMessage]):
+        question = _last_question(messages)
+        values = {}
+        for name, field in schema.model_fields.items():
+            if name == "route":
+                values[name] = "end" if _GREETING_RE.match(question) else "rag"
+            elif name == "reply":
+                values[name] = "¡Hola! ¿En qué puedo ayudarte?" if _GREETING_RE.match(question) else None
+            elif name == "standalone_question":
+                values[name] = question
+            elif field.annotation is bool:
+                values[name] = True
+        return schema(**values)
+
+
+# ── Embeddings ───────────────────────────────────────────────────────
+class FakeRemoteEmbeddings(HashingEmbeddings):
+    """Hashing vectors behind a per-call network delay, like a remote embedding API."""
+
+    def __init__(self, latency_ms: float = FAKE_EMBEDDING_LATENCY_MS, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency_ms = latency_ms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return super().embed_query(text)
+
+
+# ── Web search ───────────────────────────────────────────────────────
+class FakeTavilySearch:
+    """Returns Tavily-shaped results for any query after `latency_ms`."""
+
+    def __init__(self, max_results: int = 3, latency_ms: float = FAKE_SEARCH_LATENCY_MS, **kwargs: Any):
+        self.max_results = max_results
+        self.latency_ms = latency_ms
+
+    def _results(self, query: str) -> dict:
+        return {"query": query, "results": [
+            {"title": f"Resultado {i + 1} para {query}",
+             "content": f"Contenido web simulado sobre {query}. " + " ".join(_FILLER),
+             "url": f"https://example.com/{i + 1}"}
+            for i in range(self.max_results)
+        ]}
+
+    def invoke(self, input: dict, config: Optional[RunnableConfig] = None) -> dict:
+        time.sleep(self.latency_ms / 1000)
+        return self._results(input["query"])
+
+    async def ainvoke(self, input: dict, config: Optional[RunnableConfig] = None) -> dict:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._results(input["query"])
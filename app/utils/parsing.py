@@ -0,0 +1,463 @@
+import csv
+import html.parser
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.config.settings import CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_TYPE_SETTINGS, INGEST_PAGES_PER_PART
+
+# Streaming parse + structure-aware chunking. Readers yield Blocks (a heading or
+# a paragraph, with its page) lazily; the Chunker packs paragraphs into chunks
+# that never cross a heading. PDFs are cut into page ranges that can be parsed
+# in separate processes and stitched back together in order.
+#
+# Like loaders.py this module stays free of Chroma and API clients, since it
+# runs inside the ingestion process pool.
+
+TEXT_SUFFIXES = {".txt": "txt", ".text": "txt", ".md": "md", ".markdown": "md", ".csv": "csv",
+                 ".html": "html", ".htm": "html"}
+
+Heading = Tuple[int, str]
+
+
+@dataclass
+class Block:
+    text: str
+    page: Optional[int] = None    # 1-based; None for formats without pages
+    heading: int = 0              # heading level (1 = top), 0 for body text
+    row: Optional[int] = None     # CSV data row
+
+
+def detect_type(path: str) -> str:
+    """Document type from the file's leading bytes, falling back to the suffix for text formats."""
+    with open(path, "rb") as f:
+        head = f.read(2048)
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK"):
+        with zipfile.ZipFile(path) as z:
+            if "word/document.xml" in z.namelist():
+                return "docx"
+        raise ValueError(f"Unsupported file type: {path}")
+    text = head.decode("utf-8", "ignore").lstrip().lower()
+    if text.startswith(("<!doctype html", "<html")):
+        return "html"
+    doc_type = TEXT_SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if doc_type is None:
+        raise ValueError(f"Unsupported file type: {path}")
+    return doc_type
+
+
+def chunk_settings(doc_type: str) -> Tuple[int, int]:
+    """(chunk_size, chunk_overlap) for a type; CHUNK_TYPE_SETTINGS overrides the defaults."""
+    for item in CHUNK_TYPE_SETTINGS.split(","):
+        name, _, spec = item.partition("=")
+        if name.strip() == doc_type and spec:
+            size, _, overlap = spec.partition("/")
+            return int(size), int(overlap or 0)
+    return CHUNK_SIZE, CHUNK_OVERLAP
+
+
+# ── Readers ──────────────────────────────────────────────────────────
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(?:\.\d+){0,5})\.?\s+(\S.{0,100})$")
+
+
+def _plain_heading(line: str) -> int:
+    """Level of a numbered heading line ("2.3 Mantenimiento"), else 0."""
+    match = _NUMBERED_HEADING_RE.match(line)
+    if not match or line.endswith((".", ",", ";", ":")) or not match.group(2)[0].isalpha():
+        return 0
+    return match.group(1).count(".") + 1
+
+
+def _text_blocks(lines: Iterable[str], page: Optional[int], headings: Callable[[str], int]) -> Iterator[Block]:
+    """Paragraphs separated by blank lines; lines `headings` scores above 0 become headings."""
+    paragraph: List[str] = []
+    for raw in lines:
+        line = raw.strip()
+        level = headings(line) if line else 0
+        if not line or level:
+            if paragraph:
+                yield Block(" ".join(paragraph), page)
+                paragraph = []
+            if level:
+                yield Block(line, page, heading=level)
+        else:
+            paragraph.append(line)
+    if paragraph:
+        yield Block(" ".join(paragraph), page)
+
+
+def count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def read_pdf(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Block]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for number in range(start, stop):
+        text = reader.pages[number].extract_text() or ""
+        yield from _text_blocks(text.splitlines(), number + 1, _plain_heading)
+
+
+def read_txt(path: str) -> Iterator[Block]:
+    # Form feeds mark page breaks in exported text
+    page = 1
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines: List[str] = []
+        for line in f:
+            while "\f" in line:
+                before, line = line.split("\f", 1)
+                lines.append(before)
+                yield from _text_blocks(lines, page, _plain_heading)
+                lines, page = [], page + 1
+            lines.append(line)
+            if not line.strip():
+                yield from _text_blocks(lines, page, _plain_heading)
+                lines = []
+        yield from _text_blocks(lines, page, _plain_heading)
+
+
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+def read_markdown(path: str) -> Iterator[Block]:
+    paragraph: List[str] = []
+    fence: Optional[str] = None
+
+    def flush():
+        if paragraph:
+            text = "\n".join(paragraph) if fence else " ".join(line.strip() for line in paragraph)
+            paragraph.clear()
+            return [Block(text)]
+        return []
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+            stripped = line.strip()
+            if fence:
+                paragraph.append(line)
+                if stripped.startswith(fence):
+                    yield from flush()
+                    fence = None
+                continue
+            if stripped.startswith(("```", "~~~")):
+                yield from flush()
+                fence = stripped[:3]
+                paragraph.append(line)
+                continue
+            match = _MD_HEADING_RE.match(stripped)
+            if match:
+                yield from flush()
+                yield Block(match.group(2), heading=len(match.group(1)))
+            elif stripped and stripped[0] in "=-" and len(set(stripped)) == 1 and len(paragraph) == 1:
+                # Setext heading: a single line underlined with === or ---
+                title = paragraph.pop().strip()
+                yield Block(title, heading=1 if stripped[0] == "=" else 2)
+            elif not stripped:
+                yield from flush()
+            else:
+                paragraph.append(line)
+        yield from flush()
+
+
+def read_csv(path: str) -> Iterator[Block]:
+    """One block per data row, each value labelled with its column header."""
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [h.strip() or f"col{i + 1}" for i, h in enumerate(header)]
+        for number, row in enumerate(reader, start=1):
+            values = [f"{h}: {v.strip()}" for h, v in zip(header, row) if v.strip()]
+            if values:
+                yield Block("; ".join(values), row=number)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_HEADING_STYLE_RE = re.compile(r"^heading\s*(\d)$")
+
+
+def _docx_heading_styles(z: zipfile.ZipFile) -> dict:
+    """styleId -> heading level, from the style names (localized ids like "Ttulo1" included)."""
+    levels = {}
+    if "word/styles.xml" not in z.namelist():
+        return levels
+    root = ElementTree.fromstring(z.read("word/styles.xml"))
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        name = (name.get(f"{_W}val") if name is not None else "").strip().lower()
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        match = _HEADING_STYLE_RE.match(name)
+        if match:
+            levels[style_id] = int(match.group(1))
+        elif name == "title":
+            levels[style_id] = 1
+        elif outline is not None and outline.get(f"{_W}val", "9").isdigit() and int(outline.get(f"{_W}val")) < 9:
+            levels[style_id] = int(outline.get(f"{_W}val")) + 1
+    return levels
+
+
+def read_docx(path: str) -> Iterator[Block]:
+    # word/document.xml is parsed incrementally and every paragraph is released
+    # once read; page numbers follow explicit and last-rendered page breaks.
+    page = 1
+    with zipfile.ZipFile(path) as z:
+        styles = _docx_heading_styles(z)
+        with z.open("word/document.xml") as xml:
+            for _, element in ElementTree.iterparse(xml, events=("end",)):
+                if element.tag != f"{_W}p":
+                    continue
+                parts, breaks = [], 0
+                for node in element.iter():
+                    if node.tag == f"{_W}t" and node.text:
+                        parts.append(node.text)
+                    elif node.tag == f"{_W}tab":
+                        parts.append("\t")
+                    elif node.tag == f"{_W}br":
+                        if node.get(f"{_W}type") == "page":
+                            breaks += 1
+                        else:
+                            parts.append("\n")
+                    elif node.tag == f"{_W}lastRenderedPageBreak":
+                        breaks += 1
+                style = element.find(f"{_W}pPr/{_W}pStyle")
+                outline = element.find(f"{_W}pPr/{_W}outlineLvl")
+                level = styles.get(style.get(f"{_W}val"), 0) if style is not None else 0
+                if not level and outline is not None and outline.get(f"{_W}val", "9").isdigit():
+                    level = int(outline.get(f"{_W}val")) + 1 if int(outline.get(f"{_W}val")) < 9 else 0
+                element.clear()
+
+                page += breaks
+                text = "".join(parts).strip()
+                if text:
+                    yield Block(text, page, heading=level)
+
+
+class _HTMLBlocks(html.parser.HTMLParser):
+    BLOCK_TAGS = {"p", "div", "li", "tr", "td", "th", "pre", "blockquote", "section", "article", "table",
+                  "ul", "ol", "dd", "dt", "br", "header", "footer", "main", "aside", "figcaption"}
+    SKIP_TAGS = {"script", "style", "noscript", "head", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self._text: List[str] = []
+        self._skip = 0
+        self._heading = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._text).split())
+        self._text = []
+        if text:
+            self.blocks.append(Block(text, heading=self._heading))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = int(tag[1])
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = 0
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._text.append(data)
+
+
+def read_html(path: str) -> Iterator[Block]:
+    parser = _HTMLBlocks()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for data in iter(lambda: f.read(1 << 16), ""):
+            parser.feed(data)
+            yield from parser.blocks
+            parser.blocks = []
+    parser.close()
+    parser._flush()
+    yield from parser.blocks
+
+
+READERS = {"txt": read_txt, "md": read_markdown, "csv": read_csv, "docx": read_docx, "html": read_html}
+
+
+def iter_blocks(path: str, doc_type: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Block]:
+    """Blocks of a document, lazily; start/stop select a page range of a PDF."""
+    if doc_type == "pdf":
+        return read_pdf(path, start, stop)
+    return READERS[doc_type](path)
+
+
+# ── Chunking ─────────────────────────────────────────────────────────
+class Chunker:
+    """Packs paragraphs into chunks of up to chunk_size characters.
+
+    A heading closes the current chunk and opens its section, so chunks never
+    span two sections; trailing paragraphs that fit in chunk_overlap are
+    repeated at the start of the next chunk of the same section, and
+    paragraphs longer than a chunk are split on sentences and words. Each
+    chunk records the heading stack it was written under (see assemble()).
+    """
+
+    def __init__(self, doc_type: str, metadata: dict):
+        self.doc_type = doc_type
+        self.chunk_size, self.chunk_overlap = chunk_settings(doc_type)
+        self.metadata = metadata
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap,
+                                                       length_function=len)
+        self.stack: List[Heading] = []
+        self.min_level: Optional[int] = None     # lowest heading level seen so far
+        self.chunks: List[Document] = []
+        self.heads: List[Tuple[Optional[int], Tuple[Heading, ...]]] = []
+        self._blocks: List[Block] = []
+        self._size = 0
+
+    def feed(self, block: Block) -> None:
+        text = block.text.strip()
+        if not text:
+            return
+        if block.heading:
+            self.flush()
+            while self.stack and self.stack[-1][0] >= block.heading:
+                self.stack.pop()
+            self.stack.append((block.heading, text))
+            self.min_level = block.heading if self.min_level is None else min(self.min_level, block.heading)
+            # The heading opens the section's first chunk
+            self._add(block)
+            return
+
+        if len(text) > self.chunk_size:
+            self.flush()
+            for piece in self.splitter.split_text(text):
+                self._emit([Block(piece, block.page, row=block.row)])
+            return
+        if self._blocks and self._size + len(text) + 2 > self.chunk_size:
+            self._emit(self._blocks)
+            self._blocks = self._overlap_tail()
+            self._size = sum(len(b.text) + 2 for b in self._blocks)
+        self._add(block)
+
+    def _add(self, block: Block) -> None:
+        self._blocks.append(block)
+        self._size += len(block.text) + 2
+
+    def _overlap_tail(self) -> List[Block]:
+        tail, size = [], 0
+        for block in reversed(self._blocks):
+            if block.heading or size + len(block.text) > self.chunk_overlap:
+                break
+            tail.insert(0, block)
+            size += len(block.text)
+        return tail
+
+    def flush(self) -> None:
+        # A pending heading with no body yet stays for the next paragraph
+        if any(not b.heading for b in self._blocks):
+            self._emit(self._blocks)
+            self._blocks, self._size = [], 0
+
+    def finish(self) -> None:
+        if self._blocks:
+            self._emit(self._blocks)
+        self._blocks, self._size = [], 0
+
+    def _emit(self, blocks: List[Block]) -> None:
+        metadata = dict(self.metadata)
+        pages = [b.page for b in blocks if b.page is not None]
+        if pages:
+            metadata["page"], metadata["page_end"] = min(pages), max(pages)
+        rows = [b.row for b in blocks if b.row is not None]
+        if rows:
+            metadata["row"], metadata["row_end"] = min(rows), max(rows)
+        separator = "\n" if self.doc_type == "csv" else "\n\n"
+        self.chunks.append(Document(page_content=separator.join(b.text for b in blocks), metadata=metadata))
+        self.heads.append((self.min_level, tuple(self.stack)))
+
+
+# ── Parts and assembly ───────────────────────────────────────────────
+@dataclass
+class Part:
+    pages: int
+    chunks: List[Document]
+    heads: List[Tuple[Optional[int], Tuple[Heading, ...]]]
+    end: Tuple[Optional[int], Tuple[Heading, ...]] = (None, ())
+
+
+def parse_part(path: str, doc_type: Optional[str] = None, start: int = 0, stop: Optional[int] = None) -> Part:
+    """Chunks of one page range (the whole file for non-PDF types); picklable for the process pool."""
+    doc_type = doc_type or detect_type(path)
+    chunker = Chunker(doc_type, {"source": path, "type": doc_type})
+    last_page = 0
+    for block in iter_blocks(path, doc_type, start, stop):
+        chunker.feed(block)
+        last_page = max(last_page, block.page or 0)
+    chunker.finish()
+    pages = (stop - start) if doc_type == "pdf" and stop is not None else max(last_page - start, 1)
+    return Part(pages, chunker.chunks, chunker.heads, (chunker.min_level, tuple(chunker.stack)))
+
+
+def _section(inherited: Tuple[Heading, ...], min_level: Optional[int], stack: Tuple[Heading, ...]):
+    # Headings a part opened close every inherited heading of the same or a deeper level
+    return tuple(h for h in inherited if min_level is None or h[0] < min_level) + stack
+
+
+def assemble(parts: Iterable[Part]) -> Tuple[int, List[Document]]:
+    """(pages, chunks) from parts in document order, with the section path of
+    every chunk resolved against the headings still open from earlier parts."""
+    inherited: Tuple[Heading, ...] = ()
+    pages, chunks = 0, []
+    for part in parts:
+        for chunk, (min_level, stack) in zip(part.chunks, part.heads):
+            section = _section(inherited, min_level, stack)
+            if section:
+                chunk.metadata["section"] = " > ".join(title for _, title in section)
+            chunks.append(chunk)
+        inherited = _section(inherited, *part.end)
+        pages += part.pages
+    return pages, chunks
+
+
+def plan_parts(path: str, doc_type: str) -> List[Tuple[int, Optional[int]]]:
+    """Page ranges of INGEST_PAGES_PER_PART pages for PDFs; one part otherwise."""
+    if doc_type != "pdf":
+        return [(0, None)]
+    total = count_pdf_pages(path)
+    step = max(1, INGEST_PAGES_PER_PART)
+    return [(start, min(start + step, total)) for start in range(0, total, step)] or [(0, 0)]
+
+
+def parse_document_parts(path: str, submit: Optional[Callable] = None) -> Tuple[int, List[Document]]:
+    """(pages, chunks) of a file. With `submit` (e.g. an executor's submit) its
+    parts run through it; otherwise the file is streamed in this process."""
+    doc_type = detect_type(path)
+    if submit is None:
+        return assemble([parse_part(path, doc_type)])
+    futures = [submit(parse_part, path, doc_type, start, stop) for start, stop in plan_parts(path, doc_type)]
+    return assemble(future.result() for future in futures)
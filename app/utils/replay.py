@@ -0,0 +1,238 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from app.config.settings import HASHING_EMBEDDING_DIM, REPLAY_LATENCY_SCALE, REPLAY_PATH
+from app.utils.capture import as_messages, decode_vector, embedding_key, llm_key, note_replay_miss, search_key
+from app.utils.offline import FakeChatModel, FakeRemoteEmbeddings, FakeTavilySearch
+
+# Stand-ins for Cerebras, Gemini embeddings and Tavily that answer with the
+# responses of a traffic capture (app.utils.capture) at REPLAY_PATH, after the
+# recorded latency times REPLAY_LATENCY_SCALE, so replaying that traffic needs
+# no network and gives the same answers on every run. A request the capture
+# does not hold (the code now sends a different prompt or query) is answered
+# by the offline fakes and counted as a miss.
+
+
+# ── Recorded responses ───────────────────────────────────────────────
+class Cassette:
+    """Upstream responses of a capture file by request key; the first
+    recording of a key wins, so repeated requests replay identically."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.embedding_model: Optional[str] = None
+        self.embedding_dim: Optional[int] = None
+        self.hits = {"llm": 0, "embedding": 0, "search": 0}
+        self.misses = {"llm": 0, "embedding": 0, "search": 0}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for entry in json.loads(line).get("upstream", ()):
+                    self.entries.setdefault(entry["key"], entry)
+                    if entry["kind"] == "embedding" and self.embedding_model is None:
+                        self.embedding_model = entry["model"]
+                        self.embedding_dim = len(decode_vector(entry["vector"]))
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses[kind] += 1
+            note_replay_miss(kind)
+        else:
+            self.hits[kind] += 1
+        return entry
+
+    def stats(self) -> dict:
+        return {"path": self.path, "entries": len(self.entries), "hits": dict(self.hits), "misses": dict(self.misses)}
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def cassette() -> Cassette:
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            if not REPLAY_PATH:
+                raise ValueError("The 'replay' backends need REPLAY_PATH (a traffic capture file)")
+            _cassette = Cassette(REPLAY_PATH)
+        return _cassette
+
+
+def _delay(ms: float) -> float:
+    return max(0.0, ms * REPLAY_LATENCY_SCALE / 1000)
+
+
+# ── Chat model ───────────────────────────────────────────────────────
+class ReplayChatModel(BaseChatModel):
+    """Chat model answering with recorded outputs; streams split the recorded
+    answer into words after the recorded time to first token."""
+
+    model_name: str = "replay"
+
+    @classmethod
+    def for_model(cls, model: str) -> "ReplayChatModel":
+        return cls(model_name=model)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def _lookup(self, messages: List[BaseMessage], schema: Optional[str]) -> Optional[dict]:
+        return cassette().get("llm", llm_key(self.model_name, schema, messages))
+
+    @staticmethod
+    def _message(entry: dict) -> AIMessage:
+        output = entry["output"]
+        content = output["content"] if "content" in output else json.dumps(output["structured"], ensure_ascii=False)
+        usage = {"input_tokens": entry.get("prompt_tokens", 0), "output_tokens": entry.get("completion_tokens", 0)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=content, usage_metadata=usage, response_metadata={"replayed": True})
+
+    def _fallback(self) -> FakeChatModel:
+        return FakeChatModel.for_model(self.model_name)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, replay_schema: Optional[str] = None,
+                  **kwargs: Any) -> ChatResult:
+        entry = self._lookup(messages, replay_schema)
+        if entry is None:
+            return self._fallback()._generate(messages, stop, run_manager, **kwargs)
+        time.sleep(_delay(entry["ms"]))
+        return ChatResult(generations=[ChatGeneration(message=self._message(entry))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         replay_schema: Optional[str] = None, **kwargs: Any) -> ChatResult:
+        entry = self._lookup(messages, replay_schema)
+        if entry is None:
+            return await self._fallback()._agenerate(messages, stop, run_manager, **kwargs)
+        await asyncio.sleep(_delay(entry["ms"]))
+        return ChatResult(generations=[ChatGeneration(message=self._message(entry))])
+
+    def _chunks(self, entry: dict) -> List[ChatGenerationChunk]:
+        message = self._message(entry)
+        words = message.content.split(" ")
+        chunks = [ChatGenerationChunk(message=AIMessageChunk(content=("" if i == 0 else " ") + w))
+                  for i, w in enumerate(words)]
+        chunks[-1] = ChatGenerationChunk(message=AIMessageChunk(
+            content=chunks[-1].message.content, usage_metadata=message.usage_metadata))
+        return chunks
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, replay_schema: Optional[str] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, replay_schema)
+        if entry is None:
+            yield from self._fallback()._stream(messages, stop, run_manager, **kwargs)
+            return
+        chunks = self._chunks(entry)
+        first = entry.get("first_token_ms", entry["ms"])
+        time.sleep(_delay(first))
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(_delay((entry["ms"] - first) / len(chunks)))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       replay_schema: Optional[str] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        entry = self._lookup(messages, replay_schema)
+        if entry is None:
+            async for chunk in self._fallback()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        chunks = self._chunks(entry)
+        first = entry.get("first_token_ms", entry["ms"])
+        await asyncio.sleep(_delay(first))
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(_delay((entry["ms"] - first) / len(chunks)))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        """Runs a (timed, metered) model call and rebuilds `schema` from the
+        recorded output; on a miss it is filled by rule like the fake model."""
+        def parse(messages: List[BaseMessage], message: AIMessage):
+            if message.response_metadata.get("replayed"):
+                return schema.model_validate(json.loads(message.content))
+            return FakeChatModel._fill(schema, messages)
+
+        async def structured(input: Any, config: RunnableConfig):
+            messages = as_messages(input)
+            return parse(messages, await self.ainvoke(messages, config=config, replay_schema=schema.__name__))
+
+        def structured_sync(input: Any, config: RunnableConfig):
+            messages = as_messages(input)
+            return parse(messages, self.invoke(messages, config=config, replay_schema=schema.__name__))
+
+        return RunnableLambda(structured_sync, afunc=structured, name=f"{self.model_name}-structured")
+
+
+# ── Embeddings ───────────────────────────────────────────────────────
+class ReplayEmbeddings(Embeddings):
+    """Recorded query vectors, under the embedding model of the capture.
+    Documents come from a snapshot of the knowledge base and are not
+    replayed; anything unrecorded gets hashing vectors of the same size."""
+
+    def __init__(self):
+        recorded = cassette()
+        self.model = recorded.embedding_model or "replay"
+        self.dim = recorded.embedding_dim or HASHING_EMBEDDING_DIM
+        self._fallback = FakeRemoteEmbeddings(dim=self.dim)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._fallback.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        entry = cassette().get("embedding", embedding_key(self.model, text))
+        if entry is None:
+            return self._fallback.embed_query(text)
+        time.sleep(_delay(entry["ms"]))
+        return decode_vector(entry["vector"])
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(t) for t in texts]
+
+
+# ── Web search ───────────────────────────────────────────────────────
+class ReplaySearch:
+    """Recorded Tavily results by query."""
+
+    def __init__(self, max_results: int = 3, **kwargs: Any):
+        self._fallback = FakeTavilySearch(max_results=max_results)
+
+    def invoke(self, input: dict, config: Optional[RunnableConfig] = None) -> dict:
+        entry = cassette().get("search", search_key(input["query"]))
+        if entry is None:
+            return self._fallback.invoke(input, config)
+        time.sleep(_delay(entry["ms"]))
+        return entry["result"]
+
+    async def ainvoke(self, input: dict, config: Optional[RunnableConfig] = None) -> dict:
+        entry = cassette().get("search", search_key(input["query"]))
+        if entry is None:
+            return await self._fallback.ainvoke(input, config)
+        await asyncio.sleep(_delay(entry["ms"]))
+        return entry["result"]
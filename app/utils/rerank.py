@@ -0,0 +1,85 @@
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.utils.utils import estimate_tokens
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Function words that would make every chunk look like it overlaps the query
+STOPWORDS = frozenset("""
+    a al algo como con cual cuales cuando de del donde el ella en entre es esta este esto hay la las le lo los
+    mas me mi muy no nos o para pero por que se si sin sobre su sus te tu un una uno y ya cómo qué cuál
+    dónde cuándo puedo hago hacer tengo debo
+    an and are as at be by can do does for from how i in is it of on or the to what when where which who why
+    with you your
+""".split())
+
+
+def content_tokens(text: str) -> set:
+    return {t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1}
+
+
+def lexical_overlap(query_tokens: set, text: str) -> float:
+    """Share of the query's content words that appear in text."""
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & content_tokens(text)) / len(query_tokens)
+
+
+def _unit_rows(vectors: Sequence[Optional[Sequence[float]]], dim: int) -> np.ndarray:
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector is not None and len(vector):
+            matrix[i] = vector
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def rerank(query: str, query_vector: Sequence[float], docs: List[Document],
+           vectors: Sequence[Optional[Sequence[float]]], *, lexical_weight: float, mmr_lambda: float,
+           max_k: int, min_score: float, relative_cutoff: float, token_budget: int) -> List[Document]:
+    """Pick an adaptive number of docs by relevance and diversity.
+
+    Relevance blends the cosine similarity to the query with lexical overlap.
+    Docs under min_score, or under relative_cutoff x the best relevance, are
+    dropped; the rest are taken in MMR order until max_k docs or token_budget
+    tokens (the first doc is always kept). Each returned doc gets its
+    relevance in metadata["score"].
+    """
+    if not docs:
+        return []
+    query_unit = _unit_rows([query_vector], len(query_vector))[0]
+    units = _unit_rows(vectors, len(query_vector))
+    dense = np.clip(units @ query_unit, 0.0, 1.0)
+    query_tokens = content_tokens(query)
+    lexical = np.array([lexical_overlap(query_tokens, d.page_content) for d in docs], dtype=np.float32)
+    relevance = (1 - lexical_weight) * dense + lexical_weight * lexical
+
+    floor = max(min_score, relative_cutoff * float(relevance.max()))
+    remaining = [i for i in range(len(docs)) if relevance[i] >= floor]
+    selected: List[int] = []
+    used = 0
+    while remaining and len(selected) < max_k:
+        if selected:
+            redundancy = (units[remaining] @ units[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+        tokens = estimate_tokens(docs[best].page_content)
+        if selected and used + tokens > token_budget:
+            continue
+        selected.append(best)
+        used += tokens
+
+    for i in selected:
+        docs[i].metadata["score"] = round(float(relevance[i]), 4)
+    return [docs[i] for i in selected]
+
+
+def confidence(docs: List[Document]) -> Optional[float]:
+    """Best reranked score among docs; None when they were not reranked."""
+    scores = [d.metadata["score"] for d in docs if "score" in d.metadata]
+    return max(scores) if scores else None
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config.settings import (
+    CHROMA_DEFAULT_COLLECTION,
+    MODEL_ANSWER,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+from app.utils.chroma_utils import document_listeners, embedding_function
+from app.utils.telemetry import count_cache
+
+
+def scope_key(scope: Optional[dict], model: Optional[str] = None) -> str:
+    """Cache partition of a retrieval scope ({"collection", "filters"}) and answer
+    model: answers are only reused for the same collection, chunk filters and model."""
+    scope = scope or {}
+    collection = scope.get("collection") or CHROMA_DEFAULT_COLLECTION
+    model = None if model == MODEL_ANSWER else model
+    if collection == CHROMA_DEFAULT_COLLECTION and not scope.get("filters") and not model:
+        return ""
+    return json.dumps([collection, scope.get("filters"), model], sort_keys=True)
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    answer: str
+    file_ids: frozenset
+    vector: np.ndarray
+    scope: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticCache:
+    """Answer cache keyed on the embedding of the standalone question.
+
+    A lookup returns the stored answer of the most similar cached question when
+    the cosine similarity reaches `threshold`. Entries expire after `ttl_seconds`,
+    the least recently used ones are evicted past `max_entries`, and entries are
+    dropped when a document whose chunks produced the answer is re-indexed or
+    deleted. Entries only match lookups with the same `scope` (see scope_key).
+    """
+
+    def __init__(self, embeddings: Embeddings, threshold: float, ttl_seconds: float, max_entries: int):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalise(vector: List[float]) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm else arr
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e.created_at > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    def _search(self, vector: np.ndarray, scope: str = "") -> Optional[CacheEntry]:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            keys = [k for k, e in self._entries.items() if e.scope == scope]
+            if not keys:
+                self.misses += 1
+                count_cache("answer", "miss")
+                return None
+
+            matrix = np.stack([self._entries[k].vector for k in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                self.misses += 1
+                count_cache("answer", "miss")
+                return None
+
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            count_cache("answer", "hit")
+            return self._entries[keys[best]]
+
+    def _insert(self, question: str, answer: str, file_ids: Iterable[int], vector: np.ndarray,
+                scope: str = "") -> None:
+        with self._lock:
+            self._entries[self._next_id] = CacheEntry(question, answer, frozenset(file_ids), vector, scope)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def alookup(self, question: str, scope: str = "") -> Optional[CacheEntry]:
+        vector = self._normalise(await self.embeddings.aembed_query(question))
+        return self._search(vector, scope)
+
+    async def astore(self, question: str, answer: str, file_ids: Iterable[int], scope: str = "") -> None:
+        vector = self._normalise(await self.embeddings.aembed_query(question))
+        self._insert(question, answer, file_ids, vector, scope)
+
+    def invalidate_files(self, file_ids: Iterable[int]) -> int:
+        """Drop entries built from any of file_ids, plus those answered without KB chunks,
+        since new or changed documents may now cover them."""
+        file_ids = set(file_ids)
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if not e.file_ids or e.file_ids & file_ids]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": SEMANTIC_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = SemanticCache(
+    embedding_function,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+)
+document_listeners.append(answer_cache.invalidate_files)
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.config.settings import (
+    HISTORY_CACHE_MAX_SESSIONS,
+    HISTORY_CACHE_TTL_SECONDS,
+    MEMORY_ENABLED,
+    MEMORY_MAX_TURNS,
+)
+from app.utils.telemetry import count_cache
+
+
+@dataclass
+class SessionEntry:
+    """Prompt history of one session as of `version`. Turns are dicts with
+    id, user_query, gpt_response and their prebuilt `messages`."""
+    version: int
+    summary: str
+    summarized_until_id: int
+    turns: List[dict]
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class SessionCache:
+    """LRU of recently active sessions, kept current by write-through.
+
+    Saved turns and summary updates are applied to the cached entry when the
+    new session version directly follows the cached one; any gap means another
+    writer got in between and the entry is dropped. Entries expire after
+    `ttl_seconds` and the least recently used ones are evicted past
+    `max_sessions`. `max_turns` caps the turns kept per session (None keeps all).
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, max_turns: Optional[int] = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        # Sessions being loaded from SQLite -> highest version written meanwhile
+        self._loading: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                del self._entries[session_id]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def record(self, outcome: str) -> None:
+        """Count a lookup as 'hit', 'miss' or 'stale' (cached but outdated)."""
+        count_cache("session", outcome)
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "stale":
+                self.stale += 1
+            else:
+                self.misses += 1
+
+    def begin_load(self, session_id: str) -> None:
+        with self._lock:
+            pending = self._loading.setdefault(session_id, [0, 0])
+            pending[0] += 1
+
+    def finish_load(self, session_id: str, entry: Optional[SessionEntry]) -> None:
+        """Store a freshly read entry, unless a newer version was written while it was being read."""
+        with self._lock:
+            pending = self._loading.get(session_id)
+            newer_written = bool(pending) and pending[1] > (entry.version if entry else 0)
+            if pending:
+                pending[0] -= 1
+                if pending[0] <= 0:
+                    del self._loading[session_id]
+            if entry is None or newer_written:
+                return
+            self._trim(entry)
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def append_turn(self, session_id: str, version: int, turn: dict) -> None:
+        with self._lock:
+            self._note_write(session_id, version)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            if entry.version + 1 != version:
+                del self._entries[session_id]
+                return
+            entry.turns.append(turn)
+            entry.version = version
+            self._trim(entry)
+
+    def apply_summary(self, session_id: str, version: Optional[int], summary: str, summarized_until_id: int) -> None:
+        with self._lock:
+            if version is None:
+                self._entries.pop(session_id, None)
+                return
+            self._note_write(session_id, version)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            if entry.version + 1 != version:
+                del self._entries[session_id]
+                return
+            entry.summary = summary
+            entry.summarized_until_id = summarized_until_id
+            entry.turns = [t for t in entry.turns if t["id"] > summarized_until_id]
+            entry.version = version
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _note_write(self, session_id: str, version: int) -> None:
+        pending = self._loading.get(session_id)
+        if pending:
+            pending[1] = max(pending[1], version)
+
+    def _trim(self, entry: SessionEntry) -> None:
+        if self.max_turns is not None and len(entry.turns) > self.max_turns:
+            del entry.turns[:len(entry.turns) - self.max_turns]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "sessions": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+# Bounded memory only ever needs the newest MEMORY_MAX_TURNS unsummarized turns
+session_cache = SessionCache(HISTORY_CACHE_MAX_SESSIONS, HISTORY_CACHE_TTL_SECONDS,
+                             MEMORY_MAX_TURNS if MEMORY_ENABLED else None)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from app.config.settings import (
+    SESSION_LOCK_LEASE_SECONDS,
+    SESSION_LOCK_TIMEOUT_SECONDS,
+    SESSION_MAX_PENDING_TURNS,
+    WORKERS,
+)
+from app.utils.admission import Overloaded
+from app.utils.db_utils import acquire_session_lease, release_session_lease
+
+
+class SessionLocks:
+    """Runs the turns of a session one at a time, in arrival order.
+
+    Two turns sent back to back would otherwise both load the same history
+    and save their answers in whichever order they finish. In process each
+    session gets a FIFO asyncio.Lock, dropped once nobody holds or waits for
+    it; with `shared`, the holder also takes the session's lease row in
+    SQLite, so a turn handled by another worker waits as well.
+    """
+
+    def __init__(self, max_pending: int, timeout: float, lease_seconds: float, shared: bool):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self.shared = shared
+        # session_id -> [lock, turns holding or waiting for it]
+        self._locks: Dict[str, List] = {}
+        self.waited = 0
+        self.rejected = 0
+
+    def check(self, session_id: str) -> None:
+        """429 right away if the session already has max_pending turns waiting."""
+        entry = self._locks.get(session_id)
+        if entry is not None and entry[1] > self.max_pending:
+            self.rejected += 1
+            raise Overloaded("session", "busy", 1, status_code=429)
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        self.check(session_id)
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        try:
+            if entry[1] > 1:
+                self.waited += 1
+            try:
+                await asyncio.wait_for(entry[0].acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Overloaded("session", "timeout", 1, status_code=429)
+            try:
+                owner = await self._lease(session_id, deadline) if self.shared else None
+                try:
+                    yield
+                finally:
+                    if owner is not None:
+                        await self._release_lease(session_id, owner)
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(session_id, None)
+
+    async def _lease(self, session_id: str, deadline: float) -> str:
+        loop = asyncio.get_running_loop()
+        owner = uuid.uuid4().hex
+        delay = 0.01
+        try:
+            while not await asyncio.to_thread(acquire_session_lease, session_id, owner, self.lease_seconds):
+                if loop.time() + delay > deadline:
+                    self.rejected += 1
+                    raise Overloaded("session", "timeout", 1, status_code=429)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.2)
+        except BaseException:
+            # Cancelled while the lease query ran: it may have been taken
+            await self._release_lease(session_id, owner)
+            raise
+        return owner
+
+    async def _release_lease(self, session_id: str, owner: str) -> None:
+        try:
+            await asyncio.shield(asyncio.to_thread(release_session_lease, session_id, owner))
+        except Exception as e:
+            logging.warning(f"Could not release the lease of session {session_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._locks),
+            "waiting": sum(max(0, users - 1) for _, users in self._locks.values()),
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "shared": self.shared,
+        }
+
+
+session_locks = SessionLocks(SESSION_MAX_PENDING_TURNS, SESSION_LOCK_TIMEOUT_SECONDS, SESSION_LOCK_LEASE_SECONDS,
+                             shared=WORKERS > 1)
@@ -0,0 +1,123 @@
+import asyncio
+import re
+import unicodedata
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.utils.telemetry import count_coalesced
+
+_SPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCT = "¿?¡!.,;: \t\n"
+
+
+def normalize_question(question: str) -> str:
+    """Case, width, whitespace and surrounding punctuation folded away."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    return _SPACE_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+class Flight:
+    """One shared computation. Events it publishes are buffered, so a
+    subscriber that joins late still replays the stream from the start."""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, event: Any) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _leave(self) -> None:
+        # Nobody is waiting for the result any more
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            self.task.cancel()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Every published event, then returns (or raises the computation's error)."""
+        self.subscribers += 1
+        try:
+            i = 0
+            while True:
+                while i < len(self.events):
+                    yield self.events[i]
+                    i += 1
+                if self.done:
+                    break
+                await self._changed.wait()
+        finally:
+            self._leave()
+        if self.error is not None:
+            raise self.error
+
+    async def wait(self) -> Any:
+        self.subscribers += 1
+        try:
+            # Shielded: one caller going away must not cancel the others' result
+            await asyncio.shield(self.task)
+        finally:
+            self._leave()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Deduplicates concurrent identical work: the first caller for a key starts
+    the computation and later callers with the same key join it until it ends."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: Hashable, work: Callable[[Callable[[Any], None]], Awaitable[Any]]) -> Tuple[Flight, bool]:
+        """Flight for `key`, started with `work(publish)` unless one is in flight.
+        Returns (flight, started_here)."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            count_coalesced(self.name)
+            return flight, False
+        flight = Flight()
+        self._flights[key] = flight
+        self.leaders += 1
+        flight.task = asyncio.create_task(self._run(key, flight, work))
+        return flight, True
+
+    async def _run(self, key: Hashable, flight: Flight, work) -> None:
+        try:
+            flight.result = await work(flight.publish)
+        except BaseException as e:
+            flight.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight._notify()
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of `work()` shared with concurrent callers; (result, started_here)."""
+        flight, leader = self.join(key, lambda _publish: work())
+        return await flight.wait(), leader
+
+    def stats(self) -> dict:
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "computations": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / calls if calls else 0.0,
+        }
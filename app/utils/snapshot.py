@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config.settings import CHROMA_WRITE_BATCH_SIZE
+from app.utils.chroma_utils import (
+    check_collection_name,
+    drop_collection,
+    embedding_function,
+    get_vectorstore,
+    iter_chunks,
+    list_collections,
+    notify_documents_changed,
+    replace_collection,
+    staging_name,
+    write_chunks,
+)
+from app.utils.db_utils import (
+    get_chunk_hashes,
+    get_collection_documents,
+    insert_chunk_records,
+    restore_document_record,
+)
+
+# ── Format ───────────────────────────────────────────────────────────
+# A snapshot is a directory of column files, one row per chunk, grouped by
+# collection (manifest.json holds each collection's row range and document
+# records):
+#
+#   embeddings.npy            float32 (rows, dimension)
+#   file_id.npy               int64, the file_id in the source store
+#   <column>.bin / .idx.npy   UTF-8 values back to back / int64 end offsets,
+#                             for chunk_id, document, metadata (JSON), chunk_hash
+#
+# All of them are memory-mapped on import, which streams rows into Chroma in
+# CHROMA_WRITE_BATCH_SIZE batches without embedding anything again.
+SNAPSHOT_FORMAT = 1
+STRING_COLUMNS = ("chunk_id", "document", "metadata", "chunk_hash")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class _StringColumnWriter:
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self._file = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self._ends: List[int] = []
+        self._size = 0
+
+    def append(self, value: str) -> None:
+        data = value.encode("utf-8")
+        self._file.write(data)
+        self._size += len(data)
+        self._ends.append(self._size)
+
+    def close(self) -> None:
+        self._file.close()
+        np.save(os.path.join(self.directory, f"{self.name}.idx.npy"), np.asarray(self._ends, dtype=np.int64))
+
+
+class StringColumn:
+    """Memory-mapped reader of a column written by _StringColumnWriter."""
+
+    def __init__(self, directory: str, name: str):
+        self.ends = np.load(os.path.join(directory, f"{name}.idx.npy"), mmap_mode="r")
+        path = os.path.join(directory, f"{name}.bin")
+        # np.memmap refuses empty files
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        ends = self.ends[start:stop]
+        begin = int(self.ends[start - 1]) if start else 0
+        raw = self.data[begin:int(ends[-1])].tobytes() if len(ends) else b""
+        out, offset = [], begin
+        for end in ends:
+            out.append(raw[offset - begin:int(end) - begin].decode("utf-8"))
+            offset = int(end)
+        return out
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotError(f"No snapshot at {path}")
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')!r} in {path}")
+    return manifest
+
+
+# ── Export ───────────────────────────────────────────────────────────
+def export_snapshot(path: str, collections: Optional[List[str]] = None) -> dict:
+    """Write the chunks, embeddings and document records of `collections`
+    (every collection by default) to a new snapshot directory; returns its manifest.
+
+    The files are written to `<path>.partial` and renamed when complete.
+    Indexing into the exported collections meanwhile makes the export fail.
+    """
+    if os.path.exists(path):
+        raise SnapshotError(f"{path} already exists")
+    names = [check_collection_name(c) for c in collections] if collections else list_collections()
+    started = time.perf_counter()
+    counts = {name: get_vectorstore(name)._collection.count() for name in names}
+    total = sum(counts.values())
+    dimension = 0
+    for name in names:
+        if counts[name]:
+            dimension = len(get_vectorstore(name)._collection.get(limit=1, include=["embeddings"])["embeddings"][0])
+            break
+
+    partial = path + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    embeddings = np.lib.format.open_memmap(os.path.join(partial, "embeddings.npy"), mode="w+",
+                                           dtype=np.float32, shape=(total, dimension))
+    file_ids = np.lib.format.open_memmap(os.path.join(partial, "file_id.npy"), mode="w+",
+                                         dtype=np.int64, shape=(total,))
+    columns = {name: _StringColumnWriter(partial, name) for name in STRING_COLUMNS}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.time(),
+        "embedding_model": embedding_function.model,
+        "dimension": dimension,
+        "rows": total,
+        "collections": {},
+    }
+    row = 0
+    try:
+        for name in names:
+            documents = get_collection_documents(name)
+            hashes = get_chunk_hashes(d["id"] for d in documents)
+            start = row
+            for page in iter_chunks(name, include=("embeddings", "documents", "metadatas")):
+                stop = row + len(page["ids"])
+                if stop > start + counts[name]:
+                    raise SnapshotError(f"Collection {name} changed during the export")
+                embeddings[row:stop] = page["embeddings"]
+                for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    metadata = metadata or {}
+                    file_ids[row] = metadata.get("file_id", -1)
+                    columns["chunk_id"].append(chunk_id)
+                    columns["document"].append(text or "")
+                    columns["metadata"].append(json.dumps(metadata, ensure_ascii=False))
+                    columns["chunk_hash"].append(hashes.get(chunk_id, (None, ""))[1])
+                    row += 1
+            if row != start + counts[name]:
+                raise SnapshotError(f"Collection {name} changed during the export")
+            manifest["collections"][name] = {"start": start, "stop": row, "documents": documents}
+    except BaseException:
+        for column in columns.values():
+            column.close()
+        del embeddings, file_ids
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    for column in columns.values():
+        column.close()
+    embeddings.flush()
+    file_ids.flush()
+    del embeddings, file_ids
+    with open(os.path.join(partial, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, default=str)
+    os.rename(partial, path)
+    logging.info(f"Exported {total} chunks of {len(names)} collection(s) to {path} "
+                 f"in {time.perf_counter() - started:.1f} s")
+    return manifest
+
+
+# ── Import ───────────────────────────────────────────────────────────
+def import_snapshot(path: str, collections: Optional[List[str]] = None, replace: bool = False,
+                    force: bool = False) -> Dict[str, dict]:
+    """Load `collections` (all of them by default) from a snapshot with their
+    stored embeddings; returns {collection: {"chunks", "documents"}}.
+
+    A collection that already holds chunks or documents is only overwritten
+    with `replace`. Each one is built under a staging name and swapped in
+    when complete, so a failed import leaves the live collection untouched.
+    Documents get new file_ids. The snapshot's embedding model must match
+    EMBEDDING_MODEL unless `force` is set.
+    """
+    manifest = read_manifest(path)
+    model = embedding_function.model
+    if manifest["embedding_model"] != model and not force:
+        raise SnapshotError(f"Snapshot embeddings come from {manifest['embedding_model']!r}, "
+                            f"this store uses {model!r}")
+    names = collections or list(manifest["collections"])
+    missing = [name for name in names if name not in manifest["collections"]]
+    if missing:
+        raise SnapshotError(f"Collections not in the snapshot: {', '.join(missing)}")
+    existing = set(list_collections())
+    for name in names:
+        check_collection_name(name)
+        in_use = (name in existing and get_vectorstore(name)._collection.count()) or get_collection_documents(name)
+        if in_use and not replace:
+            raise SnapshotError(f"Collection {name} is not empty; import with replace to overwrite it")
+
+    embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    columns = {name: StringColumn(path, name) for name in STRING_COLUMNS}
+    summary = {}
+    for name in names:
+        started = time.perf_counter()
+        entry = manifest["collections"][name]
+        staging = staging_name(name)
+        try:
+            file_ids = _import_collection(staging, entry, embeddings, columns)
+            replace_collection(staging, name)
+        except BaseException:
+            drop_collection(staging)
+            raise
+        notify_documents_changed(list(file_ids.values()))
+        summary[name] = {"chunks": entry["stop"] - entry["start"], "documents": len(entry["documents"])}
+        logging.info(f"Imported {summary[name]['chunks']} chunks into {name} from {path} "
+                     f"in {time.perf_counter() - started:.1f} s")
+    return summary
+
+
+def _import_collection(staging: str, entry: dict, embeddings: np.ndarray, columns: Dict[str, StringColumn]) -> dict:
+    """Write a snapshot collection's records and chunks under `staging`; returns old -> new file_id."""
+    file_ids = {
+        doc["id"]: restore_document_record(doc["filename"], doc.get("content_hash"), staging, doc.get("tags") or [],
+                                           doc.get("upload_timestamp"))
+        for doc in entry["documents"]
+    }
+    get_vectorstore(staging, create=True)
+    for start in range(entry["start"], entry["stop"], CHROMA_WRITE_BATCH_SIZE):
+        stop = min(start + CHROMA_WRITE_BATCH_SIZE, entry["stop"])
+        ids = columns["chunk_id"].slice(start, stop)
+        splits = []
+        for text, metadata in zip(columns["document"].slice(start, stop), columns["metadata"].slice(start, stop)):
+            metadata = json.loads(metadata)
+            if metadata.get("file_id") in file_ids:
+                metadata["file_id"] = file_ids[metadata["file_id"]]
+            splits.append(Document(page_content=text, metadata=metadata))
+        write_chunks(staging, ids, splits, np.asarray(embeddings[start:stop]))
+
+        records: Dict[int, list] = {}
+        for chunk_id, split, chunk_hash in zip(ids, splits, columns["chunk_hash"].slice(start, stop)):
+            if chunk_hash and "file_id" in split.metadata:
+                records.setdefault(split.metadata["file_id"], []).append((chunk_id, chunk_hash))
+        for file_id, rows in records.items():
+            insert_chunk_records(file_id, rows)
+    return file_ids
@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+from app.config.settings import DEBUG_LOG_SAMPLE_RATE, METRICS_ENABLED
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ── Prometheus metrics ───────────────────────────────────────────────
+# kind is one of node | tool | retrieval | llm | chain | embedding | db | stream | router | queue
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Duration of a pipeline stage", ["kind", "stage"],
+                          buckets=BUCKETS)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Pipeline stages that raised", ["kind", "stage"])
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "Time until the response starts", ["method", "path"],
+                            buckets=BUCKETS)
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens by pipeline stage and model", ["stage", "model", "type"])
+ROUTE_DECISIONS = Counter("rag_route_decisions_total", "Router decisions", ["route"])
+CACHE_EVENTS = Counter("rag_cache_events_total", "Cache lookups by outcome", ["cache", "outcome"])
+COALESCED_REQUESTS = Counter("rag_coalesced_requests_total", "Requests that joined an identical in-flight one",
+                             ["endpoint"])
+WEB_SEARCH_EVENTS = Counter("rag_web_search_events_total", "Web searches past the deadline or hedged", ["event"])
+ROUTER_DECIDERS = Counter("rag_router_decisions_by_source_total",
+                          "Turns routed by rule, by exemplar or by the router LLM", ["source"])
+BACKEND_REJECTIONS = Counter("rag_backend_rejections_total",
+                             "Calls turned away by a backend's concurrency limit, or by the backend itself",
+                             ["backend", "reason"])
+
+
+def metrics_payload() -> bytes:
+    """Exposition text; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# ── Per-request context ──────────────────────────────────────────────
+# The trace collects (stage, seconds) for requests that asked for it; the
+# sampled flag decides once per request whether its DEBUG lines are written.
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("rag_trace", default=None)
+_debug_sampled: ContextVar[bool] = ContextVar("rag_debug_sampled", default=False)
+
+
+def start_request(traced: bool = False) -> Optional[List[Tuple[str, float]]]:
+    trace = [] if traced else None
+    _trace.set(trace)
+    _debug_sampled.set(traced or random.random() < DEBUG_LOG_SAMPLE_RATE)
+    return trace
+
+
+def current_trace() -> Optional[List[Tuple[str, float]]]:
+    return _trace.get()
+
+
+def server_timing(trace: List[Tuple[str, float]]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in trace)
+
+
+def debug_enabled(logger: logging.Logger) -> bool:
+    return logger.isEnabledFor(logging.DEBUG) and _debug_sampled.get()
+
+
+def log_debug(logger: logging.Logger, msg: str, *args: Any) -> None:
+    """DEBUG line written only for sampled (or traced) requests."""
+    if debug_enabled(logger):
+        logger.debug(msg, *args)
+
+
+# ── Recording helpers ────────────────────────────────────────────────
+def record(kind: str, stage: str, seconds: float, error: bool = False) -> None:
+    if METRICS_ENABLED:
+        STAGE_SECONDS.labels(kind, stage).observe(seconds)
+        if error:
+            STAGE_ERRORS.labels(kind, stage).inc()
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((f"{kind}-{stage}", seconds))
+
+
+@contextmanager
+def timer(kind: str, stage: str):
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(kind, stage, time.perf_counter() - start, error)
+
+
+async def measure(kind: str, stage: str, awaitable: Awaitable):
+    with timer(kind, stage):
+        return await awaitable
+
+
+def timed(kind: str, stage: Optional[str] = None):
+    """Decorator timing a sync or async function as (kind, stage or function name)."""
+    def decorator(fn):
+        name = stage or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(kind, name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_route(route: str) -> None:
+    if METRICS_ENABLED:
+        ROUTE_DECISIONS.labels(route).inc()
+
+
+def count_cache(cache: str, outcome: str, n: int = 1) -> None:
+    if METRICS_ENABLED and n:
+        CACHE_EVENTS.labels(cache, outcome).inc(n)
+
+
+def count_coalesced(endpoint: str) -> None:
+    if METRICS_ENABLED:
+        COALESCED_REQUESTS.labels(endpoint).inc()
+
+
+def count_web_search(event: str) -> None:
+    if METRICS_ENABLED:
+        WEB_SEARCH_EVENTS.labels(event).inc()
+
+
+def count_router(source: str) -> None:
+    if METRICS_ENABLED:
+        ROUTER_DECIDERS.labels(source).inc()
+
+
+def count_rejection(backend: str, reason: str) -> None:
+    if METRICS_ENABLED:
+        BACKEND_REJECTIONS.labels(backend, reason).inc()
+
+
+# ── LLM calls ────────────────────────────────────────────────────────
+class LLMUsageHandler(BaseCallbackHandler):
+    """Times every chat-model call and counts its tokens, labelled with the
+    graph node (or the `stage` metadata of chains run outside the graph)."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs):
+        metadata = metadata or {}
+        params = invocation_params or {}
+        stage = metadata.get("stage") or metadata.get("langgraph_node") or "other"
+        model = params.get("model") or params.get("model_name") or "unknown"
+        self._runs[run_id] = (stage, model, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage, model, start = self._runs.pop(run_id, ("other", "unknown", None))
+        if start is not None:
+            record("llm", stage, time.perf_counter() - start)
+        count_llm_tokens(stage, model, *_token_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        stage, _, start = self._runs.pop(run_id, ("other", "unknown", None))
+        if start is not None:
+            record("llm", stage, time.perf_counter() - start, error=True)
+
+
+def _token_usage(response) -> Tuple[int, int]:
+    for generations in response.generations or []:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+# Tokens of the calls made under track_llm_usage(), for the traffic capture
+_llm_usage: ContextVar[Optional[dict]] = ContextVar("rag_llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage():
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    previous = _llm_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _llm_usage.reset(previous)
+
+
+def count_llm_tokens(stage: str, model: str, prompt: int, completion: int) -> None:
+    usage = _llm_usage.get()
+    if usage is not None:
+        usage["prompt_tokens"] += prompt
+        usage["completion_tokens"] += completion
+    if not METRICS_ENABLED:
+        return
+    if prompt:
+        LLM_TOKENS.labels(stage, model, "prompt").inc(prompt)
+    if completion:
+        LLM_TOKENS.labels(stage, model, "completion").inc(completion)
+
+
+llm_usage_handler = LLMUsageHandler()
+
+
+def llm_config(stage: Optional[str] = None) -> dict:
+    """RunnableConfig that routes LLM calls through the usage handler."""
+    config = {"callbacks": [llm_usage_handler]}
+    if stage:
+        config["metadata"] = {"stage": stage}
+    return config
@@ -1,5 +1,6 @@
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 import uuid
+import hashlib
 from typing import List, Dict, Optional
 
 def get_or_create_session_id(session_id: Optional[str]) -> str:
@@ -18,4 +19,19 @@ def history_to_lc_messages(history: List[Dict]) -> List[BaseMessage]:
 
 def append_message(history: List[BaseMessage], message: BaseMessage) -> List[BaseMessage]:
     """Return a new list with the message appended."""
-    return history + [message] 
\ No newline at end of file
+    return history + [message]
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Llama-family tokenizers)."""
+    return len(text) // 4 + 1
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.config.settings import (
+    WEB_SEARCH_CACHE_ENABLED,
+    WEB_SEARCH_CACHE_MAX_ENTRIES,
+    WEB_SEARCH_CACHE_PATH,
+    WEB_SEARCH_CACHE_TTL_SECONDS,
+    WEB_SEARCH_HEDGE_MIN_SAMPLES,
+    WEB_SEARCH_HEDGE_PERCENTILE,
+    WEB_SEARCH_TIMEOUT_MS,
+)
+from app.utils.single_flight import normalize_question
+from app.utils.telemetry import count_cache, count_web_search
+
+T = TypeVar("T")
+
+
+# ── Persistent result cache ──────────────────────────────────────────
+class SearchCache:
+    """SQLite table of formatted search results keyed on the normalized query.
+
+    Entries expire after `ttl_seconds`; past `max_entries` the oldest ones are
+    dropped. The file is opened on first use.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS web_search "
+                         "(key TEXT PRIMARY KEY, query TEXT NOT NULL, results TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_web_search_created ON web_search(created)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def key(query: str) -> str:
+        return hashlib.sha256(normalize_question(query).encode("utf-8")).hexdigest()
+
+    def get(self, query: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT results FROM web_search WHERE key = ? AND created > ?",
+                                          (self.key(query), time.time() - self.ttl_seconds)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count_cache("web_search", "miss" if row is None else "hit")
+        return row[0] if row else None
+
+    def put(self, query: str, results: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO web_search (key, query, results, created) VALUES (?, ?, ?, ?)",
+                         (self.key(query), query, results, time.time()))
+            self._writes += 1
+            # Trim now and then rather than on every write
+            if self._writes % 100 == 0:
+                conn.execute("DELETE FROM web_search WHERE created <= ?", (time.time() - self.ttl_seconds,))
+                conn.execute("DELETE FROM web_search WHERE key NOT IN "
+                             "(SELECT key FROM web_search ORDER BY created DESC LIMIT ?)", (self.max_entries,))
+            conn.commit()
+
+    async def aget(self, query: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, query)
+
+    async def aput(self, query: str, results: str) -> None:
+        await asyncio.to_thread(self.put, query, results)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# ── Deadline and hedging ─────────────────────────────────────────────
+class HedgedCall:
+    """Runs a call under a hard deadline, hedging it once when it is slow.
+
+    When `hedge_percentile` is set and at least `min_samples` latencies were
+    seen, a second identical call starts once the first has run longer than
+    that percentile of recent latencies; the first to succeed wins and the
+    other is cancelled. Past the deadline the call returns None.
+    """
+
+    def __init__(self, timeout_seconds: float, hedge_percentile: float = 0, min_samples: int = 20,
+                 window: int = 200):
+        self.timeout_seconds = timeout_seconds
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.deadlines = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_percentile or len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    async def __call__(self, fn: Callable[[], Awaitable[T]]) -> Optional[T]:
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout_seconds
+        hedge_at = self.hedge_delay()
+        started = {asyncio.ensure_future(fn()): start}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while started:
+                now = loop.time()
+                if now >= deadline:
+                    self.deadlines += 1
+                    count_web_search("deadline")
+                    return None
+                wake = deadline
+                if hedge_at is not None and not hedged:
+                    wake = min(wake, start + hedge_at)
+                done, _ = await asyncio.wait(started, timeout=max(wake - now, 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task_start = started.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    self._latencies.append(loop.time() - task_start)
+                    if task_start != start:
+                        self.hedge_wins += 1
+                        count_web_search("hedge_won")
+                    return task.result()
+                if not done and hedge_at is not None and not hedged and loop.time() >= start + hedge_at:
+                    hedged = True
+                    self.hedges += 1
+                    count_web_search("hedge")
+                    started[asyncio.ensure_future(fn())] = loop.time()
+            raise error
+        finally:
+            for task in started:
+                task.cancel()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "calls": self.calls,
+            "deadline_exceeded": self.deadlines,
+            "deadline_rate": self.deadlines / self.calls if self.calls else 0.0,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_after_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
+
+
+search_cache = (SearchCache(WEB_SEARCH_CACHE_PATH, WEB_SEARCH_CACHE_TTL_SECONDS, WEB_SEARCH_CACHE_MAX_ENTRIES)
+                if WEB_SEARCH_CACHE_ENABLED else None)
+search_call = HedgedCall(WEB_SEARCH_TIMEOUT_MS / 1000, WEB_SEARCH_HEDGE_PERCENTILE, WEB_SEARCH_HEDGE_MIN_SAMPLES)
+
+
+def web_search_stats() -> dict:
+    return {
+        "cache": {"enabled": search_cache is not None, **(search_cache.stats() if search_cache else {})},
+        **search_call.stats(),
+    }
@@ -1,9 +1,75 @@
+import argparse
 import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.request
 from dotenv import load_dotenv
 import uvicorn
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+
+def start_chroma_server(path: str, port: int) -> subprocess.Popen:
+    """`chroma run` over the persist directory, shared by every worker; waits until it answers."""
+    os.makedirs(path, exist_ok=True)
+    server = subprocess.Popen([shutil.which("chroma") or "chroma", "run", "--path", path,
+                               "--host", "127.0.0.1", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Chroma server exited with code {server.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/v2/heartbeat", timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Chroma server did not start on port {port}")
+
+
+def serve(host: str, port: int, workers: int) -> None:
+    """Production mode: no reload, `workers` processes sharing the on-disk stores."""
+    os.environ["WORKERS"] = str(workers)
+    chroma_server = None
+    metrics_dir = None
+    if workers > 1:
+        if not os.getenv("CHROMA_SERVER_URL"):
+            chroma_port = int(os.getenv("CHROMA_SERVER_PORT", "8001"))
+            chroma_server = start_chroma_server(os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"), chroma_port)
+            os.environ["CHROMA_SERVER_URL"] = f"http://127.0.0.1:{chroma_port}"
+        if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            # /metrics then aggregates every worker (see telemetry.metrics_payload)
+            metrics_dir = tempfile.mkdtemp(prefix="rag_metrics_")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    # Tables and migrations run once here, not in every worker at the same time.
+    # Imported only now: settings are read from the environment set above.
+    from app.utils import db_utils
+    db_utils.init_db()
+    db_utils.close_pool()
+
+    try:
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers, timeout_graceful_shutdown=30)
+    finally:
+        if chroma_server is not None:
+            chroma_server.terminate()
+            chroma_server.wait(timeout=10)
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Without --workers, a single auto-reloading development server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="serve with this many worker processes, without reload")
+    args = parser.parse_args()
+
+    if args.workers:
+        serve(args.host, args.port, args.workers)
+    else:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
@@ -0,0 +1,156 @@
+"""
+Query latency and tenant isolation of one shared Chroma collection against
+one collection per tenant, as the corpus grows.
+
+For each corpus size the same synthetic support chunks (T tenants, the same
+issues and wording across tenants, tenant-specific model codes) are indexed
+twice into a throwaway Chroma + SQLite store: all of them in one shared
+collection, and each tenant's share in a collection of its own. Every query
+comes from one tenant and is answered by the hybrid retriever as:
+
+  shared            the shared collection, unfiltered (every tenant's chunks)
+  shared+file_ids   the shared collection filtered to the tenant's documents
+  shared+tags       the shared collection filtered to the tenant's tag
+  per-tenant        the tenant's own collection
+
+"leak" is the share of returned chunks that belong to another tenant. Uses
+the offline hashing embedder unless EMBEDDING_BACKEND is set.
+
+    python scripts/bench_collections.py --sizes 2000,8000 --tenants 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_collections_")
+os.chdir(WORKDIR)
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+os.environ["LOG_FILE"] = os.path.join(WORKDIR, "app.log")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.documents import Document
+
+from app.utils.chroma_utils import add_chunks, get_vectorstore
+from app.utils.hybrid_search import HybridRetriever
+
+PRODUCTS = ["bomba", "compresor", "inversor", "medidor", "transformador", "sensor", "válvula", "caldera"]
+ISSUES = [
+    ("sobrecalentamiento del motor", "deje enfriar el equipo y limpie el ventilador"),
+    ("pérdida de presión en la línea", "revise las juntas y apriete los conectores"),
+    ("fallo de comunicación con el servidor", "reinicie el módulo de red y verifique el cable"),
+    ("lectura de voltaje fuera de rango", "calibre el equipo con el patrón de referencia"),
+    ("batería de respaldo agotada", "reemplace la batería por una del mismo modelo"),
+    ("error de firmware al arrancar", "actualice el firmware desde el portal de soporte"),
+]
+FILES_PER_TENANT = 4
+
+
+def build_corpus(n: int, tenants: int, rng: random.Random):
+    """{tenant: [(file_id, Document)]}; file_ids are unique across tenants."""
+    corpus = {t: [] for t in range(tenants)}
+    for i in range(n):
+        tenant = i % tenants
+        file_id = tenant * FILES_PER_TENANT + rng.randrange(FILES_PER_TENANT) + 1
+        product, (issue, fix) = rng.choice(PRODUCTS), rng.choice(ISSUES)
+        model = f"T{tenant}-{rng.randint(100, 999)}"
+        text = (f"Manual del {product} modelo {model}. El aviso indica {issue}. "
+                f"Para resolverlo, {fix}. Si el problema persiste contacte a soporte técnico.")
+        corpus[tenant].append((file_id, Document(page_content=text),
+                               {"product": product, "issue": issue, "model": model}))
+    return corpus
+
+
+def index(corpus, n: int) -> dict:
+    """Index the corpus into `shared-<n>` and `t<tenant>-<n>`; returns chunk_id -> tenant."""
+    tenant_of = {}
+    for tenant, chunks in corpus.items():
+        for file_id in sorted({file_id for file_id, _, _ in chunks}):
+            docs = [Document(page_content=d.page_content) for f, d, _ in chunks if f == file_id]
+            for collection in (f"shared-{n}", f"t{tenant}-{n}"):
+                for chunk_id in add_chunks(docs, file_id=file_id, collection=collection, tags=[f"tenant{tenant}"]):
+                    tenant_of[chunk_id] = tenant
+    return tenant_of
+
+
+def build_queries(corpus, count: int, rng: random.Random):
+    queries = []
+    for _ in range(count):
+        tenant = rng.randrange(len(corpus))
+        _, _, label = rng.choice(corpus[tenant])
+        queries.append((tenant, f"Tengo {label['issue']} en el {label['product']}, ¿qué hago?"))
+    return queries
+
+
+async def evaluate(retrievers, filters, queries, tenant_of: dict) -> dict:
+    latency, leaked, returned = [], 0, 0
+    for tenant, query in queries:
+        start = time.perf_counter()
+        docs = await retrievers(tenant).ainvoke(query, filters=filters(tenant))
+        latency.append(time.perf_counter() - start)
+        returned += len(docs)
+        leaked += sum(tenant_of.get(d.id) != tenant for d in docs)
+    latency.sort()
+    return {
+        "mean": statistics.mean(latency) * 1000,
+        "p50": latency[len(latency) // 2] * 1000,
+        "p95": latency[max(0, int(len(latency) * 0.95) - 1)] * 1000,
+        "leak": leaked / returned if returned else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2000,8000", help="total chunks per run, comma-separated")
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.tenants} tenants x {FILES_PER_TENANT} files, {args.queries} queries per setup, k={args.k}\n")
+    print(f"{'chunks':>7} {'setup':<16} {'index s':>8} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'leak':>6}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        rng = random.Random(args.seed)
+        corpus = build_corpus(n, args.tenants, rng)
+        start = time.perf_counter()
+        tenant_of = index(corpus, n)
+        indexed = time.perf_counter() - start
+        queries = build_queries(corpus, args.queries, rng)
+
+        def retriever(collection):
+            # Fused ranking at a fixed k; reranking cost does not depend on the layout
+            return HybridRetriever(vectorstore=get_vectorstore(collection), collection=collection,
+                                   k=args.k, rerank=False)
+
+        shared = retriever(f"shared-{n}")
+        own = {t: retriever(f"t{t}-{n}") for t in corpus}
+        files = {t: sorted({f for f, _, _ in chunks}) for t, chunks in corpus.items()}
+        setups = {
+            "shared": (lambda t: shared, lambda t: None),
+            "shared+file_ids": (lambda t: shared, lambda t: {"file_ids": files[t]}),
+            "shared+tags": (lambda t: shared, lambda t: {"tags": [f"tenant{t}"]}),
+            "per-tenant": (lambda t: own[t], lambda t: None),
+        }
+        for i, (name, (retrievers, filters)) in enumerate(setups.items()):
+            r = asyncio.run(evaluate(retrievers, filters, queries, tenant_of))
+            # Indexing time covers both layouts
+            spent = f"{indexed:8.1f}" if i == 0 else f"{'':>8}"
+            print(f"{n:7d} {name:<16} {spent} {r['mean']:8.2f} {r['p50']:7.2f} {r['p95']:7.2f} {r['leak']:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Chat-history latency on the old vs. the pooled SQLite layer at growing table sizes.
+
+"before" replays the original access pattern: a new connection per call,
+rollback journal, no index on session_id. "after" is app.utils.db_utils:
+pooled WAL connections, the (session_id, created_at) index and group-committed
+async inserts. Both run against copies of the same synthetic table.
+
+    python scripts/bench_db_history.py --sizes 10000,100000,1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_db_history_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bootstrap.db")
+
+from app.utils import db_utils
+
+TURNS_PER_SESSION = 10
+LEGACY_SCHEMA = '''CREATE TABLE IF NOT EXISTS chat_history
+                   (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT,
+                    user_query TEXT,
+                    gpt_response TEXT,
+                    model TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'''
+
+
+# ── Original implementation ──────────────────────────────────────────
+def legacy_connection(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def legacy_insert(path, session_id, user_query, gpt_response, model):
+    conn = legacy_connection(path)
+    conn.execute('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
+                 (session_id, user_query, gpt_response, model))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get(path, session_id):
+    conn = legacy_connection(path)
+    rows = conn.execute('SELECT user_query, gpt_response FROM chat_history WHERE session_id = ? ORDER BY created_at',
+                        (session_id,)).fetchall()
+    conn.close()
+    return [m for row in rows for m in ({"role": "human", "content": row[0]}, {"role": "ai", "content": row[1]})]
+
+
+# ── Fixtures ─────────────────────────────────────────────────────────
+def build_table(path, rows: int) -> int:
+    sessions = max(1, rows // TURNS_PER_SESSION)
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+
+    def generate():
+        for i in range(rows):
+            yield (f"session-{i % sessions}", f"¿Pregunta número {i} sobre el producto?",
+                   f"Respuesta {i}: " + "texto de ejemplo " * 8, "llama-3.3-70b")
+
+    conn.executemany('INSERT INTO chat_history (session_id, user_query, gpt_response, model) VALUES (?, ?, ?, ?)',
+                     generate())
+    conn.commit()
+    conn.close()
+    return sessions
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    return statistics.mean(samples) * 1000, p95 * 1000
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def concurrent(fn, n):
+    start = time.perf_counter()
+    await asyncio.gather(*(fn(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def run_size(rows: int, args, rng: random.Random):
+    before_path = os.path.join(WORKDIR, f"before_{rows}.db")
+    after_path = os.path.join(WORKDIR, f"after_{rows}.db")
+
+    start = time.perf_counter()
+    sessions = build_table(before_path, rows)
+    shutil.copyfile(before_path, after_path)
+    fill = time.perf_counter() - start
+
+    db_utils.DB_NAME = after_path
+    start = time.perf_counter()
+    db_utils.create_chat_history()
+    migrate = time.perf_counter() - start
+
+    read_sessions = [f"session-{rng.randrange(sessions)}" for _ in range(args.reads)]
+    turn = ("session-new", "¿Otra pregunta?", "Otra respuesta.", "llama-3.3-70b")
+    results = {}
+
+    results["before"] = (
+        summarize(timed(lambda i: legacy_get(before_path, read_sessions[i]), args.reads)),
+        summarize(timed(lambda i: legacy_insert(before_path, *turn), args.writes)),
+        asyncio.run(concurrent(lambda i: asyncio.to_thread(legacy_insert, before_path, *turn), args.writes)),
+    )
+    results["after"] = (
+        summarize(timed(lambda i: db_utils.get_chat_history(read_sessions[i]), args.reads)),
+        summarize(timed(lambda i: db_utils.insert_chat_history(*turn), args.writes)),
+        asyncio.run(concurrent(lambda i: db_utils.ainsert_chat_history(*turn), args.writes)),
+    )
+    db_utils.close_pool()
+
+    print(f"\n{rows:,} rows ({sessions:,} sessions) — fill {fill:.1f}s, index build {migrate:.2f}s")
+    print(f"{'layer':<7} {'read mean':>10} {'read p95':>9} {'write mean':>11} {'write p95':>10} "
+          f"{f'{args.writes} concurrent writes':>24}")
+    for layer, ((r_mean, r_p95), (w_mean, w_p95), burst) in results.items():
+        print(f"{layer:<7} {r_mean:8.2f}ms {r_p95:7.2f}ms {w_mean:9.2f}ms {w_p95:8.2f}ms {burst * 1000:22.1f}ms")
+
+    for path in (before_path, after_path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated table sizes")
+    parser.add_argument("--reads", type=int, default=100)
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"workdir: {WORKDIR}, {TURNS_PER_SESSION} turns per session")
+    for size in (int(s) for s in args.sizes.split(",")):
+        run_size(size, args, rng)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Offline end-to-end benchmark of the FastAPI app.
+
+Runs with LLM_BACKEND, SEARCH_BACKEND and EMBEDDING_BACKEND set to 'fake'
+(app/utils/offline.py), so Cerebras, Tavily and Gemini are replaced by
+in-process stand-ins with configurable latency while everything else (the
+graph, retrieval, SQLite, Chroma, ingestion, caches) is the real code.
+
+1. A synthetic .docx corpus is uploaded through POST /upload-doc and
+   indexed (documents/s and chunks/s are reported).
+2. A conversation workload (follow-up questions, some greetings) is replayed
+   against POST /chat and/or POST /chat/stream at each concurrency level,
+   over HTTP to the app served by uvicorn on a loopback port.
+
+The JSON report holds p50/p95/p99 latency, requests/s, errors, time to first
+token for streams and a per-stage breakdown taken from the Prometheus stage
+histograms. Diff two reports to compare versions:
+
+    python scripts/bench_e2e.py --concurrency 1,4,16,32 --output bench_e2e.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+TOPICS = ["filtro", "bomba", "compresor", "válvula", "sensor", "controlador", "caldera", "ventilador",
+          "motor", "batería", "inversor", "termostato"]
+ACTIONS = ["mantenimiento", "calibración", "instalación", "reemplazo", "diagnóstico", "limpieza"]
+FOLLOW_UPS = ["¿Y cada cuánto hay que hacerlo?", "¿Qué herramientas necesito?",
+              "¿Qué pasa si el error persiste?", "¿Puedes resumirlo en pasos?"]
+GREETINGS = ["Hola", "Gracias", "Buenos días"]
+
+
+def configure_env(args, workdir: str) -> None:
+    """Select the offline backends; must run before anything under app/ is imported."""
+    for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+        os.environ.setdefault(key, "offline")
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "SEARCH_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_SEARCH_LATENCY_MS": str(args.search_latency_ms),
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "WEB_SEARCH_CACHE_ENABLED": "false",
+        "RAG_DB_PATH": os.path.join(workdir, "bench.db"),
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma_db"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+    })
+
+
+# ── Synthetic corpus and workload ───────────────────────────────────
+def make_docx(paragraphs) -> bytes:
+    """Minimal .docx (just word/document.xml) that docx2txt can read."""
+    buffer = io.BytesIO()
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types xmlns='
+                   '"http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        z.writestr("word/document.xml", '<?xml version="1.0"?><w:document xmlns:w='
+                   '"http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                   f"<w:body>{body}</w:body></w:document>")
+    return buffer.getvalue()
+
+
+def build_corpus(n_docs: int, paragraphs: int, rng: random.Random):
+    docs = []
+    for d in range(n_docs):
+        topic = TOPICS[d % len(TOPICS)]
+        paras = []
+        for p in range(paragraphs):
+            action = rng.choice(ACTIONS)
+            paras.append(f"Manual {d}, sección {p}: la {action} del {topic} modelo M{d}-{p} requiere "
+                         f"revisar la presión a {rng.randint(2, 9)} bar cada {rng.randint(1, 12)} meses, "
+                         f"apagar el equipo y verificar el cableado del {rng.choice(TOPICS)}. " * 3)
+        docs.append((f"manual_{d:03d}.docx", make_docx(paras)))
+    return docs
+
+
+def build_conversations(n: int, turns: int, greeting_rate: float, rng: random.Random):
+    conversations = []
+    for _ in range(n):
+        topic, action = rng.choice(TOPICS), rng.choice(ACTIONS)
+        questions = [f"¿Cómo se hace la {action} del {topic}?"]
+        for _ in range(turns - 1):
+            questions.append(rng.choice(GREETINGS) if rng.random() < greeting_rate else rng.choice(FOLLOW_UPS))
+        conversations.append(questions)
+    return conversations
+
+
+# ── Measurement helpers ─────────────────────────────────────────────
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(seconds) -> dict:
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def stage_totals() -> dict:
+    """(kind.stage) -> [seconds, count] from the stage-duration histogram."""
+    from app.utils.telemetry import STAGE_SECONDS
+
+    totals = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            key = f"{sample.labels['kind']}.{sample.labels['stage']}"
+            if sample.name.endswith("_sum"):
+                totals.setdefault(key, [0.0, 0])[0] = sample.value
+            elif sample.name.endswith("_count"):
+                totals.setdefault(key, [0.0, 0])[1] = int(sample.value)
+    return totals
+
+
+def stage_breakdown(before: dict, after: dict, requests: int) -> dict:
+    breakdown = {}
+    for key, (seconds, count) in sorted(after.items()):
+        prev_seconds, prev_count = before.get(key, (0.0, 0))
+        calls = count - prev_count
+        if calls <= 0:
+            continue
+        total = seconds - prev_seconds
+        breakdown[key] = {
+            "calls_per_request": round(calls / requests, 3),
+            "mean_ms": round(total / calls * 1000, 3),
+            "ms_per_request": round(total / requests * 1000, 3),
+        }
+    return breakdown
+
+
+# ── Phases ───────────────────────────────────────────────────────────
+async def ingest(client, docs) -> dict:
+    start = time.perf_counter()
+    response = await client.post("/upload-doc", files=[("files", (name, data)) for name, data in docs])
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed", "partial"):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    chunks = sum(f.get("chunks_total") or 0 for f in job["files"])
+    return {
+        "status": job["status"],
+        "documents": len(docs),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "documents_per_second": round(len(docs) / elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 1),
+    }
+
+
+async def send(client, endpoint: str, question: str, session_id: str, sample: dict) -> str:
+    payload = {"question": question, "session_id": session_id}
+    start = time.perf_counter()
+    if endpoint == "chat":
+        response = await client.post("/chat", json=payload)
+        response.raise_for_status()
+        sample["latency"] = time.perf_counter() - start
+        return response.json()["answer"]
+
+    first_token, done = None, False
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            elif line.startswith("data:"):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event == "error":
+                    raise RuntimeError(line)
+                elif event == "done":
+                    done = True
+    if not done:
+        raise RuntimeError("stream ended without a done event")
+    sample["latency"] = time.perf_counter() - start
+    sample["first_token"] = first_token if first_token is not None else sample["latency"]
+    return ""
+
+
+async def run_level(client, endpoint: str, concurrency: int, conversations, label: str) -> dict:
+    from app.utils import memory
+
+    queue = asyncio.Queue()
+    for i, questions in enumerate(conversations):
+        queue.put_nowait((f"{label}-{i}", questions))
+    samples, errors = [], []
+
+    async def user():
+        while not queue.empty():
+            session_id, questions = queue.get_nowait()
+            for question in questions:
+                sample = {}
+                try:
+                    await send(client, endpoint, question, session_id, sample)
+                    samples.append(sample)
+                except Exception as e:
+                    errors.append(repr(e))
+
+    before = stage_totals()
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await memory.wait_for_compactions()
+    requests = len(samples) + len(errors)
+
+    result = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(samples) / elapsed, 2),
+        "latency_ms": summarize([s["latency"] for s in samples]),
+        "stages": stage_breakdown(before, stage_totals(), max(requests, 1)),
+    }
+    if endpoint == "stream":
+        result["first_token_ms"] = summarize([s["first_token"] for s in samples])
+    if errors:
+        result["error_samples"] = sorted(set(errors))[:5]
+    return result
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(args) -> dict:
+    import httpx
+    import uvicorn
+    from app.main import app
+
+    # A real server on loopback rather than httpx's ASGI transport, which
+    # buffers whole responses and would hide time to first token.
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False, lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    rng = random.Random(args.seed)
+    report = {"ingest": None, "levels": []}
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            report["ingest"] = await ingest(client, build_corpus(args.docs, args.paragraphs, rng))
+            print(f"ingest: {report['ingest']['documents']} docs, {report['ingest']['chunks']} chunks in "
+                  f"{report['ingest']['seconds']:.2f}s ({report['ingest']['status']})\n")
+            print(f"{'endpoint':<8} {'conc':>5} {'reqs':>5} {'err':>4} {'req/s':>8} {'p50':>8} {'p95':>8} "
+                  f"{'p99':>8} {'ttft p50':>9}")
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    n_conversations = max(concurrency, args.requests // args.turns)
+                    conversations = build_conversations(n_conversations, args.turns, args.greeting_rate, rng)
+                    level = await run_level(client, endpoint, concurrency, conversations, f"{endpoint}-c{concurrency}")
+                    report["levels"].append(level)
+                    lat = level["latency_ms"]
+                    ttft = level.get("first_token_ms", {}).get("p50")
+                    print(f"{endpoint:<8} {concurrency:5d} {level['requests']:5d} {level['errors']:4d} "
+                          f"{level['requests_per_second']:8.1f} {lat.get('p50', 0):8.1f} {lat.get('p95', 0):8.1f} "
+                          f"{lat.get('p99', 0):8.1f} {ttft if ttft is not None else '-':>9}")
+    finally:
+        server.should_exit = True
+        await serving
+    return report
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--endpoints", default="chat,stream", help="comma-separated: chat, stream")
+    parser.add_argument("--requests", type=int, default=200, help="approximate requests per level")
+    parser.add_argument("--turns", type=int, default=4, help="questions per conversation")
+    parser.add_argument("--greeting-rate", type=float, default=0.1)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=30, help="paragraphs per document")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--token-latency-ms", type=float, default=5)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--search-latency-ms", type=float, default=800)
+    parser.add_argument("--semantic-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_e2e.json")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.endpoints = [e.strip() for e in args.endpoints.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    configure_env(args, workdir)
+    started = datetime.now(timezone.utc)
+    results = asyncio.run(run(args))
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    report = {
+        "version": git_version(),
+        "created_at": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config,
+        **results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"\nreport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
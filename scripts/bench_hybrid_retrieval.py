@@ -0,0 +1,120 @@
+"""
+Offline retrieval-quality and latency benchmark: dense-only vs BM25-only vs hybrid (RRF).
+
+Indexes a synthetic Spanish support corpus full of product and error codes into
+a throwaway Chroma + SQLite store, then runs labelled queries of two kinds:
+exact-code lookups ("error E4821") and descriptive questions. Uses the offline
+hashing embedder unless EMBEDDING_BACKEND is set.
+
+    python scripts/bench_hybrid_retrieval.py --chunks 400 --queries 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_hybrid_")
+os.chdir(WORKDIR)
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.documents import Document
+
+from app.utils.chroma_utils import add_chunks, vectorstore
+from app.utils.hybrid_search import HybridRetriever
+
+PRODUCTS = ["bomba", "compresor", "inversor", "medidor", "transformador", "router", "sensor", "válvula"]
+ISSUES = [
+    ("sobrecalentamiento del motor", "deje enfriar el equipo y limpie el ventilador"),
+    ("pérdida de presión en la línea", "revise las juntas y apriete los conectores"),
+    ("fallo de comunicación con el servidor", "reinicie el módulo de red y verifique el cable"),
+    ("lectura de voltaje fuera de rango", "calibre el equipo con el patrón de referencia"),
+    ("batería de respaldo agotada", "reemplace la batería por una del mismo modelo"),
+    ("error de firmware al arrancar", "actualice el firmware desde el portal de soporte"),
+]
+
+
+def build_corpus(n: int, rng: random.Random):
+    chunks, labels = [], []
+    for i in range(n):
+        product = rng.choice(PRODUCTS)
+        model = f"TX-{rng.randint(100, 999)}"
+        code = f"E{1000 + i}"
+        issue, fix = rng.choice(ISSUES)
+        text = (f"Manual del {product} modelo {model}. El código de error {code} indica {issue}. "
+                f"Para resolverlo, {fix}. Si el problema persiste contacte a soporte técnico.")
+        chunks.append(Document(page_content=text))
+        labels.append({"product": product, "model": model, "code": code, "issue": issue})
+    return chunks, labels
+
+
+def build_queries(labels, n: int, rng: random.Random):
+    queries = []
+    for _ in range(n):
+        target = rng.randrange(len(labels))
+        label = labels[target]
+        if rng.random() < 0.5:
+            queries.append(("code", f"¿Qué significa el código {label['code']}?", target))
+        else:
+            queries.append(("descriptive",
+                            f"Tengo {label['issue']} en el {label['product']} {label['model']}, ¿qué hago?", target))
+    return queries
+
+
+async def evaluate(retriever, queries, target_ids, k: int):
+    results = {}
+    for kind, query, target in queries:
+        start = time.perf_counter()
+        docs = await retriever.ainvoke(query)
+        elapsed = time.perf_counter() - start
+        ids = [d.id for d in docs[:k]]
+        rank = ids.index(target_ids[target]) + 1 if target_ids[target] in ids else None
+        bucket = results.setdefault(kind, {"hits": 0, "rr": 0.0, "n": 0, "latency": []})
+        bucket["n"] += 1
+        bucket["hits"] += rank is not None
+        bucket["rr"] += 1 / rank if rank else 0.0
+        bucket["latency"].append(elapsed)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--lexical-weight", type=float, default=1.0, help="RRF weight of the BM25 ranking in hybrid mode")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chunks, labels = build_corpus(args.chunks, rng)
+    target_ids = add_chunks(chunks, file_id=1)
+    queries = build_queries(labels, args.queries, rng)
+    print(f"corpus: {len(chunks)} chunks in {WORKDIR}, queries: {len(queries)}, k={args.k}\n")
+
+    print(f"{'mode':<8} {'query type':<12} {'hit@k':>6} {'MRR':>6} {'mean ms':>8} {'p95 ms':>8}")
+    for mode in ("dense", "lexical", "hybrid"):
+        # Fused ranking at a fixed k; reranking has its own benchmark (bench_rerank.py)
+        retriever = HybridRetriever(vectorstore=vectorstore.get(), mode=mode, k=args.k,
+                                    weight_lexical=args.lexical_weight, rerank=False)
+        results = asyncio.run(evaluate(retriever, queries, target_ids, args.k))
+        for kind, r in sorted(results.items()):
+            latency = sorted(r["latency"])
+            p95 = latency[max(0, int(len(latency) * 0.95) - 1)]
+            print(f"{mode:<8} {kind:<12} {r['hits'] / r['n']:6.2f} {r['rr'] / r['n']:6.2f} "
+                  f"{statistics.mean(latency) * 1000:8.2f} {p95 * 1000:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
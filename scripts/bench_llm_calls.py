@@ -0,0 +1,111 @@
+"""
+Count LLM round trips per /chat request over a scripted multi-turn conversation.
+
+Compares the separate contextualise_chain (ROUTER_REWRITES_QUESTION=false) with
+the router producing the standalone question itself. All LLMs and the KB tool
+are counting stubs, so no API keys or network are needed.
+
+    python scripts/bench_llm_calls.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+WORKDIR = tempfile.mkdtemp(prefix="bench_llm_calls_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench_llm_calls.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from app.main import app
+from app.agent import nodes
+from app.agent.shared import RouteDecision
+from app.routers import chat
+
+CONVERSATION = [
+    "Hola",
+    "¿Cómo restablezco la contraseña del portal?",
+    "¿Y si no me llega el correo?",
+    "¿Cuánto tarda en llegar normalmente?",
+    "Gracias",
+    "Otra cosa, ¿cuál es el horario de atención?",
+    "¿Y los fines de semana?",
+]
+
+calls = Counter()
+
+
+def install_stubs() -> None:
+    async def contextualise(inputs):
+        calls["contextualise"] += 1
+        return inputs["input"]
+
+    async def route(messages):
+        calls["router"] += 1
+        question = next(m.content for m in reversed(messages) if isinstance(m, HumanMessage))
+        if question.lower().startswith(("hola", "gracias")):
+            return RouteDecision(route="end", reply="¡Con gusto!", standalone_question=question)
+        return RouteDecision(route="rag", standalone_question=question)
+
+    async def answer(_messages):
+        calls["answer"] += 1
+        return AIMessage(content="Respuesta de prueba.")
+
+    @tool
+    async def rag_search_tool(query: str) -> str:
+        """Stubbed KB lookup"""
+        return f"Chunk about {query}"
+
+    chat.contextualise_chain = RunnableLambda(contextualise)
+    nodes.router_llm = RunnableLambda(route)
+    nodes.answer_llm = RunnableLambda(answer)
+    nodes.rag_search_tool = rag_search_tool
+
+
+async def run_conversation(session_id: str) -> list[Counter]:
+    per_turn = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for question in CONVERSATION:
+            before = calls.copy()
+            res = await client.post("/chat", json={"question": question, "session_id": session_id})
+            res.raise_for_status()
+            per_turn.append(calls - before)
+    return per_turn
+
+
+def main() -> None:
+    install_stubs()
+
+    for label, router_rewrites in (("separate contextualiser", False), ("router rewrites question", True)):
+        chat.ROUTER_REWRITES_QUESTION = router_rewrites
+        per_turn = asyncio.run(run_conversation(f"bench-{int(router_rewrites)}"))
+
+        print(f"\n{label}")
+        print(f"  {'turn':<4} {'contextualise':>13} {'router':>7} {'answer':>7} {'before retrieval':>17}")
+        for i, c in enumerate(per_turn, 1):
+            print(f"  {i:<4} {c['contextualise']:>13} {c['router']:>7} {c['answer']:>7} "
+                  f"{c['contextualise'] + c['router']:>17}")
+        total = sum(per_turn, Counter())
+        print(f"  total LLM calls: {sum(total.values())} over {len(per_turn)} turns "
+              f"({sum(total.values()) / len(per_turn):.2f} per request)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Prompt size and latency per turn over a long scripted session: full history vs.
+the bounded memory (rolling summary + recent turns).
+
+The router, answer and summary LLMs are stubs whose latency grows with the
+prompt (a fixed overhead plus a per-token prefill cost), so the numbers show
+how history length drives cost. Token counts use the same estimate as
+app.utils.memory.
+
+    python scripts/bench_memory.py --turns 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+WORKDIR = tempfile.mkdtemp(prefix="bench_memory_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from app.agent import nodes
+from app.agent.shared import RouteDecision
+from app.models.pydantic_models import QueryInput
+from app.routers import chat
+from app.utils import langchain_utils, memory
+from app.utils.memory import estimate_tokens
+from app.utils.session_cache import session_cache
+
+ANSWER = ("Según la documentación, el equipo debe revisarse cada seis meses y el filtro se cambia "
+          "cuando la presión supera los 4 bar. Si el error persiste, reinicie el controlador y "
+          "verifique el cableado del sensor antes de contactar a soporte técnico.")
+
+usage = {"prompt_tokens": 0, "summary_tokens": 0, "summary_calls": 0}
+
+
+def install_stubs(overhead: float, per_token: float) -> None:
+    async def llm_call(messages):
+        tokens = sum(estimate_tokens(m.content) for m in messages)
+        usage["prompt_tokens"] += tokens
+        await asyncio.sleep(overhead + tokens * per_token)
+
+    async def route(messages):
+        await llm_call(messages)
+        return RouteDecision(route="rag")
+
+    async def answer(messages):
+        await llm_call(messages)
+        return AIMessage(content=ANSWER)
+
+    async def summarize(inputs):
+        tokens = estimate_tokens(inputs["summary"]) + estimate_tokens(inputs["new_lines"])
+        usage["summary_tokens"] += tokens
+        usage["summary_calls"] += 1
+        await asyncio.sleep(overhead + tokens * per_token)
+        words = (inputs["summary"] + " " + inputs["new_lines"]).split()
+        return " ".join(words[-inputs["max_words"]:])
+
+    @tool
+    async def rag_search_tool(query: str) -> str:
+        """Stubbed KB lookup"""
+        return f"Chunk about {query}"
+
+    nodes.router_llm = RunnableLambda(route)
+    nodes.answer_llm = RunnableLambda(answer)
+    nodes.rag_search_tool = rag_search_tool
+    langchain_utils.summary_chain = RunnableLambda(summarize)
+
+
+async def run_session(session_id: str, turns: int):
+    samples = []
+    for turn in range(1, turns + 1):
+        usage["prompt_tokens"] = 0
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await chat.chat(QueryInput(question=f"Pregunta {turn}: ¿cada cuánto reviso el filtro del equipo?",
+                                       session_id=session_id))
+        samples.append((turn, usage["prompt_tokens"], time.perf_counter() - start))
+        # Summaries are updated in the background; settle them so runs are reproducible.
+        await memory.wait_for_compactions()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--overhead", type=float, default=0.01, help="fixed seconds per LLM call")
+    parser.add_argument("--per-token-ms", type=float, default=0.02, help="prefill milliseconds per prompt token")
+    args = parser.parse_args()
+
+    install_stubs(args.overhead, args.per_token_ms / 1000)
+    checkpoints = sorted({1, 10, 25, 50, 100, 150, args.turns} & set(range(1, args.turns + 1)))
+
+    results = {}
+    for mode, enabled in (("full", False), ("bounded", True)):
+        memory.MEMORY_ENABLED = enabled
+        session_cache.max_turns = memory.MEMORY_MAX_TURNS if enabled else None
+        session_cache.clear()
+        usage.update(summary_tokens=0, summary_calls=0)
+        results[mode] = asyncio.run(run_session(f"bench-{mode}", args.turns))
+        results[mode + "_summary"] = dict(usage)
+
+    print(f"{args.turns}-turn session; prompt tokens = router + answer prompts per turn\n")
+    print(f"{'turn':>5} {'full tokens':>12} {'full ms':>9} {'bounded tokens':>15} {'bounded ms':>11}")
+    for turn in checkpoints:
+        _, full_tokens, full_s = results["full"][turn - 1]
+        _, bounded_tokens, bounded_s = results["bounded"][turn - 1]
+        print(f"{turn:5d} {full_tokens:12d} {full_s * 1000:9.1f} {bounded_tokens:15d} {bounded_s * 1000:11.1f}")
+
+    print()
+    for mode in ("full", "bounded"):
+        samples = results[mode]
+        total = sum(t for _, t, _ in samples)
+        last = [s for _, _, s in samples[-20:]]
+        print(f"{mode:<8} total prompt tokens {total:>10,}  mean latency last 20 turns {statistics.mean(last) * 1000:7.1f} ms")
+    s = results["bounded_summary"]
+    print(f"summaries: {s['summary_calls']} background calls, {s['summary_tokens']:,} tokens in total")
+
+
+if __name__ == "__main__":
+    main()
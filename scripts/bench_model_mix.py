@@ -0,0 +1,118 @@
+"""
+End-to-end latency of per-stage model choices on the offline backends.
+
+Compares the current setup (llama-3.3-70b for every stage) with a small
+model for routing and contextualisation plus the large model for the answer,
+selected per request through QueryInput.stage_models. The fake LLM gets
+per-model latencies (time to first token and per generated token) from
+--large-latency / --small-latency; retrieval, SQLite and the graph are real.
+
+    python scripts/bench_model_mix.py --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from bench_e2e import (build_conversations, build_corpus, configure_env, ingest, stage_breakdown,
+                       stage_totals, summarize)
+
+LARGE = "llama-3.3-70b"
+SMALL = "llama3.1-8b"
+
+SETUPS = {
+    "all-70b": {},
+    "small-router": {"router": SMALL, "contextualise": SMALL},
+}
+
+
+async def run_setup(client, stage_models: dict, conversations, concurrency: int, label: str) -> dict:
+    from app.utils import memory
+
+    queue = asyncio.Queue()
+    for i, questions in enumerate(conversations):
+        queue.put_nowait((f"{label}-{i}", questions))
+    latencies, errors = [], 0
+
+    async def user():
+        nonlocal errors
+        while not queue.empty():
+            session_id, questions = queue.get_nowait()
+            for question in questions:
+                start = time.perf_counter()
+                response = await client.post("/chat", json={"question": question, "session_id": session_id,
+                                                            "stage_models": stage_models})
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+    before = stage_totals()
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await memory.wait_for_compactions()
+    stages = stage_breakdown(before, stage_totals(), max(len(latencies), 1))
+    return {
+        "latency": summarize(latencies),
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+        "llm": {k.split(".", 1)[1]: v["ms_per_request"] for k, v in stages.items() if k.startswith("llm.")},
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.main import app, lifespan
+
+    rng = random.Random(args.seed)
+    results = {}
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await ingest(client, build_corpus(args.docs, 20, rng))
+            conversations = build_conversations(max(args.concurrency, args.requests // args.turns), args.turns,
+                                                0.1, rng)
+            for name, stage_models in SETUPS.items():
+                results[name] = await run_setup(client, stage_models, conversations, args.concurrency, name)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=4, help="questions per conversation")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--large-latency", default="250/2.2",
+                        help="first_token_ms/per_token_ms of the large model")
+    parser.add_argument("--small-latency", default="80/0.5",
+                        help="first_token_ms/per_token_ms of the small model")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Defaults bench_e2e.configure_env expects; LLM latencies come from the per-model spec
+    args.llm_latency_ms, args.token_latency_ms = (float(v) for v in args.large_latency.split("/"))
+    args.embedding_latency_ms, args.search_latency_ms, args.semantic_cache = 30, 600, False
+    configure_env(args, tempfile.mkdtemp(prefix="bench_model_mix_"))
+    os.environ["FAKE_LLM_MODEL_LATENCY_MS"] = f"{LARGE}={args.large_latency},{SMALL}={args.small_latency}"
+
+    results = asyncio.run(run(args))
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}; large {LARGE} {args.large_latency} ms, "
+          f"small {SMALL} {args.small_latency} ms (first token / per token)\n")
+    print(f"{'setup':<13} {'p50':>8} {'p95':>8} {'mean':>8} {'req/s':>7} {'err':>4}   LLM ms per request")
+    for name, r in results.items():
+        lat = r["latency"]
+        llm = ", ".join(f"{stage} {ms:.0f}" for stage, ms in sorted(r["llm"].items()))
+        print(f"{name:<13} {lat['p50']:8.1f} {lat['p95']:8.1f} {lat['mean']:8.1f} {r['rps']:7.1f} "
+              f"{r['errors']:4d}   {llm}")
+    base, mix = results["all-70b"]["latency"]["mean"], results["small-router"]["latency"]["mean"]
+    print(f"\nsmall router + large answer: mean latency {(1 - mix / base):.0%} lower")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Parsing throughput (pages/sec, MB/sec) and peak RSS of the document parser on
+synthetic large documents: a 500-page PDF manual, a DOCX with headings and
+page breaks, a form-feed paginated text file, a Markdown manual and a CSV.
+
+Every measurement runs in a fresh process. Modes:
+
+  baseline  the previous loaders (PyPDFLoader / Docx2txtLoader + one
+            RecursiveCharacterTextSplitter); PDF and DOCX only
+  stream    app.utils.loaders.parse_document in one process
+  parallel  the same with PDF page ranges spread over a spawned process pool
+            of --processes workers, as the ingestion pipeline runs it
+
+Peak RSS is reported for the parent and for the largest worker.
+
+    python scripts/bench_parsing.py --pages 500 --processes 2
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+WORDS = ("filtro bomba presion sensor valvula caudal motor tension alarma limpieza revision cambio "
+         "temperatura circuito manual equipo ajuste modulo panel control servicio").split()
+
+
+# ── Synthetic documents ──────────────────────────────────────────────
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+
+
+def manual(pages: int, rng: random.Random):
+    """[(heading_level, text)] per page; numbered chapters every 10 pages, sections every 2."""
+    out = []
+    for page in range(pages):
+        blocks = []
+        if page % 10 == 0:
+            blocks.append((1, f"{page // 10 + 1} Capitulo {page // 10 + 1}"))
+        if page % 2 == 0:
+            blocks.append((2, f"{page // 10 + 1}.{page % 10 // 2 + 1} Seccion {page}"))
+        blocks.extend((0, " ".join(sentence(rng) for _ in range(4))) for _ in range(5))
+        out.append(blocks)
+    return out
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90):
+    line = ""
+    for word in text.split():
+        if len(line) + len(word) + 1 > width:
+            yield line
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        yield line
+
+
+def make_pdf(pages) -> bytes:
+    """Text-only PDF, one content stream per page, blank lines between paragraphs."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for blocks in pages:
+        lines = []
+        for level, text in blocks:
+            lines.extend(["", text] if level else [""] + list(_wrap(text)))
+        ops = "".join(f"({_pdf_escape(line)}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {ops}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       b"/Contents %d 0 R >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(pages) -> bytes:
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    styles = "".join(f'<w:style w:type="paragraph" w:styleId="Heading{i}"><w:name w:val="heading {i}"/></w:style>'
+                     for i in (1, 2))
+    body = []
+    for number, blocks in enumerate(pages):
+        for i, (level, text) in enumerate(blocks):
+            ppr = f'<w:pPr><w:pStyle w:val="Heading{level}"/></w:pPr>' if level else ""
+            brk = '<w:r><w:br w:type="page"/></w:r>' if number and i == 0 else ""
+            body.append(f"<w:p>{ppr}{brk}<w:r><w:t>{text}</w:t></w:r></w:p>")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types xmlns='
+                   '"http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        z.writestr("word/styles.xml", f'<?xml version="1.0"?><w:styles {w}>{styles}</w:styles>')
+        z.writestr("word/document.xml", f'<?xml version="1.0"?><w:document {w}><w:body>{"".join(body)}'
+                   "</w:body></w:document>")
+    return buffer.getvalue()
+
+
+def make_txt(pages) -> str:
+    return "\f".join("\n\n".join("\n".join(_wrap(text)) for _, text in blocks) for blocks in pages)
+
+
+def make_markdown(pages) -> str:
+    return "\n\n".join("\n\n".join(("#" * level + " " + text) if level else text for level, text in blocks)
+                       for blocks in pages)
+
+
+def make_csv(rows: int, rng: random.Random) -> str:
+    lines = ["codigo,pieza,descripcion,precio,stock"]
+    lines.extend(f"P{i:06d},{rng.choice(WORDS)},{sentence(rng)},{rng.randint(1, 999)},{rng.randint(0, 99)}"
+                 for i in range(rows))
+    return "\n".join(lines)
+
+
+def build_documents(workdir: str, pages: int, csv_rows: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    content = manual(pages, rng)
+    files = {
+        "manual.pdf": make_pdf(content),
+        "manual.docx": make_docx(content),
+        "manual.txt": make_txt(content).encode(),
+        "manual.md": make_markdown(content).encode(),
+        "parts.csv": make_csv(csv_rows, rng).encode(),
+    }
+    paths = {}
+    for name, data in files.items():
+        paths[name] = os.path.join(workdir, name)
+        with open(paths[name], "wb") as f:
+            f.write(data)
+    return paths
+
+
+# ── Child process: one measurement ───────────────────────────────────
+def child(mode: str, path: str, processes: int) -> None:
+    sys.path.insert(0, str(ROOT))
+    if mode == "baseline":
+        from langchain_community.document_loaders import Docx2txtLoader, PyPDFLoader
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        start = time.perf_counter()
+        loader = PyPDFLoader(path) if path.endswith(".pdf") else Docx2txtLoader(path)
+        documents = loader.load()
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, length_function=len)
+        pages, chunks = len(documents), splitter.split_documents(documents)
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        from app.utils.loaders import parse_document
+
+        start = time.perf_counter()
+        if mode == "stream":
+            pages, chunks = parse_document(path)
+        else:
+            # Includes spawning the workers, as the first file after startup pays it
+            with ProcessPoolExecutor(max_workers=processes,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                pages, chunks = parse_document(path, pool.submit)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": seconds,
+        "pages": pages,
+        "chunks": len(chunks),
+        "with_section": sum(1 for c in chunks if c.metadata.get("section")),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+
+def measure(mode: str, path: str, processes: int, workdir: str) -> dict:
+    env = dict(os.environ, LOG_FILE=os.path.join(workdir, "app.log"), PYTHONWARNINGS="ignore")
+    out = subprocess.run([sys.executable, __file__, "--child", mode, path, "--processes", str(processes)],
+                         cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--csv-rows", type=int, default=50000)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.processes)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_parsing_")
+    paths = build_documents(workdir, args.pages, args.csv_rows, args.seed)
+    print(f"{args.pages}-page documents, {args.csv_rows} CSV rows, {args.processes} parse processes "
+          f"({os.cpu_count()} CPUs)\n")
+    print(f"{'file':<12} {'mode':<9} {'MB':>6} {'pages':>6} {'chunks':>7} {'w/ sect':>8} {'pages/s':>8} "
+          f"{'MB/s':>6} {'RSS MB':>7} {'worker RSS':>10}")
+    for name, path in paths.items():
+        size_mb = os.path.getsize(path) / 1e6
+        modes = (["baseline"] if name.endswith((".pdf", ".docx")) else []) + ["stream"]
+        if name.endswith(".pdf"):
+            modes.append("parallel")
+        for mode in modes:
+            r = measure(mode, path, args.processes, workdir)
+            worker = f"{r['worker_rss_mb']:10.0f}" if mode == "parallel" else f"{'-':>10}"
+            # Markdown and CSV have no pages
+            rate = f"{r['pages'] / r['seconds']:8.1f}" if name.endswith((".pdf", ".docx", ".txt")) else f"{'-':>8}"
+            print(f"{name:<12} {mode:<9} {size_mb:6.1f} {r['pages']:6d} {r['chunks']:7d} {r['with_section']:8d} "
+                  f"{rate} {size_mb / r['seconds']:6.2f} {r['rss_mb']:7.0f} {worker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Answer-prompt size and routing accuracy of the reranking stage on an offline
+labelled query set.
+
+Indexes a synthetic Spanish equipment-manual corpus (one file per topic, with
+some near-duplicate paragraphs) into a throwaway Chroma + SQLite store, then
+runs two kinds of labelled queries through the retriever and the rag_lookup
+routing rule:
+
+  in-KB   about one topic; should be answered from the KB, from that file
+  off-KB  about something the KB does not cover (sports, cooking, ...); should
+          go to the web
+
+Setups: the previous behaviour (top-3 fused chunks, web only when nothing is
+found), reranking without MMR, and reranking with MMR + adaptive k. Uses the
+offline hashing embedder unless EMBEDDING_BACKEND is set.
+
+    python scripts/bench_rerank.py --queries 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_rerank_")
+os.chdir(WORKDIR)
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.documents import Document
+
+from app.agent.nodes import rag_is_sufficient
+from app.utils.chroma_utils import add_chunks, vectorstore
+from app.utils.hybrid_search import HybridRetriever
+from app.utils.rerank import confidence
+from app.utils.utils import estimate_tokens
+
+TOPICS = {
+    "bomba": "bomba impulsor caudal cebado succión rodete sello mecánico cavitación descarga",
+    "compresor": "compresor pistón aceite refrigerante presostato condensador escarcha compresión",
+    "inversor": "inversor fotovoltaico panel string MPPT red eléctrica potencia corriente continua",
+    "caldera": "caldera quemador llama piloto gas termopar intercambiador humos agua caliente",
+    "ascensor": "ascensor cabina puertas polea cable tracción botonera nivelación pasillo",
+    "climatizador": "climatizador split filtro aire termostato evaporador ventilador frío calor",
+    "grupo electrógeno": "generador diésel alternador arranque combustible batería tablero transferencia",
+    "tratamiento de agua": "ósmosis membrana cloro dosificador turbidez resina descalcificador salmuera",
+}
+GENERIC = ("equipo revise mantenimiento técnico manual instalación limpieza ajuste control periódico "
+           "seguridad operario servicio sistema funcionamiento").split()
+OFF_TOPIC = [
+    "¿Quién ganó el partido de fútbol de anoche?",
+    "Dame una receta de paella valenciana con mariscos",
+    "¿Qué tiempo hará mañana en Madrid?",
+    "¿Cuál es la capital de Australia?",
+    "Recomiéndame una película de ciencia ficción",
+    "¿Cómo se calcula el impuesto de la renta este año?",
+    "¿Cuántos goles marcó el equipo en la liga?",
+    "¿Qué vacunas necesito para viajar a Tailandia?",
+    "¿Cuál es el mejor horario para visitar el museo del Prado?",
+    "Traduce 'buenos días' al japonés",
+    "¿Qué equipo de baloncesto tiene más títulos?",
+    "¿Cómo preparo una entrevista de trabajo?",
+]
+QUESTION_TEMPLATES = [
+    "¿Cómo reviso el {a} y la {b} de la {topic}?",
+    "¿Qué hago si falla el {a} de la {topic}?",
+    "¿Cada cuánto hay que ajustar {a} y {b} en el {topic}?",
+    "Problema con {a} en {topic}, ¿cómo lo soluciono?",
+]
+
+
+def paragraph(terms, rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(4, 7)):
+        words = rng.sample(terms, 3) + rng.sample(GENERIC, 3)
+        rng.shuffle(words)
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def build_corpus(paragraphs: int, duplicates: int, rng: random.Random):
+    chunks_by_file = {}
+    for file_id, (topic, vocabulary) in enumerate(TOPICS.items(), start=1):
+        terms = vocabulary.split()
+        texts = [f"{topic.capitalize()}: " + paragraph(terms, rng) for _ in range(paragraphs)]
+        # Near-duplicates, as left by repeated sections and revised manuals
+        texts += [texts[i] + " Revisión 2." for i in range(min(duplicates, len(texts)))]
+        chunks_by_file[file_id] = [Document(page_content=t) for t in texts]
+    return chunks_by_file
+
+
+def build_queries(n: int, off_topic_rate: float, rng: random.Random):
+    queries = []
+    topics = list(TOPICS.items())
+    for _ in range(n):
+        if rng.random() < off_topic_rate:
+            queries.append(("off-KB", rng.choice(OFF_TOPIC), None))
+            continue
+        file_id = rng.randrange(len(topics))
+        topic, vocabulary = topics[file_id]
+        a, b = rng.sample(vocabulary.split(), 2)
+        queries.append(("in-KB", rng.choice(QUESTION_TEMPLATES).format(topic=topic, a=a, b=b), file_id + 1))
+    return queries
+
+
+def near_duplicate_pairs(docs) -> int:
+    texts = [d.page_content.replace(" Revisión 2.", "") for d in docs]
+    return len(texts) - len(set(texts))
+
+
+async def evaluate(retriever, queries, file_of: dict):
+    rows = []
+    for kind, query, target in queries:
+        docs = await retriever.ainvoke(query)
+        chunks = "\n\n".join(d.page_content for d in docs)
+        answers = rag_is_sufficient(chunks, confidence(docs))
+        # What reaches the answer prompt: the previous rag_node kept weak chunks next to the web results
+        prompt_chunks = chunks if answers or not retriever.rerank else ""
+        files = [file_of.get(d.id) for d in docs]
+        rows.append({
+            "kind": kind,
+            "correct_route": answers == (kind == "in-KB"),
+            "k": len(docs),
+            "prompt_tokens": estimate_tokens(prompt_chunks) if prompt_chunks else 0,
+            "hit": target in files if target else None,
+            "precision": files.count(target) / len(files) if target and files else None,
+            "duplicates": near_duplicate_pairs(docs),
+        })
+    return rows
+
+
+def summarize(rows) -> dict:
+    in_kb = [r for r in rows if r["kind"] == "in-KB"]
+    off_kb = [r for r in rows if r["kind"] == "off-KB"]
+    return {
+        "route_accuracy": statistics.mean(r["correct_route"] for r in rows),
+        "in_kb_answered": statistics.mean(r["correct_route"] for r in in_kb) if in_kb else 0.0,
+        "off_kb_to_web": statistics.mean(r["correct_route"] for r in off_kb) if off_kb else 0.0,
+        "hit": statistics.mean(r["hit"] for r in in_kb) if in_kb else 0.0,
+        "precision": statistics.mean(r["precision"] for r in in_kb if r["precision"] is not None) if in_kb else 0.0,
+        "mean_k": statistics.mean(r["k"] for r in rows),
+        "prompt_tokens_in": statistics.mean(r["prompt_tokens"] for r in in_kb) if in_kb else 0.0,
+        "prompt_tokens_off": statistics.mean(r["prompt_tokens"] for r in off_kb) if off_kb else 0.0,
+        "duplicates": sum(r["duplicates"] for r in rows),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=30, help="chunks per topic file")
+    parser.add_argument("--duplicates", type=int, default=6, help="near-duplicate chunks per topic file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--off-topic-rate", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    file_of = {}
+    for file_id, chunks in build_corpus(args.paragraphs, args.duplicates, rng).items():
+        for chunk_id in add_chunks(chunks, file_id=file_id):
+            file_of[chunk_id] = file_id
+    queries = build_queries(args.queries, args.off_topic_rate, rng)
+
+    setups = {
+        "top-3 (before)": HybridRetriever(vectorstore=vectorstore.get(), rerank=False),
+        "rerank, no MMR": HybridRetriever(vectorstore=vectorstore.get(), mmr_lambda=1.0),
+        "rerank + MMR": HybridRetriever(vectorstore=vectorstore.get()),
+    }
+    print(f"corpus: {len(file_of)} chunks in {len(TOPICS)} files, queries: {len(queries)} "
+          f"({args.off_topic_rate:.0%} off-KB)\n")
+    print(f"{'setup':<16} {'route acc':>9} {'in-KB ok':>9} {'off-KB web':>10} {'hit':>6} {'precision':>9} "
+          f"{'mean k':>7} {'ctx in-KB':>9} {'ctx off-KB':>10} {'dup pairs':>9}")
+    for name, retriever in setups.items():
+        s = summarize(asyncio.run(evaluate(retriever, queries, file_of)))
+        print(f"{name:<16} {s['route_accuracy']:9.1%} {s['in_kb_answered']:9.1%} {s['off_kb_to_web']:10.1%} "
+              f"{s['hit']:6.1%} {s['precision']:9.1%} {s['mean_k']:7.2f} {s['prompt_tokens_in']:9.0f} "
+              f"{s['prompt_tokens_off']:10.0f} {s['duplicates']:9d}")
+
+
+if __name__ == "__main__":
+    main()
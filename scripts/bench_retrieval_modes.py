@@ -0,0 +1,109 @@
+"""
+Per-path latency of the sequential vs. parallel retrieval graphs.
+
+The router always picks 'rag'; the Chroma and Tavily tools are stubs with
+configurable latency. The "hit" path has the KB answer, the "miss" path returns
+no chunks so the agent needs the web results.
+
+    python scripts/bench_retrieval_modes.py --rag-latency 0.3 --web-latency 1.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+WORKDIR = tempfile.mkdtemp(prefix="bench_retrieval_modes_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from app.agent import nodes
+from app.agent.langgraph_agent import build_agent
+from app.agent.shared import RouteDecision
+
+stats = {"web_started": 0, "web_cancelled": 0}
+
+
+def install_stubs(rag_latency: float, web_latency: float, llm_latency: float, kb_hit: bool) -> None:
+    async def route(_messages):
+        await asyncio.sleep(llm_latency)
+        return RouteDecision(route="rag")
+
+    async def answer(_messages):
+        await asyncio.sleep(llm_latency)
+        return AIMessage(content="ok")
+
+    @tool
+    async def rag_search_tool(query: str) -> str:
+        """Stubbed KB lookup"""
+        await asyncio.sleep(rag_latency)
+        return f"Chunk about {query}" if kb_hit else ""
+
+    @tool
+    async def web_search_tool(query: str) -> str:
+        """Stubbed Tavily search"""
+        stats["web_started"] += 1
+        try:
+            await asyncio.sleep(web_latency)
+        except asyncio.CancelledError:
+            stats["web_cancelled"] += 1
+            raise
+        return f"Title: {query}\nContent: web result\nURL: https://example.com"
+
+    nodes.router_llm = RunnableLambda(route)
+    nodes.answer_llm = RunnableLambda(answer)
+    nodes.rag_search_tool = rag_search_tool
+    nodes.web_search_tool = web_search_tool
+
+
+async def measure(graph, runs: int) -> list[float]:
+    samples = []
+    for i in range(runs):
+        start = time.perf_counter()
+        await graph.ainvoke({"messages": [HumanMessage(content=f"pregunta {i}")]})
+        samples.append(time.perf_counter() - start)
+    # Give cancelled speculative tasks a chance to unwind before the next path.
+    await asyncio.sleep(0)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rag-latency", type=float, default=0.3)
+    parser.add_argument("--web-latency", type=float, default=1.2)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    graphs = {"sequential": build_agent(parallel_retrieval=False),
+              "parallel": build_agent(parallel_retrieval=True)}
+
+    print(f"{'path':<6} {'mode':<11} {'mean ms':>9} {'p95 ms':>9} {'web calls':>10} {'cancelled':>10}")
+    for path, kb_hit in (("hit", True), ("miss", False)):
+        install_stubs(args.rag_latency, args.web_latency, args.llm_latency, kb_hit)
+        for mode, graph in graphs.items():
+            stats.update(web_started=0, web_cancelled=0)
+            samples = asyncio.run(measure(graph, args.runs))
+            p95 = sorted(samples)[max(0, int(len(samples) * 0.95) - 1)]
+            print(f"{path:<6} {mode:<11} {statistics.mean(samples) * 1000:9.1f} {p95 * 1000:9.1f} "
+                  f"{stats['web_started']:10d} {stats['web_cancelled']:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Accuracy and latency of the router fast path on a labelled Spanish/English
+sample set, against calling the router LLM for every turn.
+
+The samples are held out from the built-in exemplars: pleasantries that end
+the turn, KB questions (some opening with a greeting), and follow-ups whose
+meaning depends on the history, which the fast path must leave to the LLM.
+For each threshold the report shows how many turns skip the LLM, how many of
+those were routed wrongly (a question answered with a canned reply is the
+costly mistake) and the router_node latency, with the offline fake LLM
+standing in for the 70B router (FAKE_LLM_LATENCY_MS).
+
+    python scripts/bench_router.py --thresholds 0.4,0.5,0.6
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_router_")
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_ANSWER_TOKENS", "20")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ["LOG_FILE"] = os.path.join(WORKDIR, "app.log")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from app.agent import nodes  # noqa: E402
+from app.utils.fast_router import FastRouter  # noqa: E402
+
+END = [
+    "hola", "Hola!!", "buenos días", "buenas noches", "¡Muchas gracias!", "gracias 🙂", "vale, gracias",
+    "perfecto", "adiós", "hasta mañana", "¿qué tal?", "hola, ¿cómo estás?", "Hola, buenas tardes",
+    "mil gracias por tu ayuda", "ok perfecto gracias", "chao", "nos vemos", "muchísimas gracias, me ha servido",
+    "gracias por responder tan rápido", "hola de nuevo", "buenas, ¿qué tal todo?", "eso es todo, hasta luego",
+    "hi", "Hello!", "thanks!", "thank you so much", "bye", "good night", "how are you?",
+    "thanks, have a nice day", "hey there", "cheers, that was really helpful", "good morning!",
+    "that's all, thank you", "ok thanks, bye",
+]
+RAG = [
+    "¿Cómo limpio el filtro de aire?", "¿Qué significa el error E12 en la pantalla?",
+    "¿Cuál es la presión recomendada del circuito?", "¿Cómo se reinicia el controlador?",
+    "hola, ¿cómo cambio la batería del mando?", "¿Qué pasos sigo para purgar la bomba?",
+    "¿Dónde encuentro el número de serie?", "¿Qué incluye la garantía del equipo?",
+    "¿Cuántos días de vacaciones me corresponden?", "¿Cuál es el horario de atención al cliente?",
+    "necesito saber cómo instalar el sensor de temperatura", "¿Por qué parpadea la luz roja?",
+    "¿Qué aceite usa el compresor?", "explica el procedimiento de arranque en frío",
+    "¿cada cuánto se cambia la correa?", "gracias, ¿y cómo ajusto el termostato?",
+    "Buenos días, ¿qué hago si sale el código F3?", "¿Qué herramientas necesito para el montaje?",
+    "¿Cuál es el consumo eléctrico en modo espera?", "¿Cómo solicito un reembolso?",
+    "How do I clean the air filter?", "What does error E12 mean?", "What's the recommended circuit pressure?",
+    "How do I reset the controller?", "Where can I find the serial number?", "What does the warranty cover?",
+    "Why is the red light blinking?", "hi, how do I change the remote battery?",
+    "what oil does the compressor use?", "how often should the belt be replaced?",
+    "Which tools do I need for the installation?", "How do I request a refund?",
+]
+# (previous question, previous answer, follow-up, expected route); the LLM has to rewrite these
+FOLLOW_UPS = [
+    ("¿Cómo purgo la bomba?", "Abra la válvula de purga y ...", "¿y el segundo paso?", "rag"),
+    ("¿Qué repuestos tiene el compresor?", "Filtro, correa y ...", "¿y eso cuánto cuesta?", "rag"),
+    ("¿Cómo calibro el sensor?", "Pulse SET durante 5 s ...", "¿puedes explicarlo mejor?", "answer"),
+    ("How do I reset model A?", "Hold the power button ...", "what about the other model?", "rag"),
+    ("¿Qué significa E04?", "Sobretemperatura del motor ...", "¿y cómo lo soluciono?", "rag"),
+    ("¿Cómo cambio el filtro?", "Retire la tapa frontal ...", "gracias", "end"),
+    ("What does the warranty cover?", "Parts and labour for 2 years ...", "thanks, bye", "end"),
+    ("¿Dónde está el fusible?", "Detrás del panel lateral ...", "¿y el otro?", "rag"),
+]
+
+
+def samples():
+    out = [([HumanMessage(content=t)], "end") for t in END]
+    out += [([HumanMessage(content=t)], "rag") for t in RAG]
+    out += [([HumanMessage(content=q), AIMessage(content=a), HumanMessage(content=f)], route)
+            for q, a, f, route in FOLLOW_UPS]
+    return out
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+
+
+async def evaluate(router, cases, enabled: bool) -> dict:
+    nodes.fast_router = router
+    nodes.ROUTER_FAST_PATH_ENABLED = enabled
+    router.index.get()
+    settled, wrong, questions_ended, fast_latency = 0, 0, 0, []
+    for messages, expected in cases:
+        start = time.perf_counter()
+        decision = await nodes.fast_route(messages) if enabled else None
+        fast_latency.append(time.perf_counter() - start)
+        if decision is not None:
+            settled += 1
+            wrong += decision.route != expected
+            questions_ended += decision.route == "end" and expected != "end"
+
+    async def timed_node(messages):
+        start = time.perf_counter()
+        await nodes.router_node({"messages": messages, "cache_checked": True})
+        return time.perf_counter() - start
+
+    # The fake LLM only sleeps, so the turns can share the wait
+    node_latency = await asyncio.gather(*(timed_node(messages) for messages, _ in cases))
+    return {
+        "skip_rate": settled / len(cases),
+        "settled_accuracy": (settled - wrong) / settled if settled else None,
+        "wrong": wrong,
+        "questions_ended": questions_ended,
+        "fast_p50": percentile(fast_latency, 0.5),
+        "fast_p99": percentile(fast_latency, 0.99),
+        "node_mean": statistics.mean(node_latency) * 1000,
+        "node_p50": percentile(node_latency, 0.5),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # The offline hashing embedder scores paraphrases far lower than a real
+    # embedding model, hence the low thresholds; calibrate ROUTER_FAST_THRESHOLD
+    # with EMBEDDING_BACKEND=gemini and your own exemplars.
+    parser.add_argument("--thresholds", default="0.4,0.5,0.6,0.8")
+    parser.add_argument("--margin", type=float, default=0.1)
+    args = parser.parse_args()
+
+    cases = samples()
+    print(f"{len(cases)} labelled turns: {len(END)} pleasantries, {len(RAG)} KB questions, "
+          f"{len(FOLLOW_UPS)} follow-ups; fake router LLM {os.environ.get('FAKE_LLM_LATENCY_MS', '300')} ms\n")
+    # accuracy: of the turns settled without the LLM; q ended: questions given a canned reply
+    print(f"{'setup':<20} {'LLM skipped':>11} {'accuracy':>9} {'wrong':>6} {'q ended':>8} "
+          f"{'fast p50':>9} {'fast p99':>9} {'router mean':>12} {'router p50':>11}")
+    setups = [("LLM only", FastRouter(threshold=2.0), False), ("rules only", FastRouter(threshold=2.0), True)]
+    setups += [(f"rules+exemplars {t}", FastRouter(threshold=float(t), margin=args.margin), True)
+               for t in args.thresholds.split(",")]
+    for name, router, enabled in setups:
+        r = asyncio.run(evaluate(router, cases, enabled))
+        accuracy = f"{r['settled_accuracy']:9.1%}" if r["settled_accuracy"] is not None else f"{'-':>9}"
+        print(f"{name:<20} {r['skip_rate']:11.1%} {accuracy} {r['wrong']:6d} "
+              f"{r['questions_ended']:8d} {r['fast_p50']:7.3f}ms {r['fast_p99']:7.3f}ms "
+              f"{r['node_mean']:10.1f}ms {r['node_p50']:9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
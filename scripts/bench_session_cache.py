@@ -0,0 +1,158 @@
+"""
+History-load latency and hit rate of the hot-session cache.
+
+Replays a skewed workload (a few sessions are very active, most are not)
+through POST /chat's handler with stubbed LLMs, under three configurations:
+no cache, write-through cache, and write-through cache validated against the
+session version on every hit. --foreign-writes simulates another worker
+saving turns directly to SQLite; the "stale served" column counts prompts that
+differed from a fresh read of the database.
+
+    python scripts/bench_session_cache.py --sessions 200 --requests 2000 --foreign-writes 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+WORKDIR = tempfile.mkdtemp(prefix="bench_session_cache_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from app.agent import nodes
+from app.agent.shared import RouteDecision
+from app.models.pydantic_models import QueryInput
+from app.routers import chat
+from app.utils import db_utils, langchain_utils, memory
+from app.utils.session_cache import session_cache
+
+ANSWER = "Respuesta de prueba con algo de contenido para que el historial tenga peso."
+
+
+def install_stubs() -> None:
+    async def route(_messages):
+        return RouteDecision(route="rag")
+
+    async def answer(_messages):
+        return AIMessage(content=ANSWER)
+
+    async def summarize(inputs):
+        return " ".join((inputs["summary"] + " " + inputs["new_lines"]).split()[-inputs["max_words"]:])
+
+    @tool
+    async def rag_search_tool(query: str) -> str:
+        """Stubbed KB lookup"""
+        return f"Chunk about {query}"
+
+    nodes.router_llm = RunnableLambda(route)
+    nodes.answer_llm = RunnableLambda(answer)
+    nodes.rag_search_tool = rag_search_tool
+    langchain_utils.summary_chain = RunnableLambda(summarize)
+
+
+def render(messages):
+    return [(m.type, m.content) for m in messages]
+
+
+async def run(config: str, workload, args, rng: random.Random) -> dict:
+    memory.HISTORY_CACHE_ENABLED = config != "no cache"
+    memory.HISTORY_CACHE_VALIDATE = config == "validated"
+    session_cache.clear()
+    session_cache.hits = session_cache.misses = session_cache.stale = session_cache.evictions = 0
+
+    prefix = config.replace(" ", "-")
+    db_utils.insert_chat_history_many(
+        (f"{prefix}-{s}", f"pregunta previa {t}", ANSWER, "llama-3.3-70b")
+        for s in range(args.sessions) for t in range(args.history)
+    )
+
+    load_times, stale_served = [], 0
+    real_load_memory = memory.load_memory
+
+    async def timed_load_memory(session_id):
+        nonlocal stale_served
+        start = time.perf_counter()
+        messages = await real_load_memory(session_id)
+        load_times.append(time.perf_counter() - start)
+        if args.foreign_writes:
+            session_cache.begin_load(session_id)  # keep the fresh read out of the cache
+            fresh = await memory._read_session(session_id)
+            session_cache.finish_load(session_id, None)
+            stale_served += render(memory.session_messages(fresh)) != render(messages)
+        return messages
+
+    chat.load_memory = timed_load_memory
+    start = time.perf_counter()
+    try:
+        for i in range(0, len(workload), args.concurrency):
+            batch = workload[i:i + args.concurrency]
+            for session in batch:
+                if rng.random() < args.foreign_writes:
+                    db_utils.insert_chat_history(f"{prefix}-{session}", "turno de otro worker", ANSWER, "llama-3.3-70b")
+            with contextlib.redirect_stdout(io.StringIO()):
+                await asyncio.gather(*(chat.chat(QueryInput(question=f"pregunta {i + j}", session_id=f"{prefix}-{s}"))
+                                       for j, s in enumerate(batch)))
+            await memory.wait_for_compactions()
+    finally:
+        chat.load_memory = real_load_memory
+    elapsed = time.perf_counter() - start
+
+    load_times.sort()
+    return {
+        "mean": statistics.mean(load_times) * 1000,
+        "p95": load_times[max(0, int(len(load_times) * 0.95) - 1)] * 1000,
+        "rps": len(workload) / elapsed,
+        "stats": session_cache.stats(),
+        "stale_served": stale_served,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=6, help="turns already stored per session")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--foreign-writes", type=float, default=0.0,
+                        help="probability that another worker saves a turn before a request")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    install_stubs()
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) for rank in range(args.sessions)]
+    workload = rng.choices(range(args.sessions), weights=weights, k=args.requests)
+
+    print(f"{args.requests} requests over {args.sessions} sessions (Zipf), {args.history} stored turns each, "
+          f"concurrency {args.concurrency}, foreign writes {args.foreign_writes:.0%}\n")
+    print(f"{'config':<11} {'load mean':>10} {'load p95':>9} {'req/s':>7} {'hit rate':>9} "
+          f"{'stale':>6} {'evict':>6} {'stale served':>13}")
+    for config in ("no cache", "cached", "validated"):
+        r = asyncio.run(run(config, workload, args, random.Random(args.seed)))
+        s = r["stats"]
+        print(f"{config:<11} {r['mean']:8.3f}ms {r['p95']:7.3f}ms {r['rps']:7.0f} {s['hit_rate']:9.1%} "
+              f"{s['stale']:6d} {s['evictions']:6d} {r['stale_served']:13d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Time to stand up a serving node's index from a snapshot against re-indexing
+the documents, and what compaction recovers after many deletions.
+
+Runs three fresh processes with their own Chroma + SQLite store:
+
+  build    index --chunks chunks (embedded through the simulated remote API,
+           EMBEDDING_BACKEND=fake at FAKE_EMBEDDING_LATENCY_MS per call) and
+           export a snapshot
+  import   load that snapshot into an empty store (no embedding calls) and
+           run the consistency check
+  compact  import it again, delete --delete-share of the documents one by one
+           as /delete-doc does, then compact; disk use and dense query latency
+           are measured before and after
+
+    python scripts/bench_snapshot.py --chunks 20000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+WORDS = ("filtro bomba presion sensor valvula caudal motor tension alarma limpieza revision cambio "
+         "temperatura circuito manual equipo ajuste modulo panel control servicio").split()
+
+
+def _store_env(workdir: str) -> dict:
+    env = dict(os.environ, PYTHONWARNINGS="ignore", LOG_FILE=os.path.join(workdir, "app.log"),
+               RAG_DB_PATH=os.path.join(workdir, "rag_app.db"), CHROMA_PERSIST_DIR=os.path.join(workdir, "chroma_db"))
+    for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+        env.setdefault(key, "offline")
+    env.setdefault("EMBEDDING_BACKEND", "fake")
+    env["EMBEDDING_CACHE_ENABLED"] = "false"
+    env["WEB_SEARCH_CACHE_ENABLED"] = "false"
+    return env
+
+
+# ── Child processes ──────────────────────────────────────────────────
+def _query_latency(queries: int, seed: int) -> float:
+    from app.utils.chroma_utils import embedding_function, get_vectorstore
+
+    rng = random.Random(seed)
+    collection = get_vectorstore()._collection
+    vectors = embedding_function.embed_documents([" ".join(rng.sample(WORDS, 5)) for _ in range(queries)])
+    latency = []
+    for vector in vectors:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[vector], n_results=10)
+        latency.append(time.perf_counter() - start)
+    return statistics.median(latency) * 1000
+
+
+def child_build(snapshot: str, chunks: int, files: int, seed: int) -> dict:
+    from langchain_core.documents import Document
+
+    from app.utils.chroma_utils import sync_chunks
+    from app.utils.db_utils import insert_document_record
+    from app.utils.snapshot import export_snapshot
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for f in range(files):
+        file_id = insert_document_record(f"manual-{f}.txt", f"hash-{f}")
+        texts = [" ".join(rng.choice(WORDS) for _ in range(60)) + f" ref {f}-{i}" for i in range(chunks // files)]
+        sync_chunks([Document(page_content=t) for t in texts], file_id)
+    indexed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manifest = export_snapshot(snapshot)
+    exported = time.perf_counter() - start
+    return {"index_s": indexed, "export_s": exported, "rows": manifest["rows"]}
+
+
+def child_import(snapshot: str) -> dict:
+    from app.utils.maintenance import check_consistency
+    from app.utils.snapshot import import_snapshot
+
+    start = time.perf_counter()
+    import_snapshot(snapshot)
+    imported = time.perf_counter() - start
+    return {"import_s": imported, "consistent": check_consistency()["consistent"]}
+
+
+def child_compact(snapshot: str, delete_share: float, queries: int, seed: int) -> dict:
+    from app.utils.chroma_utils import delete_doc_from_chroma
+    from app.utils.db_utils import delete_document_record, get_all_documents
+    from app.utils.maintenance import _store_usage, compact
+    from app.utils.snapshot import import_snapshot
+
+    import_snapshot(snapshot)
+    documents = get_all_documents()
+    rng = random.Random(seed)
+    for doc in rng.sample(documents, int(len(documents) * delete_share)):
+        delete_doc_from_chroma(doc["id"])
+        delete_document_record(doc["id"])
+    before = _store_usage()
+    latency_before = _query_latency(queries, seed)
+    result = compact()
+    return {
+        "chroma_before": before["chroma"], "sqlite_before": before["sqlite"],
+        "chroma_after": result["bytes_after"]["chroma"], "sqlite_after": result["bytes_after"]["sqlite"],
+        "compact_s": result["seconds"], "p50_before": latency_before, "p50_after": _query_latency(queries, seed),
+    }
+
+
+def run(step: str, workdir: str, args) -> dict:
+    os.makedirs(workdir, exist_ok=True)
+    out = subprocess.run([sys.executable, __file__, "--child", step, "--snapshot", args.snapshot,
+                          "--chunks", str(args.chunks), "--files", str(args.files),
+                          "--delete-share", str(args.delete_share), "--queries", str(args.queries),
+                          "--seed", str(args.seed)],
+                         cwd=ROOT, env=_store_env(workdir), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--delete-share", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--snapshot", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT))
+        steps = {
+            "build": lambda: child_build(args.snapshot, args.chunks, args.files, args.seed),
+            "import": lambda: child_import(args.snapshot),
+            "compact": lambda: child_compact(args.snapshot, args.delete_share, args.queries, args.seed),
+        }
+        print(json.dumps(steps[args.child]()))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    args.snapshot = os.path.join(workdir, "snapshot")
+    build = run("build", os.path.join(workdir, "batch"), args)
+    size = sum(f.stat().st_size for f in Path(args.snapshot).iterdir())
+    imported = run("import", os.path.join(workdir, "serving"), args)
+    compacted = run("compact", os.path.join(workdir, "compact"), args)
+
+    mb = 1024 * 1024
+    print(f"{build['rows']} chunks in {args.files} files, embedding backend "
+          f"{os.environ.get('EMBEDDING_BACKEND', 'fake')} ({os.environ.get('FAKE_EMBEDDING_LATENCY_MS', '50')} ms/call)\n")
+    print(f"{'re-index (embed + write)':<32} {build['index_s']:8.1f} s")
+    print(f"{'export snapshot':<32} {build['export_s']:8.1f} s   {size / mb:6.1f} MB")
+    print(f"{'import snapshot':<32} {imported['import_s']:8.1f} s   consistent: {imported['consistent']}")
+    print(f"\nafter deleting {args.delete_share:.0%} of the documents:")
+    print(f"{'':<12} {'chroma MB':>10} {'sqlite MB':>10} {'query p50 ms':>13}")
+    print(f"{'before':<12} {compacted['chroma_before'] / mb:10.1f} {compacted['sqlite_before'] / mb:10.1f} "
+          f"{compacted['p50_before']:13.2f}")
+    print(f"{'compacted':<12} {compacted['chroma_after'] / mb:10.1f} {compacted['sqlite_after'] / mb:10.1f} "
+          f"{compacted['p50_after']:13.2f}   ({compacted['compact_s']:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
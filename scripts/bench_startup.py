@@ -0,0 +1,175 @@
+"""
+Cold-start cost of the app: import time of app.main, time until a freshly
+started server answers its first request, and the latency of the first and
+second POST /chat.
+
+Every measurement runs in a new process. Import time uses the real
+Cerebras / Tavily / Gemini backends with dummy keys (clients are constructed,
+never called); the server runs with the offline fake backends at zero latency
+so /chat measures only what is built on the way. --baseline runs the same
+measurements against another commit, checked out into a temporary worktree:
+
+    python scripts/bench_startup.py --baseline HEAD~1 --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def base_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+        env.setdefault(key, "offline")
+    env.update({
+        "RAG_DB_PATH": os.path.join(workdir, "bench.db"),
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma_db"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+        "WEB_SEARCH_CACHE_PATH": os.path.join(workdir, "web_search_cache.db"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def fake_env(workdir: str) -> dict:
+    env = base_env(workdir)
+    env.update({
+        "LLM_BACKEND": "fake",
+        "SEARCH_BACKEND": "fake",
+        "EMBEDDING_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": "0",
+        "FAKE_LLM_TOKEN_LATENCY_MS": "0",
+        "FAKE_EMBEDDING_LATENCY_MS": "0",
+        "FAKE_SEARCH_LATENCY_MS": "0",
+        "SEMANTIC_CACHE_ENABLED": "false",
+    })
+    return env
+
+
+def measure_import(src: Path) -> float:
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=src, env=base_env(workdir),
+                             capture_output=True, text=True, check=True)
+        return float(out.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def request(url: str, payload=None, timeout: float = 60):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_server(src: Path, warmup: str) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = fake_env(workdir)
+    env["STARTUP_WARMUP"] = warmup
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=src, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        while True:
+            try:
+                request(base + "/", timeout=1)
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if server.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                time.sleep(0.005)
+        result["first_response"] = time.perf_counter() - start
+
+        # Readiness, where the version has it (404 on trees without /healthz)
+        while True:
+            try:
+                request(base + "/healthz", timeout=5)
+                result["ready"] = time.perf_counter() - start
+                break
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    break
+                time.sleep(0.005)
+
+        for key in ("first_chat", "second_chat"):
+            t = time.perf_counter()
+            request(base + "/chat", {"question": "¿Cómo cambio el filtro del equipo?"})
+            result[key] = time.perf_counter() - t
+        result["first_chat_done"] = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def run_suite(src: Path, runs: int, warmups) -> dict:
+    results = {"import": statistics.median(measure_import(src) for _ in range(runs))}
+    for warmup in warmups:
+        samples = [measure_server(src, warmup) for _ in range(runs)]
+        results[warmup] = {key: statistics.median(s[key] for s in samples)
+                           for key in samples[0]}
+    return results
+
+
+def report(label: str, results: dict) -> None:
+    print(f"\n{label}")
+    print(f"  import app.main                 {results['import'] * 1000:8.0f} ms")
+    for warmup, r in results.items():
+        if warmup == "import":
+            continue
+        ready = f"{r['ready'] * 1000:8.0f} ms" if "ready" in r else "       -"
+        print(f"  STARTUP_WARMUP={warmup:<10}  first response {r['first_response'] * 1000:6.0f} ms | "
+              f"ready {ready} | first /chat {r['first_chat'] * 1000:6.0f} ms | "
+              f"second /chat {r['second_chat'] * 1000:5.0f} ms | "
+              f"start->first answer {r['first_chat_done'] * 1000:6.0f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="medians over this many fresh processes")
+    parser.add_argument("--baseline", help="git ref to compare against, e.g. HEAD~1")
+    parser.add_argument("--warmup", default="lazy,background,eager",
+                        help="STARTUP_WARMUP modes to measure on this tree")
+    args = parser.parse_args()
+
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix="bench_startup_baseline_")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline], cwd=ROOT,
+                       check=True, capture_output=True)
+        try:
+            # STARTUP_WARMUP may not exist there; it is passed through and ignored
+            report(f"baseline ({args.baseline})", run_suite(Path(worktree), args.runs, ["default"]))
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=ROOT, check=True)
+
+    report("working tree", run_suite(ROOT, args.runs, args.warmup.split(",")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Latency of web_search_tool under a heavy-tailed search backend, with the
+result cache, the per-call deadline and hedging switched on one at a time.
+
+The backend is the offline Tavily stand-in with a log-normal latency plus an
+occasional stall (--stall-rate, --stall-ms), the shape that makes hedging pay
+off. Queries repeat with a Zipf-like popularity, so the cache sees realistic
+reuse. Every setup runs the same query sequence on a fresh cache file.
+
+    python scripts/bench_web_search.py --queries 400 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_web_search_")
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEARCH_BACKEND", "fake")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ["LOG_FILE"] = os.path.join(WORKDIR, "app.log")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "bench.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+from app.utils.offline import FakeTavilySearch  # noqa: E402
+
+
+class TailSearch(FakeTavilySearch):
+    """Log-normal latency around `median_ms`, with `stall_rate` of calls taking `stall_ms`."""
+
+    def __init__(self, rng: random.Random, median_ms: float, stall_rate: float, stall_ms: float):
+        super().__init__(max_results=3)
+        self.rng = rng
+        self.median_ms = median_ms
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.calls = 0
+
+    async def ainvoke(self, input: dict, config=None) -> dict:
+        self.calls += 1
+        if self.rng.random() < self.stall_rate:
+            delay = self.stall_ms
+        else:
+            delay = self.median_ms * math.exp(self.rng.gauss(0, 0.35))
+        await asyncio.sleep(delay / 1000)
+        return self._results(input["query"])
+
+
+SETUPS = {
+    "baseline": {"cache": False, "timeout_ms": 60000, "hedge": 0},
+    "cache": {"cache": True, "timeout_ms": 60000, "hedge": 0},
+    "cache+deadline": {"cache": True, "timeout_ms": None, "hedge": 0},
+    "cache+deadline+hedge": {"cache": True, "timeout_ms": None, "hedge": None},
+}
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+
+
+async def run_setup(queries, setup: dict, args) -> dict:
+    from app.tools import tools
+    from app.utils.web_search import HedgedCall, SearchCache
+
+    backend = TailSearch(random.Random(args.seed), args.median_ms, args.stall_rate, args.stall_ms)
+    tools.tavily = backend
+    tools.search_cache = (SearchCache(os.path.join(WORKDIR, f"cache-{time.monotonic_ns()}.db"), 3600, 10000)
+                          if setup["cache"] else None)
+    tools.search_call = HedgedCall((setup["timeout_ms"] or args.timeout_ms) / 1000,
+                                   args.hedge_percentile if setup["hedge"] is None else 0)
+
+    queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    latencies, empty = [], 0
+
+    async def worker():
+        nonlocal empty
+        while not queue.empty():
+            query = queue.get_nowait()
+            start = time.perf_counter()
+            text = await tools.web_search_tool.ainvoke({"query": query})
+            latencies.append(time.perf_counter() - start)
+            empty += not text
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    call_stats = tools.search_call.stats()
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "upstream_calls": backend.calls,
+        "hit_rate": tools.search_cache.stats()["hit_rate"] if tools.search_cache else 0.0,
+        "deadline_rate": call_stats["deadline_rate"],
+        "hedges": call_stats["hedges"],
+        "hedge_wins": call_stats["hedge_wins"],
+        "rag_only": empty,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--distinct", type=int, default=120, help="distinct queries in the pool")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--median-ms", type=float, default=400)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-ms", type=float, default=6000)
+    parser.add_argument("--timeout-ms", type=float, default=2500, help="deadline of the deadline setups")
+    parser.add_argument("--hedge-percentile", type=float, default=90)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    # Every deadline hit is logged as a warning; the table counts them instead
+    logging.getLogger("app.tools.tools").setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    pool = [f"novedades del producto {i} en 2026" for i in range(args.distinct)]
+    weights = [1 / (i + 1) for i in range(args.distinct)]
+    queries = rng.choices(pool, weights=weights, k=args.queries)
+
+    print(f"{args.queries} searches ({args.distinct} distinct), concurrency {args.concurrency}; backend median "
+          f"{args.median_ms:.0f} ms, {args.stall_rate:.0%} stalls of {args.stall_ms:.0f} ms; deadline "
+          f"{args.timeout_ms:.0f} ms, hedge at p{args.hedge_percentile:.0f}\n")
+    print(f"{'setup':<22} {'p50':>7} {'p95':>7} {'p99':>7} {'calls':>6} {'hit%':>6} {'deadline%':>10} "
+          f"{'hedges':>7} {'won':>5}")
+    for name, setup in SETUPS.items():
+        r = asyncio.run(run_setup(queries, setup, args))
+        print(f"{name:<22} {r['p50']:7.0f} {r['p95']:7.0f} {r['p99']:7.0f} {r['upstream_calls']:6d} "
+              f"{r['hit_rate']:6.1%} {r['deadline_rate']:10.1%} {r['hedges']:7d} {r['hedge_wins']:5d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Load test for POST /chat with stubbed LLM and retrieval backends.
+
+Every upstream call (contextualiser, router, RAG tool, answer LLM) is replaced
+by an async stub that sleeps for a fixed latency, so the run needs no API keys
+and no network. If the agent is fully non-blocking, N concurrent requests
+finish in roughly the latency of a single one instead of N times it.
+
+    python scripts/load_test_chat.py --concurrency 20 --latency 0.25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+# Dummy keys so the real clients can be constructed; they are never called.
+for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "offline")
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("WEB_SEARCH_CACHE_ENABLED", "false")
+WORKDIR = tempfile.mkdtemp(prefix="load_test_")
+os.environ["RAG_DB_PATH"] = os.path.join(WORKDIR, "load_test.db")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORKDIR, "chroma_db")
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from app.main import app
+from app.agent import nodes
+from app.agent.shared import RouteDecision
+from app.routers import chat
+
+
+def install_stubs(latency: float) -> None:
+    async def contextualise(inputs):
+        await asyncio.sleep(latency)
+        return inputs["input"]
+
+    async def route(_messages):
+        await asyncio.sleep(latency)
+        return RouteDecision(route="rag")
+
+    async def answer(_messages):
+        await asyncio.sleep(latency)
+        return AIMessage(content="Respuesta de prueba.")
+
+    @tool
+    async def rag_search_tool(query: str) -> str:
+        """Stubbed KB lookup"""
+        await asyncio.sleep(latency)
+        return f"Chunk about {query}"
+
+    chat.contextualise_chain = RunnableLambda(contextualise)
+    nodes.router_llm = RunnableLambda(route)
+    nodes.answer_llm = RunnableLambda(answer)
+    nodes.rag_search_tool = rag_search_tool
+
+
+async def run(concurrency: int) -> tuple[float, list[float]]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+        async def one(i: int) -> float:
+            start = time.perf_counter()
+            res = await client.post("/chat", json={"question": f"pregunta {i}", "session_id": f"load-{i}"})
+            res.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        return time.perf_counter() - start, list(latencies)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.25, help="seconds per stubbed upstream call")
+    parser.add_argument("--max-ratio", type=float, default=2.0,
+                        help="fail if concurrent wall time exceeds this multiple of a single request")
+    args = parser.parse_args()
+
+    install_stubs(args.latency)
+
+    single, _ = asyncio.run(run(1))
+    wall, latencies = asyncio.run(run(args.concurrency))
+    ratio = wall / single
+
+    print(f"single request:        {single * 1000:8.1f} ms")
+    print(f"{args.concurrency:3d} concurrent (wall): {wall * 1000:8.1f} ms")
+    print(f"slowest request:       {max(latencies) * 1000:8.1f} ms")
+    print(f"wall / single:         {ratio:8.2f}x  (fully serialised would be ~{args.concurrency}x)")
+
+    return 0 if ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Load test for request coalescing: bursts of identical first-turn questions
+from different sessions, against /chat and /chat/stream, with coalescing on
+and off.
+
+Each burst sends --burst copies of one question at once (fresh sessions, so
+there is no history and the requests qualify). The offline fake backends are
+used; upstream work is counted from the stage-duration histogram (LLM calls
+by stage, graph node runs), so the report shows how many backend calls a
+burst costs with and without single-flight.
+
+    python scripts/load_test_coalescing.py --bursts 10 --burst 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import uuid
+
+from bench_e2e import build_corpus, configure_env, ingest, stage_totals, summarize
+
+QUESTIONS = [
+    "¿Cómo cambio el filtro del equipo?",
+    "¿Cada cuánto se calibra el sensor de presión?",
+    "¿Qué hago si la alarma de temperatura no se apaga?",
+    "¿Dónde está el manual de mantenimiento preventivo?",
+    "¿Cuál es el procedimiento de arranque en frío?",
+]
+
+
+async def ask(client, endpoint: str, question: str) -> dict:
+    payload = {"question": question, "session_id": str(uuid.uuid4())}
+    start = time.perf_counter()
+    if endpoint == "chat":
+        response = await client.post("/chat", json=payload)
+        response.raise_for_status()
+        return {"latency": time.perf_counter() - start, "answer": response.json()["answer"]}
+
+    tokens, answer, event = [], None, None
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+                if event == "token":
+                    tokens.append(data["content"])
+                elif event == "done":
+                    answer = data["answer"]
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+    if answer is None:
+        raise RuntimeError("stream ended without a done event")
+    if "".join(tokens).strip() != answer.strip():
+        raise RuntimeError("streamed tokens do not add up to the answer")
+    return {"latency": time.perf_counter() - start, "answer": answer}
+
+
+def upstream_calls(before: dict, after: dict) -> dict:
+    calls = {}
+    for key, (_, count) in after.items():
+        kind = key.split(".", 1)[0]
+        if kind in ("llm", "node", "tool", "retrieval"):
+            delta = count - before.get(key, [0.0, 0])[1]
+            if delta:
+                calls[key] = delta
+    return calls
+
+
+async def run_mode(client, endpoint: str, enabled: bool, args) -> dict:
+    from app.routers import chat as chat_router
+    from app.utils import memory
+
+    chat_router.COALESCE_ENABLED = enabled
+    flights = chat_router.chat_flights if endpoint == "chat" else chat_router.stream_flights
+    coalesced_before = flights.coalesced
+    latencies, mismatched = [], 0
+
+    before = stage_totals()
+    start = time.perf_counter()
+    for i in range(args.bursts):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        results = await asyncio.gather(*(ask(client, endpoint, question) for _ in range(args.burst)))
+        latencies.extend(r["latency"] for r in results)
+        mismatched += len({r["answer"] for r in results}) - 1
+    elapsed = time.perf_counter() - start
+    await memory.wait_for_compactions()
+
+    calls = upstream_calls(before, stage_totals())
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "latency_ms": summarize(latencies),
+        "coalesced": flights.coalesced - coalesced_before,
+        "llm_calls": sum(v for k, v in calls.items() if k.startswith("llm.")),
+        "calls": calls,
+        "bursts_with_differing_answers": mismatched,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.main import app, lifespan
+
+    results = {}
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            await ingest(client, build_corpus(args.docs, 20, random.Random(args.seed)))
+            for endpoint in args.endpoints:
+                for enabled in (False, True):
+                    results[f"{endpoint}/{'on' if enabled else 'off'}"] = await run_mode(client, endpoint,
+                                                                                       enabled, args)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=20, help="identical questions sent at once")
+    parser.add_argument("--endpoints", default="chat,stream")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=250)
+    parser.add_argument("--token-latency-ms", type=float, default=2)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the full report here")
+    args = parser.parse_args()
+    args.endpoints = [e.strip() for e in args.endpoints.split(",")]
+
+    args.embedding_latency_ms, args.search_latency_ms, args.semantic_cache = 30, 600, False
+    configure_env(args, tempfile.mkdtemp(prefix="load_test_coalescing_"))
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print(f"{args.bursts} bursts of {args.burst} identical first-turn questions\n")
+    print(f"{'mode':<12} {'req':>5} {'p50':>8} {'p95':>8} {'coalesced':>10} {'LLM calls':>10}   node / tool / retrieval runs")
+    for mode, r in results.items():
+        lat = r["latency_ms"]
+        nodes = ", ".join(f"{k} {v}" for k, v in sorted(r["calls"].items())
+                          if not k.startswith("llm."))
+        print(f"{mode:<12} {r['requests']:5d} {lat['p50']:8.1f} {lat['p95']:8.1f} {r['coalesced']:10d} "
+              f"{r['llm_calls']:10d}   {nodes}")
+        if r["bursts_with_differing_answers"]:
+            print(f"{'':<12} answers differed within a burst {r['bursts_with_differing_answers']} times")
+    print()
+    for endpoint in args.endpoints:
+        off, on = results[f"{endpoint}/off"]["llm_calls"], results[f"{endpoint}/on"]["llm_calls"]
+        if off:
+            print(f"{endpoint}: {(1 - on / off):.0%} fewer LLM calls with coalescing")
+
+
+if __name__ == "__main__":
+    main()
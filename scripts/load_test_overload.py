@@ -0,0 +1,218 @@
+"""
+Overload test of the multi-worker server (python run.py --workers N).
+
+The fake LLM backend is given a fixed capacity (FAKE_LLM_MAX_CONCURRENCY)
+and answers 429 beyond it, like a rate-limited Cerebras account. Requests
+arrive open loop (Poisson, --rate per second for --duration seconds) at about
+twice what that capacity sustains, once with the LLM concurrency limit off
+and once with it set to the upstream capacity, and the report compares:
+
+  - status codes (200, 503 from a full local queue, 429 from the upstream or
+    a busy session, anything else is an error)
+  - latency percentiles of the answered and of the rejected requests
+  - whether every rejection carried Retry-After
+
+A share of the sessions (--pair-share) send two turns 20 ms apart. They may
+reach the workers in either order, but one must wait for the other: both are
+saved, in the order their responses came back.
+
+    python scripts/load_test_overload.py --workers 2 --rate 14 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def start_server(args, workdir: str, limited: bool):
+    port = free_port()
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+        env.setdefault(key, "offline")
+    env.update({
+        "LLM_BACKEND": "fake", "SEARCH_BACKEND": "fake", "EMBEDDING_BACKEND": "hashing",
+        # The fake counts calls per process: each worker gets its share
+        "FAKE_LLM_MAX_CONCURRENCY": str(max(1, args.upstream_capacity // args.workers)),
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms), "FAKE_LLM_TOKEN_LATENCY_MS": "5",
+        "FAKE_LLM_ANSWER_TOKENS": "40",
+        "LLM_MAX_CONCURRENCY": str(args.upstream_capacity if limited else 0),
+        "LLM_MAX_QUEUE": str(args.queue), "LLM_QUEUE_TIMEOUT_MS": str(args.queue_timeout_ms),
+        "SEMANTIC_CACHE_ENABLED": "false", "EMBEDDING_CACHE_ENABLED": "false", "WEB_SEARCH_CACHE_ENABLED": "false",
+        "ROUTER_FAST_PATH_ENABLED": "false", "MEMORY_ENABLED": "false", "STARTUP_WARMUP": "eager",
+        "RAG_DB_PATH": os.path.join(workdir, "rag_app.db"), "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma_db"),
+        "CHROMA_SERVER_PORT": str(free_port()), "LOG_FILE": os.path.join(workdir, "app.log"),
+    })
+    env.pop("CHROMA_SERVER_URL", None)
+    server = subprocess.Popen([sys.executable, "run.py", "--host", "127.0.0.1", "--port", str(port),
+                               "--workers", str(args.workers)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 90
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=2).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("server did not become ready")
+
+
+async def offer_load(base_url: str, args, rng: random.Random) -> dict:
+    results = []
+    pairs = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)) as client:
+        async def send(question: str, session_id: str, label: str):
+            start = time.perf_counter()
+            reason = None
+            try:
+                res = await client.post("/chat", json={"question": question, "session_id": session_id})
+                status, retry_after = res.status_code, res.headers.get("retry-after")
+                if status in (429, 503):
+                    # "llm overloaded (queue_timeout), retry after 2 s"
+                    reason = res.json().get("detail", "").partition("(")[2].partition(")")[0]
+            except httpx.HTTPError:
+                status, retry_after = 0, None
+            finished = time.perf_counter()
+            results.append({"status": status, "seconds": finished - start, "retry_after": retry_after,
+                            "reason": reason, "label": label})
+            return question.split()[0], status, finished
+
+        async def pair(i: int):
+            session_id = f"pair-{i}"
+            first = asyncio.create_task(send(f"primera pregunta {i}", session_id, "pair"))
+            await asyncio.sleep(0.02)
+            second = asyncio.create_task(send(f"segunda pregunta {i}", session_id, "pair"))
+            pairs.append((session_id, await asyncio.gather(first, second)))
+
+        tasks = []
+        started = time.perf_counter()
+        i = 0
+        while time.perf_counter() - started < args.duration:
+            if rng.random() < args.pair_share:
+                tasks.append(asyncio.create_task(pair(i)))
+            else:
+                tasks.append(asyncio.create_task(send(f"pregunta número {i} sobre el equipo", f"load-{i}", "single")))
+            i += 1
+            await asyncio.sleep(rng.expovariate(args.rate))
+        offered = time.perf_counter() - started
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return {"results": results, "pairs": pairs, "offered_seconds": offered, "elapsed_seconds": elapsed}
+
+
+def check_pairs(db_path: str, pairs) -> dict:
+    conn = sqlite3.connect(db_path)
+    both, out_of_order, missing = 0, 0, 0
+    for session_id, turns in pairs:
+        rows = [r[0] for r in conn.execute("SELECT user_query FROM chat_history WHERE session_id = ? ORDER BY id",
+                                           (session_id,))]
+        expected = [word for word, status, _ in sorted(turns, key=lambda t: t[2]) if status == 200]
+        got = [r.split()[0] for r in rows]
+        if sorted(got) != sorted(expected):
+            missing += 1
+        elif got != expected:
+            out_of_order += 1
+        if len(expected) == 2:
+            both += 1
+    conn.close()
+    return {"pairs": len(pairs), "both_answered": both, "out_of_order": out_of_order, "missing_turns": missing}
+
+
+def summarize(run: dict) -> dict:
+    results = run["results"]
+    rejected = [r for r in results if r["status"] in (429, 503)]
+    # Latencies of single-turn sessions; a paired turn also waits for its twin
+    ok = [r["seconds"] for r in results if r["status"] == 200 and r["label"] == "single"]
+    rejected_seconds = [r["seconds"] for r in rejected if r["label"] == "single"]
+    statuses, reasons = {}, {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+        if r["reason"]:
+            reasons[r["reason"]] = reasons.get(r["reason"], 0) + 1
+    return {
+        "requests": len(results),
+        "statuses": dict(sorted(statuses.items())),
+        "rejection_reasons": reasons,
+        "goodput_per_s": round(statuses.get("200", 0) / run["elapsed_seconds"], 2),
+        "ok_p50_ms": round(percentile(ok, 0.50) * 1000),
+        "ok_p95_ms": round(percentile(ok, 0.95) * 1000),
+        "ok_p99_ms": round(percentile(ok, 0.99) * 1000),
+        "rejected_p50_ms": round(percentile(rejected_seconds, 0.50) * 1000),
+        "rejected_p99_ms": round(percentile(rejected_seconds, 0.99) * 1000),
+        "rejections_with_retry_after": sum(1 for r in rejected if r["retry_after"]),
+    }
+
+
+def run_config(args, limited: bool) -> dict:
+    workdir = tempfile.mkdtemp(prefix="load_overload_")
+    server, base_url = start_server(args, workdir, limited)
+    try:
+        run = asyncio.run(offer_load(base_url, args, random.Random(args.seed)))
+        stats = httpx.get(f"{base_url}/chat/cache-stats", timeout=10).json().get("limits")
+        report = summarize(run)
+        report["session_order"] = check_pairs(os.path.join(workdir, "rag_app.db"), run["pairs"])
+        report["limits_one_worker"] = stats
+        return report
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=14, help="requests offered per second")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--upstream-capacity", type=int, default=8, help="LLM calls the fake upstream serves at once")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--queue", type=int, default=8, help="LLM_MAX_QUEUE for the limited run")
+    parser.add_argument("--queue-timeout-ms", type=float, default=2000)
+    parser.add_argument("--pair-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = {
+        "config": vars(args),
+        "unlimited": run_config(args, limited=False),
+        "limited": run_config(args, limited=True),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
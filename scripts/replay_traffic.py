@@ -0,0 +1,396 @@
+"""
+Replays captured chat traffic (CAPTURE_ENABLED, see app/utils/capture.py)
+through this version of the app, offline and deterministically, as a
+performance and regression gate before a deploy.
+
+The LLM, embedding and search backends are set to 'replay' (app/utils/replay.py):
+each upstream call is answered with the response recorded for the same request,
+after the recorded latency times --upstream-latency. The knowledge base the
+traffic was captured against is loaded from a snapshot (python -m app.cli
+export). Every captured session is replayed in order, at its recorded pace
+divided by --speedup (0: back to back), at most --concurrency sessions at a
+time, against POST /chat or /chat/stream as recorded, over HTTP to the app
+served by uvicorn on a loopback port.
+
+The JSON report holds latency percentiles, LLM calls and tokens per turn,
+overall and per route (cache, end, answer, rag, web, rag+web, coalesced); how often
+the answer or the route differs from the capture; and the upstream requests
+the capture did not hold (a prompt or query the code now builds differently,
+answered by the offline fakes). The run exits with 1 when more answers changed
+than --max-answer-change-rate allows or, given a --baseline report, when p95
+latency or LLM calls / tokens per turn grew past the allowed margins.
+Settings other than the backends (SEMANTIC_CACHE_ENABLED, ...) come from the
+environment as usual and should match the deployment that was captured, or
+the routes will differ:
+
+    python -m app.cli export snapshots/kb
+    python scripts/replay_traffic.py captures/traffic.jsonl --snapshot snapshots/kb --speedup 10 \\
+        --baseline replay-previous.json --output replay.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def configure_env(args, workdir: str) -> None:
+    """Select the replay backends; must run before anything under app/ is imported."""
+    for key in ("CEREBRAS_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY"):
+        os.environ.setdefault(key, "offline")
+    os.environ.pop("CHROMA_SERVER_URL", None)
+    os.environ.update({
+        "LLM_BACKEND": "replay",
+        "SEARCH_BACKEND": "replay",
+        "EMBEDDING_BACKEND": "replay",
+        "REPLAY_PATH": os.path.abspath(args.capture),
+        "REPLAY_LATENCY_SCALE": str(args.upstream_latency),
+        # The replayed turns are captured too: that is where routes, LLM calls and tokens come from
+        "CAPTURE_ENABLED": "true",
+        "CAPTURE_PATH": os.path.join(workdir, "replayed.jsonl"),
+        "WORKERS": "1",
+        "STARTUP_WARMUP": "eager",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "WEB_SEARCH_CACHE_ENABLED": "false",
+        "RAG_DB_PATH": os.path.join(workdir, "replay.db"),
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma_db"),
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+    })
+
+
+def check_backends() -> None:
+    """A .env file overrides the environment: never replay against the real upstreams."""
+    from app.config import settings
+
+    live = [name for name in ("LLM_BACKEND", "SEARCH_BACKEND", "EMBEDDING_BACKEND")
+            if getattr(settings, name) != "replay"]
+    if live or not settings.CAPTURE_ENABLED:
+        sys.exit(f"{', '.join(live) or 'CAPTURE_ENABLED'} is overridden (by .env?); refusing to replay")
+
+
+# ── Captured traffic ─────────────────────────────────────────────────
+def load_sessions(path: str, limit: int):
+    """Captured turns grouped by session, in arrival order; sessions by their first turn."""
+    sessions = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("type") == "turn":
+                    sessions[record["session_id"]].append(record)
+    ordered = sorted((sorted(turns, key=lambda t: t["ts"]) for turns in sessions.values()),
+                     key=lambda turns: turns[0]["ts"])
+    return ordered[:limit] if limit else ordered
+
+
+def normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", text or "").strip()
+
+
+# ── Measurement helpers ─────────────────────────────────────────────
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(milliseconds) -> dict:
+    values = sorted(milliseconds)
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+# ── Replay ───────────────────────────────────────────────────────────
+async def send(client, turn: dict, endpoint: str) -> dict:
+    payload = {**turn["request"], "session_id": turn["session_id"]}
+    start = time.perf_counter()
+    if endpoint == "chat":
+        response = await client.post("/chat", json=payload)
+        response.raise_for_status()
+        return {"latency_ms": (time.perf_counter() - start) * 1000, "answer": response.json()["answer"]}
+
+    first_token, answer, event = None, None, None
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            elif line.startswith("data:"):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event == "error":
+                    raise RuntimeError(line)
+                elif event == "done":
+                    answer = json.loads(line.split(":", 1)[1])["answer"]
+    if answer is None:
+        raise RuntimeError("stream ended without a done event")
+    latency = (time.perf_counter() - start) * 1000
+    return {"latency_ms": latency, "answer": answer,
+            "first_token_ms": first_token * 1000 if first_token is not None else latency}
+
+
+async def replay(client, sessions, args) -> list:
+    gate = asyncio.Semaphore(args.concurrency)
+    t0 = sessions[0][0]["ts"] if sessions else 0
+    started = time.perf_counter()
+    results = []
+
+    async def pace(ts: float) -> None:
+        if args.speedup > 0:
+            delay = (ts - t0) / args.speedup - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def run_session(turns) -> None:
+        await pace(turns[0]["ts"])
+        async with gate:
+            for turn in turns:
+                await pace(turn["ts"])
+                sample = {"turn": turn}
+                try:
+                    sample.update(await send(client, turn, args.endpoint or turn.get("endpoint", "chat")))
+                except Exception as e:
+                    sample["error"] = repr(e)
+                results.append(sample)
+
+    await asyncio.gather(*(run_session(turns) for turns in sessions))
+    return results
+
+
+async def serve_and_replay(sessions, args) -> list:
+    import httpx
+    import uvicorn
+    from app.main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False, lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            return await replay(client, sessions, args)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ── Report ───────────────────────────────────────────────────────────
+def replayed_turns(path: str) -> dict:
+    """(session_id, question) -> replayed turn records, in the order they were written."""
+    turns = defaultdict(list)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "turn":
+                    turns[(record["session_id"], record["request"]["question"])].append(record)
+    return turns
+
+
+def build_report(results, replayed: dict, misses: dict) -> dict:
+    per_route = defaultdict(lambda: {"latency": [], "captured": [], "calls": [], "tokens": []})
+    everything = per_route["all"]
+    first_tokens, errors, changed, samples = [], [], defaultdict(int), []
+    routes_changed = 0
+    answered = 0
+
+    for sample in sorted(results, key=lambda s: s["turn"]["ts"]):
+        turn = sample["turn"]
+        if "error" in sample:
+            errors.append(sample["error"])
+            continue
+        answered += 1
+        queue = replayed.get((turn["session_id"], turn["request"]["question"]))
+        record = queue.pop(0) if queue else {}
+        route = record.get("route", "unknown")
+        llm_calls = [u for u in record.get("upstream", ()) if u["kind"] == "llm"]
+        tokens = sum(u.get("prompt_tokens", 0) + u.get("completion_tokens", 0) for u in llm_calls)
+        for bucket in (everything, per_route[route]):
+            bucket["latency"].append(sample["latency_ms"])
+            bucket["captured"].append(turn["latency_ms"])
+            bucket["calls"].append(len(llm_calls))
+            bucket["tokens"].append(tokens)
+        if "first_token_ms" in sample:
+            first_tokens.append(sample["first_token_ms"])
+        if route != turn["route"]:
+            routes_changed += 1
+        if normalize(sample["answer"]) != normalize(turn["answer"]):
+            changed[route] += 1
+            if len(samples) < 5:
+                samples.append({"question": turn["request"]["question"], "route": route,
+                                "captured": turn["answer"][:200], "replayed": sample["answer"][:200]})
+
+    def stats(bucket: dict) -> dict:
+        turns = len(bucket["latency"])
+        return {
+            "turns": turns,
+            "latency_ms": summarize(bucket["latency"]),
+            "captured_latency_ms": summarize(bucket["captured"]),
+            "llm_calls_per_turn": round(sum(bucket["calls"]) / turns, 3) if turns else 0.0,
+            "tokens_per_turn": round(sum(bucket["tokens"]) / turns, 1) if turns else 0.0,
+        }
+
+    report = {
+        "turns": len(results),
+        "errors": len(errors),
+        **stats(everything),
+        "routes": {route: stats(bucket) for route, bucket in sorted(per_route.items()) if route != "all"},
+        "answers_changed": {
+            "rate": round(sum(changed.values()) / answered, 4) if answered else 0.0,
+            "turns": sum(changed.values()),
+            "by_route": dict(sorted(changed.items())),
+            "samples": samples,
+        },
+        "routes_changed": {"rate": round(routes_changed / answered, 4) if answered else 0.0, "turns": routes_changed},
+        "replay_misses": misses,
+    }
+    if first_tokens:
+        report["first_token_ms"] = summarize(first_tokens)
+    if errors:
+        report["error_samples"] = sorted(set(errors))[:5]
+    return report
+
+
+def gate(report: dict, baseline: dict, args) -> list:
+    """Reasons this run should not ship; empty when it passes."""
+    failures = []
+    if report["errors"]:
+        failures.append(f"{report['errors']} turns failed")
+    if report["answers_changed"]["rate"] > args.max_answer_change_rate:
+        failures.append(f"{report['answers_changed']['rate']:.1%} of the answers changed "
+                        f"(allowed {args.max_answer_change_rate:.1%})")
+    if not baseline:
+        return failures
+
+    scopes = [("all", report, baseline)] + [
+        (route, stats, baseline["routes"][route]) for route, stats in report["routes"].items()
+        if route in baseline.get("routes", {})
+        and min(stats["turns"], baseline["routes"][route]["turns"]) >= args.min_route_turns
+    ]
+    for scope, new, old in scopes:
+        old_p95, new_p95 = old["latency_ms"].get("p95", 0), new["latency_ms"].get("p95", 0)
+        if old_p95 and new_p95 > old_p95 * (1 + args.max_latency_increase):
+            failures.append(f"{scope}: p95 {new_p95:.0f} ms vs {old_p95:.0f} ms")
+        for metric in ("llm_calls_per_turn", "tokens_per_turn"):
+            if old[metric] and new[metric] > old[metric] * (1 + args.max_cost_increase):
+                failures.append(f"{scope}: {metric} {new[metric]} vs {old[metric]}")
+    return failures
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_summary(report: dict) -> None:
+    print(f"{'route':<10} {'turns':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'captured p95':>13} {'llm/turn':>9} "
+          f"{'tok/turn':>9}")
+    rows = [("all", report)] + list(report["routes"].items())
+    for route, stats in rows:
+        lat, cap = stats["latency_ms"], stats["captured_latency_ms"]
+        print(f"{route:<10} {stats['turns']:6d} {lat.get('p50', 0):8.1f} {lat.get('p95', 0):8.1f} "
+              f"{lat.get('p99', 0):8.1f} {cap.get('p95', 0):13.1f} {stats['llm_calls_per_turn']:9.2f} "
+              f"{stats['tokens_per_turn']:9.1f}")
+    print(f"\nanswers changed: {report['answers_changed']['turns']} ({report['answers_changed']['rate']:.1%}), "
+          f"routes changed: {report['routes_changed']['turns']}, errors: {report['errors']}, "
+          f"replay misses: {report['replay_misses']['misses']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="JSONL written with CAPTURE_ENABLED")
+    parser.add_argument("--snapshot", help="knowledge-base snapshot directory (python -m app.cli export)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide the recorded pauses by this (0: none)")
+    parser.add_argument("--concurrency", type=int, default=16, help="sessions replayed at once")
+    parser.add_argument("--upstream-latency", type=float, default=1.0, help="scale of the recorded upstream latency")
+    parser.add_argument("--endpoint", choices=("chat", "stream"), help="send every turn here instead")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N sessions")
+    parser.add_argument("--baseline", help="report of a previous replay to gate against")
+    parser.add_argument("--max-latency-increase", type=float, default=0.10, help="allowed p95 growth (fraction)")
+    parser.add_argument("--max-cost-increase", type=float, default=0.05,
+                        help="allowed growth of LLM calls and tokens per turn (fraction)")
+    parser.add_argument("--max-answer-change-rate", type=float, default=0.02)
+    parser.add_argument("--min-route-turns", type=int, default=20, help="routes with fewer turns are not gated")
+    parser.add_argument("--output", default="replay.json")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.capture, args.limit)
+    if not sessions:
+        sys.exit(f"No captured turns in {args.capture}")
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    configure_env(args, workdir)
+    check_backends()
+    started = datetime.now(timezone.utc)
+    try:
+        if args.snapshot:
+            from app.utils.snapshot import import_snapshot
+            import_snapshot(args.snapshot)
+        results = asyncio.run(serve_and_replay(sessions, args))
+
+        from app.utils.replay import cassette
+        report = build_report(results, replayed_turns(os.environ["CAPTURE_PATH"]), cassette().stats())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = gate(report, baseline, args)
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    report = {
+        "version": git_version(),
+        "created_at": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config,
+        **report,
+        "gate": {"passed": not failures, "failures": failures},
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+
+    print_summary(report)
+    print(f"\nreport written to {args.output}")
+    if failures:
+        print("\nGATE FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('chat-form');
     const input = document.getElementById('user-input');
     const chatWindow = document.getElementById('chat-window');
-    const chatEndpoint = '/chat';
+    const chatStreamEndpoint = '/chat/stream';
 
     function getOrCreateSessionId() {
         let sessionId = sessionStorage.getItem('chatSessionId');
@@ -13,6 +13,14 @@ document.addEventListener('DOMContentLoaded', () => {
         return sessionId;
     }
 
+    const nodeLabels = {
+        contextualise: 'Analizando tu pregunta...',
+        router: 'Decidiendo cómo responder...',
+        rag_lookup: 'Buscando en la base de conocimientos...',
+        web_search: 'Buscando en la web...',
+        answer: 'Redactando la respuesta...'
+    };
+
     form.addEventListener('submit', async (e) => {
         e.preventDefault();
         const question = input.value.trim();
@@ -22,6 +30,8 @@ document.addEventListener('DOMContentLoaded', () => {
         input.value = '';
         showTypingIndicator();
 
+        let aiBubble = null;
+
         try {
             const sessionId = getOrCreateSessionId();
             const requestBody = {
@@ -30,19 +40,37 @@ document.addEventListener('DOMContentLoaded', () => {
                 model: "llama-3.3-70b"
             };
 
-            const res = await fetch(chatEndpoint, {
+            const res = await fetch(chatStreamEndpoint, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(requestBody)
             });
 
-            if (!res.ok) {
+            if (!res.ok || !res.body) {
                 throw new Error(`Error del servidor: ${res.status}`);
             }
 
-            const data = await res.json();
+            await readEventStream(res.body, (event, data) => {
+                if (event === 'node' && data.status === 'start') {
+                    setTypingStatus(nodeLabels[data.node]);
+                } else if (event === 'token') {
+                    if (!aiBubble) {
+                        removeTypingIndicator();
+                        aiBubble = addMessage('', 'ai');
+                    }
+                    aiBubble.textContent += data.content;
+                    scrollToBottom();
+                } else if (event === 'done') {
+                    removeTypingIndicator();
+                    if (!aiBubble) {
+                        aiBubble = addMessage(data.answer, 'ai');
+                    }
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+            });
+
             removeTypingIndicator();
-            addMessage(data.answer, 'ai');
 
         } catch (error) {
             removeTypingIndicator();
@@ -51,6 +79,37 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    async function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                const dataLines = [];
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                }
+                if (dataLines.length) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
     function addMessage(content, role) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
@@ -60,6 +119,7 @@ document.addEventListener('DOMContentLoaded', () => {
         messageDiv.appendChild(bubble);
         chatWindow.appendChild(messageDiv);
         scrollToBottom();
+        return bubble;
     }
 
     function showTypingIndicator() {
@@ -71,12 +131,20 @@ document.addEventListener('DOMContentLoaded', () => {
                 <span class="typing-dot"></span>
                 <span class="typing-dot"></span>
                 <span class="typing-dot"></span>
+                <span class="typing-status"></span>
             </div>
         `;
         chatWindow.appendChild(typingDiv);
         scrollToBottom();
     }
 
+    function setTypingStatus(text) {
+        const status = document.querySelector('#typing-indicator .typing-status');
+        if (status && text) {
+            status.textContent = text;
+        }
+    }
+
     function removeTypingIndicator() {
         const typingIndicator = document.getElementById('typing-indicator');
         if (typingIndicator) {